@@ -1,276 +1,684 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, current_app, jsonify, redirect, request, send_file, stream_with_context, url_for
 from flask_cors import CORS
-import sqlite3
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 import json
+import base64
+import logging
+import os
+import random
+import re
+import threading
+import time
 
-app = Flask(__name__)
-CORS(app)
+from db import DATABASE, ReadPool, get_read_db
+from catalog import CatalogStore, SORT_KEYS, iter_perfumes, sort_notes
+from note_index import note_index, normalize_note
+from search import has_search_index, search_perfume_ids
+from result_cache import ResultCache
+from sampling import random_pool, random_pools, seeded_walk
+from images import IMAGE_DIR, ImageStore, thumbnail_digest
+import metrics
 
-DATABASE = 'perfumes.db'
+logger = logging.getLogger(__name__)
 
-def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# similarity, neighbors and minhash pull in numpy and scipy, so they are
+# imported where recommendations are computed: starting the app does not pay
+# for them, and warm-up loads them off the request path.
 
-def dict_from_row(row):
-    return dict(zip(row.keys(), row))
+# Routes of the API; create_app() registers them on a Flask app
+api = Blueprint('api', __name__)
 
-@app.route('/api/perfumes', methods=['GET'])
+# Latency, SQL and size of every request, served at /api/metrics
+request_metrics = metrics.RequestMetrics()
+
+# In-memory catalog shared by the read endpoints. Checking the database for
+# changes once a second keeps most requests from touching SQLite at all.
+catalog_store = CatalogStore(DATABASE, check_interval=1.0)
+
+# Long-lived read connections for the queries still made per request
+read_pool = ReadPool(DATABASE)
+
+# Rankings of the recommendation endpoints for the current snapshot; a few
+# popular perfumes and note combinations make up most of the traffic
+result_cache = ResultCache(maxsize=2048)
+
+# Thumbnails written by images.py
+image_store = ImageStore(IMAGE_DIR)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BATCH_SIZE = 500
+MAX_RANDOM_COUNT = 50
+MAX_RECOMMENDATIONS = 200
+
+# Records per chunk written by the NDJSON export
+EXPORT_CHUNK_SIZE = 100
+
+# Browsers keep thumbnails fetched by digest for a year without revalidating
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+# Thumbnail digests are SHA-256 hex strings (images.ImageStore)
+DIGEST = re.compile('[0-9a-f]{64}')
+
+def encode_cursor(sort, key):
+    """Opaque pagination cursor holding the sort key of the last item served"""
+    return base64.urlsafe_b64encode(json.dumps([sort, key]).encode()).decode()
+
+def decode_cursor(cursor, sort):
+    """Sort key stored in a cursor, or None if it is malformed or for another sort"""
+    try:
+        cursor_sort, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if cursor_sort != sort or not isinstance(key, list):
+        return None
+    return key
+
+def stored_neighbors(catalog):
+    """Neighbour lists precomputed by neighbors.py, read once per snapshot"""
+    def build(catalog):
+        from neighbors import load_neighbors
+        with read_pool.connection() as conn:
+            return load_neighbors(conn)
+    return catalog.derived('neighbors', build)
+
+def lsh_index(catalog, bands):
+    """MinHash LSH buckets for a snapshot, from signatures stored by minhash.py"""
+    from minhash import MinHashLSH, load_signatures
+    
+    def load(catalog):
+        with read_pool.connection() as conn:
+            return load_signatures(conn, catalog)
+    signatures = catalog.derived('minhash', load)
+    return catalog.derived(f'lsh:{bands}', lambda catalog: MinHashLSH(signatures, bands))
+
+def search_ids(catalog, search, limit, gender, family):
+    """Ids matching a search, falling back to a substring scan without FTS"""
+    def check(catalog):
+        with read_pool.connection() as conn:
+            return has_search_index(conn)
+    
+    if catalog.derived('search_index', check):
+        with read_pool.connection() as conn:
+            ids = search_perfume_ids(conn, search, limit, gender, family)
+        return [perfume_id for perfume_id in ids if perfume_id in catalog.perfumes]
+    
+    return catalog.page('id', None, limit, search, gender, family)[0]
+
+def catalog_response(catalog, build):
+    """Response for data that depends only on the catalog, tagged with its ETag.
+
+    Clients revalidate on every use (Cache-Control: no-cache); one that
+    already holds this snapshot gets an empty 304 and `build` is never
+    called, so no JSON is produced.
+    """
+    if catalog.etag is None:
+        return build()
+    
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(catalog.etag)
+    else:
+        since = request.if_modified_since
+        fresh = since is not None and catalog.updated_at <= since.timestamp()
+    
+    response = current_app.response_class(status=304) if fresh else build()
+    response.set_etag(catalog.etag)
+    response.last_modified = catalog.updated_at
+    response.cache_control.no_cache = True
+    return response
+
+def json_response(body):
+    """Response for JSON text that is already encoded"""
+    return current_app.response_class(body + '\n', mimetype='application/json')
+
+def perfume_list_json(catalog, perfume_ids):
+    """JSON array of full perfumes, joined from the snapshot's fragments"""
+    return '[' + ','.join(catalog.perfume_json(perfume_id) for perfume_id in perfume_ids) + ']'
+
+def projection_args(catalog):
+    """Read the `fields` and `notes` query parameters: (fields, include_notes, error)"""
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    include_notes = request.args.get('notes', 'true').lower() not in ('0', 'false', 'no')
+    
+    unknown_fields = set(fields) - catalog.fields
+    if unknown_fields:
+        return fields, include_notes, f"Unknown fields: {', '.join(sorted(unknown_fields))}"
+    return fields, include_notes, None
+
+@api.route('/api/perfumes', methods=['GET'])
 def get_perfumes():
-    """Get all perfumes or search by name"""
+    """Get all perfumes or search by name.
+
+    Passing `limit` or `cursor` switches to keyset pagination and returns
+    {'perfumes': [...], 'next_cursor': ...}; `fields` and `notes=false`
+    trim what is returned for each perfume.
+    """
     search = request.args.get('search', '')
     gender = request.args.get('gender', '')
     family = request.args.get('family', '')
+    sort = request.args.get('sort', 'id')
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    
+    if gender == 'All':
+        gender = ''
+    if family == 'All':
+        family = ''
+    
+    if sort not in SORT_KEYS:
+        return jsonify({'error': f'Unknown sort: {sort}'}), 400
+    
+    catalog = catalog_store.current()
+    
+    fields, include_notes, error = projection_args(catalog)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    paginated = limit is not None or cursor is not None
+    after = None
+    if paginated:
+        limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        if cursor:
+            after = decode_cursor(cursor, sort)
+            if after is None:
+                return jsonify({'error': 'Invalid cursor'}), 400
+    
+    ids = last_key = None
+    if not search:
+        try:
+            ids, last_key = catalog.page(sort, after, limit, search, gender, family)
+        except TypeError:
+            # A cursor whose key cannot be compared with this sort order
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    def build():
+        if search:
+            # Relevance-ranked full-text search: just the best matches, no cursor
+            perfume_ids = search_ids(catalog, search, limit or DEFAULT_PAGE_SIZE, gender, family)
+        else:
+            perfume_ids = ids
+        next_cursor = encode_cursor(sort, last_key) if last_key is not None else None
+        
+        if fields or not include_notes:
+            perfumes = [catalog.perfume(perfume_id, include_notes, fields) for perfume_id in perfume_ids]
+            if not paginated:
+                return jsonify(perfumes)
+            return jsonify({'perfumes': perfumes, 'next_cursor': next_cursor})
+        
+        # Full perfumes: join pre-serialized fragments instead of encoding dicts
+        perfumes = perfume_list_json(catalog, perfume_ids)
+        if not paginated:
+            return json_response(perfumes)
+        return json_response(f'{{"next_cursor":{json.dumps(next_cursor)},"perfumes":{perfumes}}}')
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    query = "SELECT * FROM perfumes WHERE 1=1"
-    params = []
-    
-    if search:
-        query += " AND (name LIKE ? OR brand LIKE ?)"
-        params.extend([f'%{search}%', f'%{search}%'])
-    
-    if gender and gender != 'All':
-        query += " AND gender = ?"
-        params.append(gender)
-    
-    if family and family != 'All':
-        query += " AND family = ?"
-        params.append(family)
-    
-    cursor.execute(query, params)
-    perfumes = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    # Get notes for each perfume
-    for perfume in perfumes:
-        cursor.execute("""
-            SELECT n.id, n.name, n.type, pn.weight
-            FROM notes n
-            JOIN perfume_notes pn ON n.id = pn.note_id
-            WHERE pn.perfume_id = ?
-            ORDER BY n.type, pn.weight DESC
-        """, (perfume['id'],))
-        perfume['notes'] = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    conn.close()
-    return jsonify(perfumes)
+    return catalog_response(catalog, build)
+
+def export_filter(gender, family):
+    """(where, params) of the export for the /api/perfumes filters.
+
+    The rows must come in id order without a sort, or SQLite sorts the whole
+    join (in memory, with temp_store = MEMORY) before the first line is sent.
+    idx_perfumes_gender_family gives id order only when both columns are
+    fixed; otherwise the unary + keeps SQLite scanning perfumes by id.
+    """
+    filters = [(column, value) for column, value in (('gender', gender), ('family', family))
+               if value and value != 'All']
+    prefix = '' if len(filters) == 2 else '+'
+    where = ' AND '.join(f'{prefix}p.{column} = ?' for column, _ in filters)
+    return ('WHERE ' + where if where else ''), [value for _, value in filters]
+
+@api.route('/api/perfumes/export', methods=['GET'])
+def export_perfumes():
+    """Stream the catalog as newline-delimited JSON, one perfume per line.
+
+    Records come straight from one SQLite cursor, so memory use does not
+    grow with the catalog and clients can start before the export ends.
+    Supports the `gender` and `family` filters of /api/perfumes.
+    """
+    where, params = export_filter(request.args.get('gender', ''), request.args.get('family', ''))
+    
+    def generate():
+        # A connection of its own: a slow client would otherwise keep one of
+        # the pool's connections away from every other endpoint
+        conn = get_read_db(read_pool.database, read_pool.counted, check_same_thread=False)
+        try:
+            lines = []
+            for perfume, notes in iter_perfumes(conn, where, params):
+                perfume['notes'] = sort_notes(notes)
+                lines.append(json.dumps(perfume, sort_keys=True, separators=(',', ':')) + '\n')
+                if len(lines) == EXPORT_CHUNK_SIZE:
+                    yield ''.join(lines)
+                    lines = []
+            if lines:
+                yield ''.join(lines)
+        finally:
+            conn.close()
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@api.route('/api/perfumes/batch', methods=['GET', 'POST'])
+def get_perfumes_batch():
+    """Get several perfumes by ID (`?ids=1,5,9` or a JSON body {"ids": [...]})
 
-@app.route('/api/perfumes/<int:perfume_id>', methods=['GET'])
+    Perfumes come back in the order requested, and IDs that do not exist
+    are listed under 'missing'.
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({'error': 'Body must be a JSON object'}), 400
+        ids = body.get('ids', [])
+        # bool is an int subclass, and a string would be read digit by digit
+        if not isinstance(ids, list) or not all(type(perfume_id) is int for perfume_id in ids):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+    else:
+        try:
+            ids = [int(perfume_id) for perfume_id in request.args.get('ids', '').split(',') if perfume_id.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be integers'}), 400
+    
+    if len(ids) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} ids per request'}), 400
+    
+    catalog = catalog_store.current()
+    
+    fields, include_notes, error = projection_args(catalog)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    ids = list(dict.fromkeys(ids))
+    found = [perfume_id for perfume_id in ids if perfume_id in catalog.perfumes]
+    missing = [perfume_id for perfume_id in ids if perfume_id not in catalog.perfumes]
+    
+    if fields or not include_notes:
+        perfumes = [catalog.perfume(perfume_id, include_notes, fields) for perfume_id in found]
+        return jsonify({'perfumes': perfumes, 'missing': missing})
+    
+    perfumes = perfume_list_json(catalog, found)
+    missing = json.dumps(missing, separators=(',', ':'))
+    return json_response(f'{{"missing":{missing},"perfumes":{perfumes}}}')
+
+@api.route('/api/perfumes/<int:perfume_id>', methods=['GET'])
 def get_perfume(perfume_id):
     """Get a single perfume by ID"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM perfumes WHERE id = ?", (perfume_id,))
-    perfume = cursor.fetchone()
+    catalog = catalog_store.current()
     
-    if not perfume:
-        conn.close()
+    if perfume_id not in catalog.perfumes:
         return jsonify({'error': 'Perfume not found'}), 404
     
-    perfume = dict_from_row(perfume)
-    
-    # Get notes
-    cursor.execute("""
-        SELECT n.id, n.name, n.type, pn.weight
-        FROM notes n
-        JOIN perfume_notes pn ON n.id = pn.note_id
-        WHERE pn.perfume_id = ?
-        ORDER BY n.type, pn.weight DESC
-    """, (perfume_id,))
-    perfume['notes'] = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    conn.close()
-    return jsonify(perfume)
+    return catalog_response(catalog, lambda: json_response(catalog.perfume_json(perfume_id)))
+
+@api.route('/api/images/<int:perfume_id>', methods=['GET'])
+def get_image(perfume_id):
+    """Thumbnail of a perfume's image, or a redirect to the original until images.py caches it.
 
-@app.route('/api/recommendations/<int:perfume_id>', methods=['GET'])
+    The thumbnail behind this URL changes when the perfume's image_url does
+    or the image is cached again, so clients revalidate every use (no-cache,
+    ETag = digest). Content-Location names the immutable digest URL.
+    """
+    catalog = catalog_store.current()
+    
+    perfume = catalog.perfumes.get(perfume_id)
+    if perfume is None:
+        return jsonify({'error': 'Perfume not found'}), 404
+    if not perfume['image_url']:
+        return jsonify({'error': 'Perfume has no image'}), 404
+    
+    with read_pool.connection() as conn:
+        digest = thumbnail_digest(conn, perfume_id, perfume['image_url'])
+    
+    if digest is None or not image_store.exists(digest):
+        # Not cached: the redirect itself must not be kept, the thumbnail may arrive later
+        response = redirect(perfume['image_url'])
+        response.cache_control.no_cache = True
+        return response
+    
+    response = send_file(os.path.abspath(image_store.path(digest)), mimetype='image/jpeg',
+                         etag=digest, conditional=True)
+    response.cache_control.no_cache = True
+    response.headers['Content-Location'] = url_for('api.get_thumbnail', digest=digest)
+    return response
+
+@api.route('/api/thumbnails/<digest>', methods=['GET'])
+def get_thumbnail(digest):
+    """A cached thumbnail by digest; the content of this URL never changes"""
+    if not DIGEST.fullmatch(digest) or not image_store.exists(digest):
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    
+    response = send_file(os.path.abspath(image_store.path(digest)), mimetype='image/jpeg',
+                         etag=digest, max_age=IMAGE_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def rank_similar(catalog, perfume_id, limit, mode, bands):
+    """[(perfume_id, score, shared_note_ids)] for the perfumes most like `perfume_id`"""
+    from similarity import similarity_engine
+    
+    engine = similarity_engine(catalog)
+    target_note_ids = set(note['id'] for note in catalog.perfume_notes[perfume_id])
+    
+    stored = stored_neighbors(catalog).get(perfume_id)
+    if mode == 'approx':
+        # Exact scores, but only for perfumes sharing an LSH bucket
+        candidates = lsh_index(catalog, bands).candidates(engine.row_of[perfume_id])
+        return [
+            (similar_id, score, [note['id'] for note in catalog.perfume_notes[similar_id] if note['id'] in target_note_ids])
+            for similar_id, score in engine.recommend(perfume_id, limit, candidates)
+        ]
+    if stored is not None and (0 < limit <= len(stored) or len(stored) == len(catalog) - 1) \
+            and all(neighbor_id in catalog.perfumes for neighbor_id, _, _ in stored):
+        # The precomputed list is long enough and still valid
+        return [(neighbor_id, score, shared_note_ids) for neighbor_id, score, shared_note_ids in stored[:limit]]
+    return [
+        (similar_id, score, [note['id'] for note in catalog.perfume_notes[similar_id] if note['id'] in target_note_ids])
+        for similar_id, score in engine.recommend(perfume_id, limit)
+    ]
+
+@api.route('/api/recommendations/<int:perfume_id>', methods=['GET'])
 def get_recommendations(perfume_id):
     """Get perfume recommendations based on similarity"""
+    from minhash import BAND_CHOICES, DEFAULT_BANDS
+    
     limit = int(request.args.get('limit', 10))
+    mode = request.args.get('mode', 'exact')
+    bands = request.args.get('bands', DEFAULT_BANDS, type=int)
     
-    conn = get_db()
-    cursor = conn.cursor()
+    if mode not in ('exact', 'approx'):
+        return jsonify({'error': f'Unknown mode: {mode}'}), 400
+    if bands not in BAND_CHOICES:
+        return jsonify({'error': f"bands must be one of {', '.join(map(str, BAND_CHOICES))}"}), 400
     
-    # Get the target perfume
-    cursor.execute("SELECT * FROM perfumes WHERE id = ?", (perfume_id,))
-    target_perfume = cursor.fetchone()
+    catalog = catalog_store.current()
     
-    if not target_perfume:
-        conn.close()
+    if perfume_id not in catalog.perfumes:
         return jsonify({'error': 'Perfume not found'}), 404
     
-    target_perfume = dict_from_row(target_perfume)
-    
-    # Get all perfumes with their notes
-    cursor.execute("SELECT * FROM perfumes WHERE id != ?", (perfume_id,))
-    all_perfumes = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    # Get notes for target perfume
-    cursor.execute("""
-        SELECT n.id, n.name, n.type, pn.weight
-        FROM notes n
-        JOIN perfume_notes pn ON n.id = pn.note_id
-        WHERE pn.perfume_id = ?
-    """, (perfume_id,))
-    target_notes = [dict_from_row(row) for row in cursor.fetchall()]
-    target_note_ids = set(note['id'] for note in target_notes)
-    
-    # Calculate similarity for each perfume
-    similarities = []
-    for perfume in all_perfumes:
-        cursor.execute("""
-            SELECT n.id, n.name, n.type, pn.weight
-            FROM notes n
-            JOIN perfume_notes pn ON n.id = pn.note_id
-            WHERE pn.perfume_id = ?
-        """, (perfume['id'],))
-        perfume_notes = [dict_from_row(row) for row in cursor.fetchall()]
-        perfume_note_ids = set(note['id'] for note in perfume_notes)
-        
-        # Calculate Jaccard similarity for notes
-        intersection = len(target_note_ids & perfume_note_ids)
-        union = len(target_note_ids | perfume_note_ids)
-        note_similarity = intersection / union if union > 0 else 0
-        
-        # Bonus for same family
-        family_bonus = 0.2 if perfume['family'] == target_perfume['family'] else 0
-        
-        # Bonus for same gender
-        gender_bonus = 0.1 if perfume['gender'] == target_perfume['gender'] else 0
-        
-        # Total similarity score
-        similarity_score = note_similarity + family_bonus + gender_bonus
-        
-        # Find shared notes
-        shared_notes = [note['name'] for note in perfume_notes if note['id'] in target_note_ids]
-        
-        perfume['notes'] = perfume_notes
+    key = ('similar', perfume_id, limit, mode, bands if mode == 'approx' else None)
+    ranked = result_cache.get(catalog, key, lambda: rank_similar(catalog, perfume_id, limit, mode, bands))
+    
+    recommendations = []
+    for similar_id, similarity_score, shared_note_ids in ranked:
+        perfume = catalog.perfume(similar_id, notes=False)
+        perfume['notes'] = list(catalog.perfume_notes[similar_id])
         perfume['similarity_score'] = round(similarity_score, 3)
-        perfume['shared_notes'] = shared_notes
-        
-        similarities.append(perfume)
+        perfume['shared_notes'] = [catalog.notes[note_id]['name'] for note_id in shared_note_ids]
+        recommendations.append(perfume)
+    
+    return jsonify(recommendations)
+
+def recommendation_body():
+    """(body, limit, error) of a POST to the recommendation endpoints"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return None, None, 'Body must be a JSON object'
+    limit = body.get('limit', 10)
+    if type(limit) is not int or not 1 <= limit <= MAX_RECOMMENDATIONS:
+        return None, None, f'limit must be an integer from 1 to {MAX_RECOMMENDATIONS}'
+    return body, limit, None
+
+@api.route('/api/recommendations/by-perfumes', methods=['POST'])
+def recommendations_by_perfumes():
+    """Get recommendations similar to a set of perfumes (e.g. the user's favorites)"""
+    from similarity import note_profile_model
+    
+    data, limit, error = recommendation_body()
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Sort by similarity and return top N
-    similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
-    recommendations = similarities[:limit]
+    seed_ids = data.get('ids', [])
+    # bool is an int subclass, and lists are not hashable
+    if not isinstance(seed_ids, list) or not all(type(perfume_id) is int for perfume_id in seed_ids):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    
+    if not seed_ids:
+        return jsonify({'error': 'No perfumes provided'}), 400
+    
+    catalog = catalog_store.current()
+    seed_ids = [perfume_id for perfume_id in seed_ids if perfume_id in catalog.perfumes]
+    
+    if not seed_ids:
+        return jsonify({'error': 'Perfume not found'}), 404
+    
+    seed_note_ids = set(note['id'] for perfume_id in seed_ids for note in catalog.perfume_notes[perfume_id])
+    
+    recommendations = []
+    for perfume_id, similarity_score in note_profile_model(catalog).recommend(seed_ids, limit):
+        perfume = catalog.perfume(perfume_id)
+        perfume['similarity_score'] = round(similarity_score, 3)
+        perfume['shared_notes'] = [note['name'] for note in catalog.perfume_notes[perfume_id] if note['id'] in seed_note_ids]
+        recommendations.append(perfume)
     
-    conn.close()
     return jsonify(recommendations)
 
-@app.route('/api/notes', methods=['GET'])
+@api.route('/api/notes', methods=['GET'])
 def get_notes():
     """Get all notes"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT DISTINCT name, type FROM notes ORDER BY type, name")
-    notes = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    conn.close()
-    return jsonify(notes)
+    catalog = catalog_store.current()
+    return catalog_response(catalog, lambda: jsonify(catalog.note_list))
 
-@app.route('/api/recommendations/by-notes', methods=['POST'])
+@api.route('/api/recommendations/by-notes', methods=['POST'])
 def recommendations_by_notes():
     """Get perfume recommendations based on selected notes"""
-    data = request.json
+    data, limit, error = recommendation_body()
+    if error:
+        return jsonify({'error': error}), 400
+    
     selected_notes = data.get('notes', [])
-    limit = data.get('limit', 10)
     gender = data.get('gender', '')
     family = data.get('family', '')
+    if not isinstance(selected_notes, list) or not all(isinstance(note, str) for note in selected_notes):
+        return jsonify({'error': 'notes must be a list of strings'}), 400
+    if not isinstance(gender, str) or not isinstance(family, str):
+        return jsonify({'error': 'gender and family must be strings'}), 400
     
     if not selected_notes:
         return jsonify({'error': 'No notes provided'}), 400
     
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get all perfumes
-    query = "SELECT * FROM perfumes WHERE 1=1"
-    params = []
-    
-    if gender and gender != 'All':
-        query += " AND gender = ?"
-        params.append(gender)
-    
-    if family and family != 'All':
-        query += " AND family = ?"
-        params.append(family)
-    
-    cursor.execute(query, params)
-    all_perfumes = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    # Calculate match score for each perfume
-    matches = []
-    for perfume in all_perfumes:
-        cursor.execute("""
-            SELECT n.id, n.name, n.type, pn.weight
-            FROM notes n
-            JOIN perfume_notes pn ON n.id = pn.note_id
-            WHERE pn.perfume_id = ?
-        """, (perfume['id'],))
-        perfume_notes = [dict_from_row(row) for row in cursor.fetchall()]
-        perfume_note_names = [note['name'].lower() for note in perfume_notes]
-        
-        # Count matching notes
-        matching_notes = [note for note in selected_notes if note.lower() in perfume_note_names]
-        match_score = len(matching_notes) / len(selected_notes) if selected_notes else 0
-        
-        if match_score > 0:  # Only include perfumes with at least one matching note
-            perfume['notes'] = perfume_notes
-            perfume['match_score'] = round(match_score, 3)
-            perfume['matching_notes'] = matching_notes
-            matches.append(perfume)
+    if gender == 'All':
+        gender = ''
+    if family == 'All':
+        family = ''
+    
+    catalog = catalog_store.current()
+    index = note_index(catalog)
+    
+    # The ranking does not depend on the order or case of the notes
+    key = ('notes', tuple(sorted(normalize_note(note) for note in selected_notes)), gender, family, limit)
+    ranked = result_cache.get(catalog, key, lambda: index.match(selected_notes, gender, family, limit))
     
-    # Sort by match score
-    matches.sort(key=lambda x: x['match_score'], reverse=True)
-    recommendations = matches[:limit]
+    recommendations = []
+    for perfume_id, match_score in ranked:
+        perfume_note_names = index.note_names[perfume_id]
+        perfume = catalog.perfume(perfume_id, notes=False)
+        perfume['notes'] = list(catalog.perfume_notes[perfume_id])
+        perfume['match_score'] = round(match_score, 3)
+        perfume['matching_notes'] = [note for note in selected_notes if normalize_note(note) in perfume_note_names]
+        recommendations.append(perfume)
     
-    conn.close()
     return jsonify(recommendations)
 
-@app.route('/api/random', methods=['GET'])
+@api.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit, miss and eviction counters of the recommendation cache"""
+    return jsonify(result_cache.stats())
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request metrics plus catalog and cache sizes, in the Prometheus text format"""
+    catalog = catalog_store.current()
+    cache = result_cache.stats()
+    
+    gauges = [
+        ('catalog_perfumes', 'gauge', 'Perfumes in the current snapshot.', len(catalog)),
+        ('catalog_notes', 'gauge', 'Distinct notes in the current snapshot.', len(catalog.note_list)),
+        ('catalog_note_links', 'gauge', 'Perfume-note links in the current snapshot.',
+         catalog.derived('link_count', lambda catalog: sum(map(len, catalog.perfume_notes.values())))),
+        ('catalog_loads_total', 'counter', 'Snapshots loaded since startup.', catalog.version),
+        ('result_cache_entries', 'gauge', 'Rankings held by the recommendation cache.', cache['size']),
+        ('result_cache_max_entries', 'gauge', 'Capacity of the recommendation cache.', cache['maxsize']),
+        ('result_cache_lookups_total', 'counter', 'Recommendation cache lookups.', [
+            ({'result': 'hit'}, cache['hits']),
+            ({'result': 'miss'}, cache['misses']),
+        ]),
+        ('result_cache_evictions_total', 'counter', 'Rankings evicted for space.', cache['evictions']),
+        ('result_cache_invalidations_total', 'counter', 'Cache clears caused by a new snapshot.',
+         cache['invalidations']),
+    ]
+    return current_app.response_class(request_metrics.render(gauges), content_type=metrics.CONTENT_TYPE)
+
+@api.route('/api/random', methods=['GET'])
 def get_random_perfume():
-    """Get a random perfume (Surprise Me feature)"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM perfumes ORDER BY RANDOM() LIMIT 1")
-    perfume = cursor.fetchone()
-    
-    if perfume:
-        perfume = dict_from_row(perfume)
-        cursor.execute("""
-            SELECT n.id, n.name, n.type, pn.weight
-            FROM notes n
-            JOIN perfume_notes pn ON n.id = pn.note_id
-            WHERE pn.perfume_id = ?
-            ORDER BY n.type, pn.weight DESC
-        """, (perfume['id'],))
-        perfume['notes'] = [dict_from_row(row) for row in cursor.fetchall()]
-    
-    conn.close()
-    return jsonify(perfume)
-
-@app.route('/api/filters', methods=['GET'])
+    """Get a random perfume (Surprise Me feature).
+
+    `gender` and `family` restrict the pick. With `count` the response is
+    {'perfumes': [...]} holding that many distinct perfumes. With a `seed`
+    it also holds `next_offset`: passing that back as `offset` (with the
+    same seed and filters) walks through every matching perfume before any
+    comes up again.
+    """
+    gender = request.args.get('gender', '')
+    family = request.args.get('family', '')
+    count = request.args.get('count', type=int)
+    seed = request.args.get('seed')
+    offset = request.args.get('offset', 0, type=int)
+    
+    if gender == 'All':
+        gender = ''
+    if family == 'All':
+        family = ''
+    
+    if count is not None and not 1 <= count <= MAX_RANDOM_COUNT:
+        return jsonify({'error': f'count must be between 1 and {MAX_RANDOM_COUNT}'}), 400
+    if offset < 0:
+        return jsonify({'error': 'offset must not be negative'}), 400
+    
+    catalog = catalog_store.current()
+    
+    # Picked by position in a precomputed pool: no sort, no scan of the catalog
+    pool = random_pool(catalog, gender, family)
+    
+    if seed is not None:
+        ids, next_offset = seeded_walk(pool, seed, offset, count or 1)
+        return json_response(f'{{"next_offset":{next_offset},"perfumes":{perfume_list_json(catalog, ids)}}}')
+    if count is not None:
+        ids = random.sample(pool, min(count, len(pool)))
+        return json_response(f'{{"perfumes":{perfume_list_json(catalog, ids)}}}')
+    if not pool:
+        return jsonify(None)
+    return json_response(catalog.perfume_json(random.choice(pool)))
+
+@api.route('/api/filters', methods=['GET'])
 def get_filters():
     """Get available filter options"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT DISTINCT family FROM perfumes ORDER BY family")
-    families = [row[0] for row in cursor.fetchall()]
-    
-    cursor.execute("SELECT DISTINCT gender FROM perfumes ORDER BY gender")
-    genders = [row[0] for row in cursor.fetchall()]
-    
-    conn.close()
-    return jsonify({'families': families, 'genders': genders})
+    catalog = catalog_store.current()
+    return catalog_response(catalog, lambda: jsonify({'families': catalog.families, 'genders': catalog.genders}))
+
+def warm_up(reload=False):
+    """Load the snapshot and everything requests derive from it.
+
+    gunicorn.conf.py runs this in the master before forking, so workers
+    start with the structures built and share their memory copy-on-write.
+    """
+    from minhash import DEFAULT_BANDS
+    from similarity import note_profile_model, similarity_engine
+    
+    catalog = catalog_store.reload() if reload else catalog_store.current()
+    similarity_engine(catalog)
+    note_profile_model(catalog)
+    note_index(catalog)
+    stored_neighbors(catalog)
+    lsh_index(catalog, DEFAULT_BANDS)
+    random_pools(catalog)
+    for sort in SORT_KEYS:
+        catalog.sort_order(sort)
+    for perfume_id in catalog.perfume_ids:
+        catalog.perfume_json(perfume_id)
+    return catalog
+
+class WarmUp:
+    """Runs warm_up(), in this thread or a background one, and reports how it went"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.ready = False
+        self.seconds = None
+        self.error = None
+    
+    def run(self, reload=False):
+        started = time.perf_counter()
+        try:
+            catalog = warm_up(reload)
+        except Exception as error:
+            self.error = f'{type(error).__name__}: {error}'
+            raise
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.error = None
+        self.ready = True
+        return catalog
+    
+    def start(self):
+        """Warm up in a background thread, unless that is done or under way"""
+        with self._lock:
+            if self.ready or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run_in_background, name='warm-up', daemon=True)
+            self._thread.start()
+    
+    def _run_in_background(self):
+        try:
+            self.run()
+        except Exception:
+            logger.exception('Warm-up failed')
+
+# Requests served before warm-up has finished build what they need themselves
+startup = WarmUp()
+
+@api.route('/api/health', methods=['GET'])
+def get_health():
+    """Readiness: 200 once warm-up has finished, otherwise 503 and warm-up is started"""
+    if not startup.ready:
+        startup.start()
+        body = {'status': 'warming_up'}
+        if startup.error:
+            body['last_error'] = startup.error
+        return jsonify(body), 503
+    
+    catalog = catalog_store.current()
+    return jsonify({
+        'status': 'ready',
+        'perfumes': len(catalog),
+        'catalog_revision': catalog.revision,
+        'warm_up_seconds': startup.seconds,
+    })
+
+def create_app(background_warm_up=False):
+    """The API as a Flask app.
+
+    The catalog, pools and caches above belong to the module, so every app
+    created in a process serves the same snapshot. With `background_warm_up`
+    the snapshot and recommendation structures start loading in a background
+    thread right away; otherwise the first /api/health check starts that.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    request_metrics.init_app(app)
+    app.register_blueprint(api)
+    if background_warm_up:
+        startup.start()
+    return app
+
+def close_connections():
+    """Close this process's SQLite connections, keeping the loaded snapshot.
+
+    A connection must not be used on both sides of a fork; after this,
+    forked workers open their own on first use.
+    """
+    catalog_store.close()
+    read_pool.close()
+
+app = create_app()
 
 if __name__ == '__main__':
+    startup.start()
     app.run(debug=True, port=5000)
@@ -0,0 +1,338 @@
+"""Latency percentiles and memory of every API endpoint on synthetic catalogs.
+
+Each catalog size runs in a fresh process against a catalog from
+synthetic.generate_realistic_catalog, driving the routes of app.py through
+Flask's test client. Results can be saved as a baseline; later runs are
+compared with it and exit with status 1 when an endpoint got slower or the
+process needs more memory than the tolerance allows.
+
+Startup is measured too, in a fresh interpreter per size: the time to import
+the app, to answer a first request on a cold process, and until /api/health
+reports warm-up finished. The endpoints that run SQL are timed a second time
+without the statement and row counting behind /api/metrics, to show what
+that counting costs.
+
+Usage:
+    python bench_api.py --sizes 1000 10000 --save   # record bench_baseline.json
+    python bench_api.py --sizes 1000 10000          # compare with it
+    python bench_api.py --sizes 200000 --requests 50 --data-dir bench_data
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASELINE_FILE = 'bench_baseline.json'
+
+# Timing noise allowed before a run counts as a regression: the new value
+# may be up to TOLERANCE times the baseline plus SLACK_MS
+TOLERANCE = 1.5
+SLACK_MS = 1.0
+LATENCY_METRICS = ['p50', 'p95']
+STARTUP_METRICS = ['import_ms', 'first_response_ms']
+# Absolute ceilings checked on top of the baseline: importing the app took
+# 1.6s while it loaded scikit-learn at import time
+STARTUP_BUDGET_MS = {'import_ms': 1000}
+
+# Libraries that importing the app or serving a first non-recommendation
+# request must not load
+HEAVY_MODULES = ['numpy', 'scipy', 'sklearn', 'pandas', 'PIL']
+
+
+def popular_notes(rng, count=3):
+    from synthetic import seed_profile
+    names = [name for name, _ in seed_profile()['notes'][:30]]
+    return rng.sample(names, count)
+
+
+def perfume_url(rng, catalog):
+    return f'/api/perfumes/{rng.choice(catalog.perfume_ids)}'
+
+
+# (name, share of --requests, request(rng, catalog) -> (method, url, json, headers));
+# endpoints whose response grows with the catalog get a small share
+ENDPOINTS = [
+    ('perfumes', 0.1, lambda rng, catalog: ('GET', '/api/perfumes', None, None)),
+    ('perfumes_page', 1, lambda rng, catalog: (
+        'GET', f"/api/perfumes?limit=50&sort={rng.choice(['id', 'name', 'year'])}", None, None)),
+    ('perfumes_filtered', 1, lambda rng, catalog: (
+        'GET', f'/api/perfumes?limit=50&gender={rng.choice(catalog.genders)}&family={rng.choice(catalog.families)}',
+        None, None)),
+    ('search', 1, lambda rng, catalog: (
+        'GET', f"/api/perfumes?search={catalog.perfumes[rng.choice(catalog.perfume_ids)]['name'].split()[0]}",
+        None, None)),
+    ('export', 0.1, lambda rng, catalog: ('GET', '/api/perfumes/export', None, None)),
+    ('batch', 1, lambda rng, catalog: (
+        'GET', f"/api/perfumes/batch?ids={','.join(str(i) for i in rng.sample(catalog.perfume_ids, 20))}", None, None)),
+    ('perfume', 1, lambda rng, catalog: ('GET', perfume_url(rng, catalog), None, None)),
+    ('perfume_not_modified', 1, lambda rng, catalog: (
+        'GET', perfume_url(rng, catalog), None, {'If-None-Match': f'"{catalog.etag}"'})),
+    ('image', 1, lambda rng, catalog: ('GET', f'/api/images/{rng.choice(catalog.perfume_ids)}', None, None)),
+    ('similar', 1, lambda rng, catalog: (
+        'GET', f'/api/recommendations/{rng.choice(catalog.perfume_ids)}', None, None)),
+    ('similar_approx', 1, lambda rng, catalog: (
+        'GET', f'/api/recommendations/{rng.choice(catalog.perfume_ids)}?mode=approx', None, None)),
+    ('by_perfumes', 1, lambda rng, catalog: (
+        'POST', '/api/recommendations/by-perfumes', {'ids': rng.sample(catalog.perfume_ids, 3)}, None)),
+    ('notes', 1, lambda rng, catalog: ('GET', '/api/notes', None, None)),
+    ('by_notes', 1, lambda rng, catalog: (
+        'POST', '/api/recommendations/by-notes', {'notes': popular_notes(rng)}, None)),
+    ('cache_stats', 1, lambda rng, catalog: ('GET', '/api/cache/stats', None, None)),
+    ('metrics', 1, lambda rng, catalog: ('GET', '/api/metrics', None, None)),
+    ('random', 1, lambda rng, catalog: ('GET', '/api/random', None, None)),
+    ('random_filtered', 1, lambda rng, catalog: (
+        'GET', f'/api/random?gender={rng.choice(catalog.genders)}&family={rng.choice(catalog.families)}&count=5',
+        None, None)),
+    ('random_seeded', 1, lambda rng, catalog: (
+        'GET', f'/api/random?seed=1&offset={rng.randrange(len(catalog))}', None, None)),
+    ('filters', 1, lambda rng, catalog: ('GET', '/api/filters', None, None)),
+]
+
+
+# Endpoints that query SQLite per request rather than the snapshot
+SQL_ENDPOINTS = ['search', 'export', 'image']
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        'requests': len(times),
+        'p50': round(statistics.median(times), 3),
+        'p95': round(percentile(times, 0.95), 3),
+        'p99': round(percentile(times, 0.99), 3),
+        'max': round(times[-1], 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process, or None where it cannot be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_endpoints(client, catalog, requests, seed=0, names=None):
+    """{endpoint: latency summary in ms}; the first request of each is reported apart as `first`"""
+    rng = random.Random(seed)
+    results = {}
+    for name, share, make_request in ENDPOINTS:
+        if names is not None and name not in names:
+            continue
+        times = []
+        for _ in range(max(2, round(requests * share))):
+            method, url, body, headers = make_request(rng, catalog)
+            started = time.perf_counter()
+            response = client.open(url, method=method, json=body, headers=headers)
+            response.get_data()
+            times.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{method} {url} returned {response.status_code}')
+        # The first request also builds whatever the snapshot derives lazily
+        results[name] = dict(summarize(times[1:]), first=round(times[0], 3))
+    return results
+
+
+def startup_probe():
+    """Time a cold start of the app in this (fresh) process and print it as JSON"""
+    started = time.perf_counter()
+    import app as app_module
+    imported = time.perf_counter()
+    
+    client = app_module.create_app().test_client()
+    response = client.get('/api/perfumes?limit=20')
+    answered = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    
+    while client.get('/api/health').status_code != 200:
+        if app_module.startup.error:
+            raise RuntimeError(app_module.startup.error)
+        time.sleep(0.01)
+    ready = time.perf_counter()
+    
+    print(json.dumps({
+        'import_ms': round((imported - started) * 1000, 1),
+        'first_response_ms': round((answered - imported) * 1000, 1),
+        'first_status': response.status_code,
+        'ready_ms': round((ready - started) * 1000, 1),
+        'heavy_modules': heavy,
+    }))
+
+
+def measure_startup(database):
+    """startup_probe() run in a new interpreter serving `database`"""
+    env = dict(os.environ, PERFUME_DATABASE=database)
+    output = subprocess.run([sys.executable, '-c', 'import bench_api; bench_api.startup_probe()'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def bench_size(size, requests, seed=0, data_dir=None):
+    """Benchmark one catalog size; meant to run in its own process"""
+    import app as app_module
+    import db
+    from catalog import CatalogStore
+    from db import ReadPool
+    from result_cache import ResultCache
+    from synthetic import generate_realistic_catalog
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(data_dir or directory, f'realistic-{size}-{seed}.db')
+        if not os.path.exists(path):
+            generate_realistic_catalog(path, size, seed=seed)
+
+        startup = measure_startup(path)
+        
+        rss_before = peak_rss_mb()
+        db.DATABASE = path
+        app_module.catalog_store = CatalogStore(path)
+        app_module.read_pool = ReadPool(path, counted=True)
+        app_module.result_cache = ResultCache(maxsize=2048)
+        app_module.app.config['TESTING'] = True
+        client = app_module.app.test_client()
+
+        started = time.perf_counter()
+        catalog = app_module.catalog_store.current()
+        load_ms = (time.perf_counter() - started) * 1000
+
+        endpoints = run_endpoints(client, catalog, requests, seed)
+        app_module.read_pool.close()
+
+        app_module.read_pool = ReadPool(path, counted=False)
+        uncounted = run_endpoints(client, catalog, requests, seed, SQL_ENDPOINTS)
+        app_module.read_pool.close()
+        sql_metrics_overhead = {name: round(endpoints[name]['p50'] - latency['p50'], 3)
+                                for name, latency in uncounted.items()}
+
+    rss_after = peak_rss_mb()
+    return {
+        'catalog_load_ms': round(load_ms, 1),
+        'peak_rss_mb': rss_after,
+        'rss_growth_mb': round(rss_after - rss_before, 1) if rss_after is not None else None,
+        'startup': startup,
+        'endpoints': endpoints,
+        'sql_metrics_overhead_ms': sql_metrics_overhead,
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE, slack_ms=SLACK_MS):
+    """Regressions of `results` against `baseline`, as readable lines"""
+    regressions = []
+    for size, result in results.items():
+        for metric, budget in STARTUP_BUDGET_MS.items():
+            value = result.get('startup', {}).get(metric)
+            if value is not None and value > budget:
+                regressions.append(f"{size} perfumes, startup {metric}: {value:.0f}ms (budget {budget}ms)")
+        previous = baseline.get(size)
+        if previous is None:
+            continue
+        for name, latency in result['endpoints'].items():
+            before = previous['endpoints'].get(name)
+            if before is None:
+                continue
+            for metric in LATENCY_METRICS:
+                limit = before[metric] * tolerance + slack_ms
+                if latency[metric] > limit:
+                    regressions.append(f'{size} perfumes, {name} {metric}: {latency[metric]:.2f}ms '
+                                       f'(baseline {before[metric]:.2f}ms, limit {limit:.2f}ms)')
+        for metric in STARTUP_METRICS:
+            before = previous.get('startup', {}).get(metric)
+            if before is None or metric not in result.get('startup', {}):
+                continue
+            limit = before * tolerance + slack_ms
+            if result['startup'][metric] > limit:
+                regressions.append(f"{size} perfumes, startup {metric}: {result['startup'][metric]:.0f}ms "
+                                   f"(baseline {before:.0f}ms, limit {limit:.0f}ms)")
+        if result['peak_rss_mb'] and previous.get('peak_rss_mb'):
+            limit = previous['peak_rss_mb'] * tolerance
+            if result['peak_rss_mb'] > limit:
+                regressions.append(f"{size} perfumes, peak memory: {result['peak_rss_mb']}MB "
+                                   f"(baseline {previous['peak_rss_mb']}MB, limit {limit:.0f}MB)")
+    return regressions
+
+
+def print_result(size, result):
+    print(f"\n{size} perfumes: catalog loaded in {result['catalog_load_ms']:.0f}ms, "
+          f"peak RSS {result['peak_rss_mb']}MB (+{result['rss_growth_mb']}MB)")
+    startup = result['startup']
+    print(f"  startup: import {startup['import_ms']:.0f}ms, first response {startup['first_response_ms']:.0f}ms, "
+          f"ready {startup['ready_ms']:.0f}ms")
+    print(f"  {'endpoint':<22} {'first':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, latency in result['endpoints'].items():
+        print(f"  {name:<22} {latency['first']:>9.2f} {latency['p50']:>8.2f} {latency['p95']:>8.2f} "
+              f"{latency['p99']:>8.2f} {latency['max']:>8.2f}")
+    overhead = ', '.join(f'{name} {delta:+.3f}ms' for name, delta in result['sql_metrics_overhead_ms'].items())
+    print(f"  SQL counting cost at p50: {overhead}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', help='keep generated catalogs here and reuse them')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+
+    results = {}
+    for size in args.sizes:
+        # A fresh process per size, so memory figures do not accumulate
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            result = pool.submit(bench_size, size, args.requests, args.seed, args.data_dir).result()
+        results[str(size)] = result
+        print_result(size, result)
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        baseline['_machine'] = {'platform': platform.platform(), 'python': platform.python_version()}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"\n[OK] Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n[FAIL] {len(regressions)} regressions:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\n[OK] No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Recall and latency of approximate (MinHash LSH) recommendations vs exact.
+
+Usage:
+    python bench_minhash.py --perfumes 20000 --queries 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from catalog import load_catalog
+from db import get_db
+from minhash import BAND_CHOICES, MinHashLSH, load_signatures
+from similarity import SimilarityEngine
+from synthetic import generate_catalog
+
+
+def recall_at_k(engine, lsh, perfume_ids, k):
+    """Mean share of the exact top k found by the approximate search, and timings"""
+    recalls = []
+    exact_time = approx_time = 0.0
+    candidate_count = 0
+    for perfume_id in perfume_ids:
+        started = time.perf_counter()
+        exact = engine.recommend(perfume_id, k)
+        exact_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        candidates = lsh.candidates(engine.row_of[perfume_id])
+        approx = engine.recommend(perfume_id, k, candidates)
+        approx_time += time.perf_counter() - started
+
+        candidate_count += len(candidates)
+        exact_ids = set(similar_id for similar_id, _ in exact)
+        recalls.append(len(exact_ids & set(similar_id for similar_id, _ in approx)) / len(exact_ids))
+
+    n = len(perfume_ids)
+    return sum(recalls) / n, exact_time / n * 1000, approx_time / n * 1000, candidate_count / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--perfumes', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        print(f"Generating {args.perfumes} synthetic perfumes...")
+        generate_catalog(path, args.perfumes)
+
+        conn = get_db(path)
+        catalog = load_catalog(conn)
+        started = time.perf_counter()
+        signatures = load_signatures(conn, catalog)
+        print(f"[OK] Signatures computed in {time.perf_counter() - started:.1f}s")
+        conn.close()
+
+    engine = SimilarityEngine(catalog)
+    queries = random.Random(0).sample(catalog.perfume_ids, min(args.queries, len(catalog)))
+
+    print(f"\n{'bands':>6} {'recall@' + str(args.k):>10} {'candidates':>11} {'exact ms':>9} {'approx ms':>10}")
+    for bands in BAND_CHOICES:
+        lsh = MinHashLSH(signatures, bands)
+        recall, exact_ms, approx_ms, candidates = recall_at_k(engine, lsh, queries, args.k)
+        print(f"{bands:>6} {recall:>10.3f} {candidates:>11.0f} {exact_ms:>9.2f} {approx_ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
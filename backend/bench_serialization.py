@@ -0,0 +1,61 @@
+"""Time to encode a full /api/perfumes response: dicts + jsonify vs joined fragments.
+
+Usage:
+    python bench_serialization.py --sizes 100 1000 10000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from flask import jsonify
+
+from app import app, perfume_list_json
+from catalog import load_catalog
+from db import get_db
+from synthetic import generate_catalog
+
+
+def timed(function, repeat):
+    """Median wall time of function() in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'perfumes':>9} {'jsonify ms':>11} {'first join ms':>14} {'join ms':>8} {'speedup':>8} {'KB':>7}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.db')
+            generate_catalog(path, size, n_notes=300)
+            conn = get_db(path)
+            catalog = load_catalog(conn)
+            conn.close()
+
+        ids = catalog.perfume_ids
+        with app.app_context():
+            # What /api/perfumes did before: build every dict, encode the lot
+            before = timed(lambda: jsonify([catalog.perfume(perfume_id) for perfume_id in ids]).get_data(), args.repeat)
+
+            # First request after an import serializes each perfume once
+            started = time.perf_counter()
+            body = perfume_list_json(catalog, ids)
+            first = (time.perf_counter() - started) * 1000
+
+            after = timed(lambda: perfume_list_json(catalog, ids).encode(), args.repeat)
+
+        print(f"{size:>9} {before:>11.2f} {first:>14.2f} {after:>8.2f} {before / after:>7.1f}x {len(body) / 1024:>7.0f}")
+
+
+if __name__ == '__main__':
+    main()
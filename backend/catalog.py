@@ -0,0 +1,365 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from array import array
+
+from db import get_read_db
+
+
+# Sort keys usable for keyset pagination; each ends with the id so it is unique
+SORT_KEYS = {
+    'id': lambda perfume: [perfume['id']],
+    'year': lambda perfume: [perfume['year'] or 0, perfume['id']],
+    'name': lambda perfume: [perfume['name'].lower(), perfume['id']],
+}
+
+
+class Catalog:
+    """Read-only, ID-indexed snapshot of the perfumes, notes and their links.
+
+    A snapshot is never modified after it is built; when the database changes
+    the CatalogStore builds a new one and swaps it in.
+    """
+
+    def __init__(self, perfumes, notes, links, version=0, revision=None, updated_at=None):
+        self.version = version
+
+        # Catalog revision from catalog_meta and the unix time of the last
+        # change; None for databases without the table
+        self.revision = revision
+        self.updated_at = updated_at
+        # The HTTP ETag: the revision plus a digest of the content, so a write
+        # that did not move the revision still changes it
+        self.etag = f'{revision}.{content_digest(perfumes, notes, links)}' if revision is not None else None
+
+        # Perfumes keyed by id, plus the id order of `SELECT * FROM perfumes`
+        self.perfume_ids = [perfume['id'] for perfume in perfumes]
+        self.perfumes = {perfume['id']: perfume for perfume in perfumes}
+
+        # Notes keyed by id
+        self.notes = {note['id']: note for note in notes}
+
+        # Notes of each perfume in note id order
+        self.perfume_notes = {perfume_id: [] for perfume_id in self.perfume_ids}
+        for perfume_id, note_id, weight in links:
+            note = self.notes.get(note_id)
+            if note is None or perfume_id not in self.perfume_notes:
+                continue
+            self.perfume_notes[perfume_id].append({
+                'id': note_id,
+                'name': note['name'],
+                'type': note['type'],
+                'weight': weight,
+            })
+
+        # Same notes in the display order
+        self.sorted_notes = {
+            perfume_id: sort_notes(perfume_notes)
+            for perfume_id, perfume_notes in self.perfume_notes.items()
+        }
+
+        self.note_list = [
+            {'name': name, 'type': note_type}
+            for note_type, name in sorted({(n['type'], n['name']) for n in notes})
+        ]
+        self.fields = set(perfumes[0]) | {'notes'} if perfumes else {'notes'}
+        self.families = sorted({perfume['family'] for perfume in perfumes})
+        self.genders = sorted({perfume['gender'] for perfume in perfumes})
+
+        self._derived = {}
+        self._derived_lock = threading.RLock()
+
+        # JSON text of each full perfume, filled in as perfumes are served
+        self._fragments = {}
+
+    def __len__(self):
+        return len(self.perfume_ids)
+
+    def perfume(self, perfume_id, notes=True, fields=None):
+        """Return a fresh dict for one perfume (with its notes), or None.
+
+        `fields` optionally restricts the result to those keys; 'notes' is
+        one of them.
+        """
+        perfume = self.perfumes.get(perfume_id)
+        if perfume is None:
+            return None
+        if fields:
+            perfume = {field: perfume[field] for field in fields if field in perfume}
+        else:
+            perfume = dict(perfume)
+        if notes and (not fields or 'notes' in fields):
+            perfume['notes'] = list(self.sorted_notes[perfume_id])
+        return perfume
+
+    def perfume_json(self, perfume_id):
+        """JSON text of perfume(perfume_id), serialized once per snapshot.
+
+        Encoded like Flask's jsonify (sorted keys, compact, ASCII), so list
+        responses can be assembled by joining these fragments.
+        """
+        fragment = self._fragments.get(perfume_id)
+        if fragment is None:
+            fragment = json.dumps(self.perfume(perfume_id), sort_keys=True, separators=(',', ':'))
+            self._fragments[perfume_id] = fragment
+        return fragment
+
+    def matches(self, perfume_id, search='', gender='', family=''):
+        """Whether a perfume passes the /api/perfumes filters (search already lower-cased)"""
+        perfume = self.perfumes[perfume_id]
+        if search and search not in perfume['name'].lower() and search not in perfume['brand'].lower():
+            return False
+        if gender and perfume['gender'] != gender:
+            return False
+        if family and perfume['family'] != family:
+            return False
+        return True
+
+    def sort_order(self, sort, gender='', family=''):
+        """(keys, ids) of the perfumes with that gender and family ('' meaning any), ordered by SORT_KEYS[sort].
+
+        Built once per sort for every filter combination in one pass over the
+        sorted catalog, so a filtered page bisects its own list instead of
+        skipping the perfumes that do not match.
+        """
+        def build(catalog):
+            keyed = sorted((SORT_KEYS[sort](perfume), perfume_id) for perfume_id, perfume in catalog.perfumes.items())
+            orders = {}
+            for key, perfume_id in keyed:
+                perfume = catalog.perfumes[perfume_id]
+                for gender in ('', perfume['gender']):
+                    for family in ('', perfume['family']):
+                        keys, ids = orders.setdefault((gender, family), ([], []))
+                        keys.append(key)
+                        ids.append(perfume_id)
+            return orders
+        return self.derived(f'sort_order:{sort}', build).get((gender, family), ([], []))
+
+    def page(self, sort='id', after=None, limit=None, search='', gender='', family=''):
+        """Keyset pagination over the perfumes matching the /api/perfumes filters.
+
+        Returns (ids, last_key): up to `limit` ids (all if None) that sort
+        strictly after the key `after`, and the key of the last one if more
+        results follow. Without `search` a page costs a bisection and a
+        slice; name searches (used when there is no full-text index) scan
+        the filtered order from the cursor.
+        """
+        keys, ids = self.sort_order(sort, gender, family)
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+
+        if not search:
+            end = len(ids) if limit is None else start + limit
+            return ids[start:end], (keys[end - 1] if end < len(ids) else None)
+
+        search = search.lower()
+        page = []
+        for position in range(start, len(ids)):
+            if not self.matches(ids[position], search):
+                continue
+            if len(page) == limit:
+                return page, keys[page_end]
+            page.append(ids[position])
+            page_end = position
+        return page, None
+
+    def derived(self, name, build):
+        """Return a structure derived from this snapshot, building it on first use"""
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+            return self._derived[name]
+
+
+# Perfumes joined with their notes, one row per (perfume, note), grouped by
+# iter_perfumes. `{where}` filters on the perfumes table (alias p).
+PERFUMES_WITH_NOTES_QUERY = """
+    SELECT p.*, n.id AS note_id, n.name AS note_name, n.type AS note_type, pn.weight AS note_weight
+    FROM perfumes p
+    LEFT JOIN perfume_notes pn ON pn.perfume_id = p.id
+    LEFT JOIN notes n ON n.id = pn.note_id
+    {where}
+    ORDER BY p.id, pn.note_id
+"""
+
+NOTE_COLUMNS = ('note_id', 'note_name', 'note_type', 'note_weight')
+
+
+def iter_perfumes(conn, where='', params=()):
+    """Yield (perfume, notes) pairs from a single query, notes in note id order.
+
+    Rows are streamed from one cursor and grouped as they arrive, so memory
+    use does not depend on how many perfumes match.
+    """
+    cursor = conn.execute(PERFUMES_WITH_NOTES_QUERY.format(where=where), params)
+    columns = [column[0] for column in cursor.description]
+    perfume_columns = [i for i, name in enumerate(columns) if name not in NOTE_COLUMNS]
+    note_id, note_name, note_type, note_weight = (columns.index(name) for name in NOTE_COLUMNS)
+
+    perfume = None
+    notes = []
+    for row in cursor:
+        if perfume is None or row[0] != perfume['id']:
+            if perfume is not None:
+                yield perfume, notes
+            perfume = {columns[i]: row[i] for i in perfume_columns}
+            notes = []
+        if row[note_id] is not None:
+            notes.append({
+                'id': row[note_id],
+                'name': row[note_name],
+                'type': row[note_type],
+                'weight': row[note_weight],
+            })
+    if perfume is not None:
+        yield perfume, notes
+
+
+def sort_notes(notes):
+    """Notes in the display order (type, then weight descending)"""
+    return sorted(notes, key=lambda n: (n['type'], -(n['weight'] or 0)))
+
+
+def content_digest(perfumes, notes, links):
+    """Short digest of everything a snapshot serves"""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(repr([tuple(perfume.values()) for perfume in perfumes]).encode())
+    digest.update(repr(sorted((note['id'], note['name'], note['type']) for note in notes)).encode())
+    # Packed rather than repr'd: formatting the float weights dominates otherwise
+    perfume_ids, note_ids, weights = zip(*links) if links else ((), (), ())
+    for values in (array('q', perfume_ids), array('q', note_ids), array('d', weights)):
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def load_catalog(conn, version=0):
+    """Read the whole catalog through an open connection"""
+    perfumes = []
+    links = []
+    for perfume, notes in iter_perfumes(conn):
+        perfumes.append(perfume)
+        links.extend((perfume['id'], note['id'], note['weight']) for note in notes)
+
+    notes = [
+        {'id': note_id, 'name': name, 'type': note_type}
+        for note_id, name, note_type in conn.execute("SELECT id, name, type FROM notes")
+    ]
+
+    revision, updated_at = catalog_revision(conn)
+    return Catalog(perfumes, notes, links, version, revision, updated_at)
+
+
+def catalog_revision(conn):
+    """(revision, updated_at) from catalog_meta, or (None, None) without the table"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_meta'").fetchone():
+        return None, None
+    epoch, counter, updated_at = conn.execute("SELECT epoch, revision, updated_at FROM catalog_meta").fetchone()
+    return f'{epoch}-{counter}', updated_at
+
+
+class CatalogStore:
+    """Holds the current Catalog and reloads it when the database changes.
+
+    Changes are detected with `PRAGMA data_version` on a dedicated connection,
+    which moves whenever another connection commits, and with the identity of
+    the database file in case it has been replaced. With a `check_interval`
+    (seconds) the check runs at most that often and requests in between are
+    served from memory without touching SQLite.
+
+    One thread at a time checks and reloads; the new snapshot is built
+    outside of anything readers wait on and published by a single
+    assignment, so other threads keep getting the previous one meanwhile.
+    Only the first load makes callers wait.
+    """
+
+    def __init__(self, database, check_interval=0):
+        self.database = database
+        self.check_interval = check_interval
+        self._checked_at = None
+        self._conn = None
+        self._file_id = None
+        self._data_version = None
+        self._catalog = None
+        self._loads = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return the current snapshot, reloading it first if it is stale"""
+        catalog = self._catalog
+        now = time.monotonic()
+        if catalog is not None and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return catalog
+        # Another thread is already checking or reloading: serve what we have
+        if not self._lock.acquire(blocking=catalog is None):
+            return catalog
+        try:
+            if self._catalog is None or self._is_stale():
+                self._reload()
+            self._checked_at = now
+            return self._catalog
+        finally:
+            self._lock.release()
+
+    def reload(self):
+        """Force a reload of the snapshot"""
+        with self._lock:
+            self._reload()
+            return self._catalog
+
+    def close(self):
+        """Close the change-detection connection but keep the snapshot.
+
+        Used before forking. The next check opens a new connection and, as
+        data_version values only compare on the connection that read them,
+        compares the catalog revision instead.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _file_identity(self):
+        try:
+            stat = os.stat(self.database)
+        except OSError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def _is_stale(self):
+        if self._file_identity() != self._file_id:
+            return True
+        if self._conn is None:
+            self._conn = get_read_db(self.database, check_same_thread=False, isolation_level=None)
+            # Version first, as in _reload: a commit in between means a reload
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            revision = catalog_revision(self._conn)[0]
+            return revision is None or revision != self._catalog.revision
+        return self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+
+    def _reload(self):
+        file_id = self._file_identity()
+        if self._conn is None or file_id != self._file_id:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = get_read_db(self.database, check_same_thread=False, isolation_level=None)
+            self._file_id = file_id
+
+        # Read the version first: a commit landing in between only causes one
+        # extra reload. The catalog itself is read in a single transaction.
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._conn.execute("BEGIN")
+        try:
+            catalog = load_catalog(self._conn, self._loads + 1)
+        finally:
+            self._conn.execute("COMMIT")
+
+        previous = self._catalog
+        if previous is not None and catalog.revision == previous.revision and catalog.etag != previous.etag:
+            # Written without bump_revision: Last-Modified (whole seconds) has to move too
+            catalog.updated_at = max(previous.updated_at + 1, int(time.time()))
+
+        self._loads += 1
+        self._data_version = data_version
+        self._catalog = catalog
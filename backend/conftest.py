@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app as app_module
+import db
+from catalog import CatalogStore
+from db import ReadPool
+from result_cache import ResultCache
+from init_db import init_database
+
+# These scripts talk to a running server on localhost:5000; run them by hand.
+collect_ignore = ['test_api.py', 'test_db.py', 'test_find_by_notes.py']
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh copy of the seed database"""
+    path = str(tmp_path / 'perfumes.db')
+    init_database(path)
+    return path
+
+
+@pytest.fixture
+def bind_app(monkeypatch):
+    """Point the app at another database and return a test client for it"""
+    def bind(path):
+        monkeypatch.setattr(db, 'DATABASE', path)
+        monkeypatch.setattr(app_module, 'catalog_store', CatalogStore(path))
+        monkeypatch.setattr(app_module, 'read_pool', ReadPool(path))
+        monkeypatch.setattr(app_module, 'result_cache', ResultCache(maxsize=64))
+        app_module.app.config['TESTING'] = True
+        return app_module.app.test_client()
+    return bind
+
+
+@pytest.fixture
+def client(database, bind_app):
+    """Flask test client bound to the seed database"""
+    return bind_app(database)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Remote host stand-in serving server.files and recording what it was asked"""
+
+    def respond(self, body):
+        server = self.server
+        with server.lock:
+            server.requests[(self.command, self.path)] += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failures_left = server.failures.get(self.path, 0)
+            if failures_left:
+                server.failures[self.path] -= 1
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        content = server.files.get(self.path)
+        if failures_left:
+            self.send_response(503)
+            content = None
+        elif self.path in server.redirects:
+            self.send_response(302)
+            self.send_header('Location', server.redirects[self.path])
+            content = None
+        else:
+            self.send_response(200 if content is not None else 404)
+        self.send_header('Content-Length', str(len(content or b'')))
+        self.end_headers()
+        if body and content:
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """Start a local HTTP server for {path: bytes}; failures, redirects and delay can be set on it"""
+    servers = []
+
+    def start(files):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        server.files = files
+        server.lock = threading.Lock()
+        server.requests = Counter()
+        server.failures = {}
+        server.redirects = {}
+        server.in_flight = server.max_in_flight = 0
+        server.delay = 0
+        server.url = f'http://127.0.0.1:{server.server_port}'
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
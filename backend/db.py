@@ -0,0 +1,118 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Database served by the API; the command-line scripts take --database instead
+DATABASE = os.environ.get('PERFUME_DATABASE', 'perfumes.db')
+
+# Whether request connections count their statements and rows for
+# /api/metrics; PERFUME_SQL_METRICS=0 saves a Python call per statement and row
+SQL_METRICS = os.environ.get('PERFUME_SQL_METRICS', '1') != '0'
+
+# Applied to every long-lived read connection
+READ_PRAGMAS = [
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',  # 256 MB
+    'PRAGMA cache_size = -65536',    # 64 MB
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+]
+
+# Applied to connections used by init_db.py, the importer and the build scripts
+WRITE_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 30000',
+]
+
+# Prepared statements kept per connection by the sqlite3 module
+CACHED_STATEMENTS = 256
+
+class _SqlCounters(threading.local):
+    statements = 0
+    rows = 0
+
+# Statements run and rows fetched by CountingConnections, per thread;
+# metrics.py resets them at the start of each request
+sql_counters = _SqlCounters()
+
+def count_statement(statement):
+    sql_counters.statements += 1
+
+def counted_row(cursor, row):
+    sql_counters.rows += 1
+    return sqlite3.Row(cursor, row)
+
+class CountingConnection(sqlite3.Connection):
+    """Connection that counts its statements (trace callback) and rows (row factory)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(count_statement)
+        self.row_factory = counted_row
+
+def get_db(database=None, **kwargs):
+    conn = sqlite3.connect(database or DATABASE, **kwargs)
+    if conn.row_factory is None:
+        conn.row_factory = sqlite3.Row
+    return conn
+
+def get_read_db(database=None, counted=False, **kwargs):
+    """Connection tuned for reading; it refuses to write. `counted` feeds sql_counters"""
+    if counted:
+        kwargs['factory'] = CountingConnection
+    conn = get_db(database, cached_statements=CACHED_STATEMENTS, **kwargs)
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_write_db(database=None):
+    """Connection for writers: WAL mode, so readers keep working during imports"""
+    conn = get_db(database, cached_statements=CACHED_STATEMENTS)
+    for pragma in WRITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def dict_from_row(row):
+    return dict(zip(row.keys(), row))
+
+
+class ReadPool:
+    """Bounded pool of long-lived read connections shared by request threads.
+
+    Connections are opened on demand up to `size` and reused, so requests
+    skip connection setup and keep a warm page cache and statement cache.
+    A request that finds every connection busy waits for one to come back.
+    """
+
+    def __init__(self, database, size=8, counted=SQL_METRICS):
+        self.database = database
+        self.counted = counted
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = get_read_db(self.database, self.counted, check_same_thread=False)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
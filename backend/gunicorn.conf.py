@@ -0,0 +1,127 @@
+"""Gunicorn settings for serving the API with several worker processes.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+The app is loaded once in the master (preload_app), which then builds the
+catalog snapshot and the similarity structures and closes its SQLite
+connections before forking, so every worker starts warm and shares that
+memory copy-on-write instead of building its own copy.
+
+Workers serve the snapshot they were forked with. A thread in the master
+polls the catalog revision and, once it has moved and then stayed put for
+CATALOG_SETTLE_SECONDS, triggers a graceful reload (the same as
+`kill -HUP <master pid>`): the master loads the new catalog, forks fresh
+workers and lets the old ones finish their requests. An import moves the
+revision once per batch and again after rebuilding the neighbours and
+MinHash signatures; waiting for it to settle reloads once for all of it.
+
+Environment:
+    PORT                    port to listen on (5000)
+    WEB_CONCURRENCY         worker processes (CPU count)
+    GUNICORN_THREADS        threads per worker (4)
+    CATALOG_POLL_INTERVAL   seconds between catalog revision checks (5)
+    CATALOG_SETTLE_SECONDS  seconds the revision must stay unchanged before a reload (30)
+    PERFUME_DATABASE        database file (perfumes.db)
+"""
+import gc
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+CATALOG_POLL_INTERVAL = float(os.environ.get('CATALOG_POLL_INTERVAL', '5'))
+CATALOG_SETTLE_SECONDS = float(os.environ.get('CATALOG_SETTLE_SECONDS', '30'))
+
+
+def prepare_workers(server, reload=False):
+    """Build the shared state in the master and make it safe to fork"""
+    import app
+    started = time.perf_counter()
+    # Let the snapshot being replaced be collected
+    gc.unfreeze()
+    catalog = app.startup.run(reload)
+    app.close_connections()
+    # Objects that exist now are left alone by the collector, which would
+    # otherwise write to (and unshare) the pages that workers inherit
+    gc.collect()
+    gc.freeze()
+    server.log.info("Catalog revision %s loaded: %d perfumes in %.1fs",
+                    catalog.revision, len(catalog), time.perf_counter() - started)
+    return catalog
+
+
+def read_revision(database):
+    from catalog import catalog_revision
+    from db import get_read_db
+    conn = get_read_db(database)
+    try:
+        return catalog_revision(conn)[0]
+    finally:
+        conn.close()
+
+
+class RevisionDebounce:
+    """Tells when a moved catalog revision has stopped moving"""
+
+    def __init__(self, revision, settle):
+        self.revision = revision
+        self.settle = settle
+        self.pending = None
+        self.changed_at = None
+
+    def update(self, latest, now):
+        """Record a polled revision; True when the workers should be reloaded for it"""
+        if latest == self.revision:
+            self.pending = None
+        elif latest != self.pending:
+            self.pending, self.changed_at = latest, now
+        elif now - self.changed_at >= self.settle:
+            self.revision, self.pending = latest, None
+            return True
+        return False
+
+
+def watch_catalog(server, database, revision):
+    """Send the master SIGHUP once the catalog revision has changed and settled"""
+    debounce = RevisionDebounce(revision, CATALOG_SETTLE_SECONDS)
+    while True:
+        time.sleep(CATALOG_POLL_INTERVAL)
+        try:
+            latest = read_revision(database)
+        except Exception:
+            server.log.exception("Could not read the catalog revision")
+            continue
+        previous = debounce.revision
+        if debounce.update(latest, time.monotonic()):
+            server.log.info("Catalog revision %s -> %s, reloading workers", previous, latest)
+            os.kill(os.getpid(), signal.SIGHUP)
+
+
+def when_ready(server):
+    catalog = prepare_workers(server)
+    if catalog.revision is None:
+        server.log.warning("No catalog_meta table: send SIGHUP to load catalog changes")
+        return
+    import app
+    threading.Thread(target=watch_catalog, args=(server, app.catalog_store.database, catalog.revision),
+                     name='catalog-watcher', daemon=True).start()
+
+
+def on_reload(server):
+    prepare_workers(server, reload=True)
+
+
+def post_fork(server, worker):
+    # Keep the inherited snapshot; the master replaces the workers when it changes
+    import app
+    app.catalog_store.check_interval = float('inf')
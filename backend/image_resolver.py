@@ -0,0 +1,222 @@
+"""Find bottle images for imported perfumes, many at a time.
+
+Lookups run on a thread pool and share one keep-alive session. Each host
+gets its own concurrency cap and request rate, failed requests are retried
+with exponential backoff, and resolved URLs are kept in a JSON file so a
+re-run skips perfumes it already knows.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+CACHE_FILE = 'image_cache.json'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Many Fragrantica images follow this pattern
+IMAGE_BASE = 'https://fimgs.net/mdimg/perfume/'
+
+FALLBACK_IMAGES = {
+    'Men': 'https://images.unsplash.com/photo-1541643600914-78b084683601?w=400',
+    'Women': 'https://images.unsplash.com/photo-1588405748879-acb0738e1466?w=400',
+    'Unisex': 'https://images.unsplash.com/photo-1594035910387-fea47794261f?w=400'
+}
+FALLBACK_IMAGE = FALLBACK_IMAGES['Unisex']
+
+# Statuses worth another try; anything else is a final answer
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TransientError(Exception):
+    """A request that still failed after all retries"""
+
+
+class HostLimiter:
+    """At most `concurrency` requests in flight and `rate` request starts per second, per host"""
+
+    def __init__(self, concurrency=2, rate=2.0):
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate if rate else 0.0
+        self._slots = {}
+        self._next_start = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.concurrency)
+            slots = self._slots[host]
+        slots.acquire()
+
+        # Book the next start time for this host, then wait for it
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        self._slots[host].release()
+
+
+def image_key(name, brand):
+    return f'{brand.strip().lower()}|{name.strip().lower()}'
+
+
+def constructed_image_url(name, image_base=IMAGE_BASE):
+    slug = name.lower().replace(' ', '-').replace("'", "").replace('-', '')
+    return f'{image_base}375x500.{slug}.jpg'
+
+
+def image_from_page(html):
+    """Bottle image URL found in a Fragrantica perfume page, or None"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Look for perfume bottle image
+    img_tags = soup.find_all('img', {'itemprop': 'image'})
+    if img_tags and img_tags[0].get('src'):
+        return img_tags[0].get('src')
+
+    # Fallback: look for any large image
+    for img in soup.find_all('img'):
+        src = img.get('src', '')
+        if 'bottle' in src or 'perfume' in src or '200x200' in src:
+            return src
+    return None
+
+
+class ImageResolver:
+    """Resolves perfume image URLs concurrently, with a persistent cache"""
+
+    def __init__(self, cache_path=CACHE_FILE, workers=8, per_host=2, rate=2.0,
+                 retries=3, backoff=0.5, timeout=5, image_base=IMAGE_BASE):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.image_base = image_base
+        self.limiter = HostLimiter(per_host, rate)
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.cache = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self.cache = json.load(f)
+        self._cache_lock = threading.Lock()
+
+    def request(self, method, url):
+        """Send one request through the host limiter, retrying transient failures"""
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(host)
+            try:
+                response = self.session.request(method, url, timeout=self.timeout)
+            except requests.RequestException:
+                # Timeouts, resets, redirect loops, bad URLs: all worth another try
+                response = None
+            finally:
+                self.limiter.release(host)
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.retries:
+                raise TransientError(url)
+
+            delay = self.backoff * 2 ** attempt
+            retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            time.sleep(delay)
+
+    def lookup(self, name, url=None):
+        """(image_url, final): final is False, and image_url None, when a network failure decided the result"""
+        final = True
+
+        # Try the Fragrantica page first
+        if url and isinstance(url, str) and url.startswith('http'):
+            try:
+                response = self.request('GET', url)
+                if response.status_code == 200:
+                    image_url = image_from_page(response.content)
+                    if image_url:
+                        return image_url, True
+            except TransientError:
+                final = False
+            except Exception:
+                # A page the parser chokes on has no usable image
+                pass
+
+        # Then the usual image URL pattern
+        image_url = constructed_image_url(name, self.image_base)
+        try:
+            if self.request('HEAD', image_url).status_code == 200:
+                return image_url, True
+        except TransientError:
+            final = False
+
+        return (FALLBACK_IMAGE if final else None), final
+
+    def resolve(self, name, brand, url=None):
+        """Image URL for one perfume, from the cache when possible; None if the network failed"""
+        key = image_key(name, brand)
+        with self._cache_lock:
+            if key in self.cache:
+                return self.cache[key]
+
+        image_url, final = self.lookup(name, url)
+        if final:
+            # Network failures are not cached, so the next run tries again
+            with self._cache_lock:
+                self.cache[key] = image_url
+        return image_url
+
+    def resolve_all(self, perfumes, progress=None):
+        """Image URLs for [(name, brand, url)], in the same order.
+
+        `progress(done, total)` is called as lookups finish.
+        """
+        total = len(perfumes)
+        done = [0]
+        done_lock = threading.Lock()
+
+        def resolve(perfume):
+            image_url = self.resolve(*perfume)
+            if progress:
+                with done_lock:
+                    done[0] += 1
+                    progress(done[0], total)
+            return image_url
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(resolve, perfumes))
+        finally:
+            # Keep what was resolved even when the run is cut short
+            self.save()
+
+    def save(self):
+        """Write the cache atomically"""
+        if not self.cache_path:
+            return
+        with self._cache_lock:
+            cache = dict(self.cache)
+        temporary = self.cache_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(temporary, self.cache_path)
+
+    def close(self):
+        self.session.close()
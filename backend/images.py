@@ -0,0 +1,151 @@
+"""Local copies of perfume images, as small thumbnails.
+
+Each distinct image_url is downloaded once, shrunk to a fixed-size JPEG and
+stored under the SHA-256 of its bytes, so perfumes sharing a picture share
+one file. perfume_images records which file belongs to which perfume and
+for which image_url; the app serves it from /api/images/<perfume_id> and
+redirects to the original URL for anything not cached yet.
+
+Usage:
+    python images.py                  # cache images of perfumes without a thumbnail
+    python images.py --workers 16 --per-host 4
+"""
+import argparse
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_write_db
+
+DATABASE = 'perfumes.db'
+IMAGE_DIR = 'image_cache'
+
+# Cards show images at about 300x256 CSS pixels
+THUMBNAIL_SIZE = (300, 400)
+JPEG_QUALITY = 80
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    """JPEG bytes of the image in `data`, cropped and scaled to fill `size`"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        thumbnail = ImageOps.fit(image.convert('RGB'), size, Image.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+class ImageStore:
+    """Content-addressed files: <directory>/<digest[:2]>/<digest>.jpg"""
+
+    def __init__(self, directory=IMAGE_DIR):
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], f'{digest}.jpg')
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Store `data` unless an identical file exists; returns its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        return digest
+
+
+def thumbnail_digest(conn, perfume_id, source_url):
+    """Digest of the cached thumbnail of a perfume's current image, or None"""
+    row = conn.execute("SELECT digest FROM perfume_images WHERE perfume_id = ? AND source_url = ?",
+                       (perfume_id, source_url)).fetchone()
+    return row[0] if row else None
+
+
+def pending_images(conn, force=False):
+    """{image_url: [perfume_id]} for perfumes whose image has no thumbnail yet"""
+    query = '''
+        SELECT p.id, p.image_url
+        FROM perfumes p
+        LEFT JOIN perfume_images i ON i.perfume_id = p.id
+        WHERE p.image_url IS NOT NULL AND p.image_url != ''
+    '''
+    if not force:
+        query += " AND (i.source_url IS NULL OR i.source_url != p.image_url)"
+    pending = {}
+    for perfume_id, image_url in conn.execute(query):
+        pending.setdefault(image_url, []).append(perfume_id)
+    return pending
+
+
+def cache_images(conn, store, fetcher, workers=8, force=False, log=print):
+    """Download, shrink and store every pending image; returns (cached, failed) perfume counts.
+
+    `fetcher` is an ImageResolver, used for its host limits and retries.
+    Failed images are left out and tried again on the next run.
+    """
+    # Imported here: the API uses this module only for ImageStore and thumbnail_digest
+    from image_resolver import TransientError
+
+    pending = pending_images(conn, force)
+    log(f"{len(pending)} images to cache for {sum(map(len, pending.values()))} perfumes")
+
+    def fetch(image_url):
+        try:
+            response = fetcher.request('GET', image_url)
+            if response.status_code != 200:
+                return image_url, None
+            return image_url, store.put(make_thumbnail(response.content))
+        except (TransientError, OSError, ValueError):
+            # Network failures, and bodies that are not images
+            return image_url, None
+
+    cached = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for image_url, digest in pool.map(fetch, list(pending)):
+            perfume_ids = pending[image_url]
+            if digest is None:
+                failed += len(perfume_ids)
+                continue
+            conn.executemany('''
+                INSERT INTO perfume_images (perfume_id, source_url, digest) VALUES (?, ?, ?)
+                ON CONFLICT(perfume_id) DO UPDATE SET source_url = excluded.source_url, digest = excluded.digest
+            ''', [(perfume_id, image_url, digest) for perfume_id in perfume_ids])
+            cached += len(perfume_ids)
+    conn.commit()
+    return cached, failed
+
+
+def main():
+    from image_resolver import ImageResolver
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Download perfume images and store thumbnails')
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--directory', default=IMAGE_DIR)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--per-host', type=int, default=2, help='concurrent requests per host')
+    parser.add_argument('--rate', type=float, default=2.0, help='requests per second per host')
+    parser.add_argument('--force', action='store_true', help='download every image again')
+    args = parser.parse_args()
+
+    conn = get_write_db(args.database)
+    migrate(conn)
+    fetcher = ImageResolver(None, args.workers, args.per_host, args.rate)
+    try:
+        cached, failed = cache_images(conn, ImageStore(args.directory), fetcher, args.workers, args.force)
+    finally:
+        fetcher.close()
+        conn.close()
+    print(f"[OK] Cached thumbnails for {cached} perfumes, {failed} failed")
+
+
+if __name__ == '__main__':
+    main()
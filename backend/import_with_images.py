@@ -1,283 +1,379 @@
-import kagglehub
-import pandas as pd
-import sqlite3
+"""Import perfumes from the Fragrantica dataset on Kaggle.
+
+Usage:
+    python import_with_images.py                       # every perfume with >50 ratings
+    python import_with_images.py --start 100 --end 200 # a slice of them, most rated first
+    python import_with_images.py --csv fra_cleaned.csv --skip-images
+    python import_with_images.py --csv new_snapshot.csv --sync  # also update changed perfumes
+
+Rows are mapped with vectorized pandas operations, perfumes already in the
+database are skipped using one pre-loaded key set, and everything is
+written with executemany in large transactions. A hash of each source row
+is stored with the perfume, so --sync only rewrites the ones that changed.
+"""
+import argparse
+import hashlib
 import os
-import re
-import requests
-from bs4 import BeautifulSoup
 import time
 
+import numpy as np
+import pandas as pd
+
+from db import get_write_db
+from image_resolver import FALLBACK_IMAGE, ImageResolver, image_key
+from migrations import bump_revision, migrate
+from neighbors import build_neighbors
+from minhash import update_signatures
+
 DATABASE = 'perfumes.db'
+DATASET = "olgagmiufana1/fragrantica-com-fragrance-dataset"
 
-print("=" * 70)
-print("IMPORTING FRAGRANTICA WITH REAL PERFUME IMAGES")
-print("=" * 70)
-
-# Download dataset
-print("\n[Step 1/7] Downloading dataset...")
-path = kagglehub.dataset_download("olgagmiufana1/fragrantica-com-fragrance-dataset")
-print(f"[OK] Dataset ready")
-
-# Load CSV
-print("\n[Step 2/7] Loading dataset...")
-csv_file = os.path.join(path, 'fra_cleaned.csv')
-df = pd.read_csv(csv_file, encoding='latin-1', delimiter=';')
-df = df.dropna(subset=['Perfume', 'Brand'])
-df = df.drop_duplicates(subset=['Perfume', 'Brand'])
-print(f"[OK] Loaded {len(df)} unique perfumes")
-
-# Function to get real perfume image
-def get_perfume_image(perfume_name, brand_name, fragrantica_url=None):
-    """
-    Try to get real perfume image from Fragrantica or other sources
-    """
-    # Clean names
-    perfume_clean = perfume_name.lower().replace(' ', '-').replace("'", "")
-    brand_clean = brand_name.lower().replace(' ', '-').replace("'", "")
-    
-    # Try Fragrantica URL first
-    if fragrantica_url and isinstance(fragrantica_url, str) and fragrantica_url.startswith('http'):
-        try:
-            response = requests.get(fragrantica_url, timeout=5, headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Look for perfume bottle image
-                img_tags = soup.find_all('img', {'itemprop': 'image'})
-                if img_tags:
-                    img_url = img_tags[0].get('src')
-                    if img_url:
-                        return img_url
-                
-                # Fallback: look for any large image
-                img_tags = soup.find_all('img')
-                for img in img_tags:
-                    src = img.get('src', '')
-                    if 'bottle' in src or 'perfume' in src or '200x200' in src:
-                        return src
-        except Exception as e:
-            pass
-    
-    # Construct Fragrantica image URL pattern
-    # Many Fragrantica images follow this pattern
-    fragrantica_img = f"https://fimgs.net/mdimg/perfume/375x500.{perfume_clean.replace('-', '')}.jpg"
-    
-    # Try the constructed URL
-    try:
-        response = requests.head(fragrantica_img, timeout=3)
-        if response.status_code == 200:
-            return fragrantica_img
-    except:
-        pass
-    
-    # Generic fallback based on gender/type
-    fallback_images = {
-        'Men': 'https://images.unsplash.com/photo-1541643600914-78b084683601?w=400',
-        'Women': 'https://images.unsplash.com/photo-1588405748879-acb0738e1466?w=400',
-        'Unisex': 'https://images.unsplash.com/photo-1594035910387-fea47794261f?w=400'
-    }
-    
-    return fallback_images.get('Unisex')
+# Perfumes written per transaction
+BATCH_SIZE = 5000
+
+NOTE_TIERS = [('Top', 'top', 1.0), ('Middle', 'middle', 0.8), ('Base', 'base', 0.6)]
+NOTES_PER_TIER = 5
+DEFAULT_YEAR = 2020
+
+def download_dataset():
+    """Path of the dataset CSV, downloaded through kagglehub"""
+    import kagglehub
+    path = kagglehub.dataset_download(DATASET)
+    return os.path.join(path, 'fra_cleaned.csv')
+
+def load_dataset(csv_file):
+    df = pd.read_csv(csv_file, encoding='latin-1', delimiter=';')
+    df = df.dropna(subset=['Perfume', 'Brand'])
+    df = df.drop_duplicates(subset=['Perfume', 'Brand'])
+    return df
+
+def select_rows(df, min_ratings=50, start=0, end=None):
+    """Perfumes with more than `min_ratings` ratings, most rated first, rows start:end"""
+    df = df[df['Rating Count'] > min_ratings]
+    df = df.sort_values('Rating Count', ascending=False, kind='stable')
+    return df.iloc[start:end]
+
+def text_column(df, column):
+    """Lower-cased column, '' where missing"""
+    if column not in df:
+        return pd.Series('', index=df.index)
+    return df[column].fillna('').astype(str).str.lower()
 
 # Map functions
-def map_gender(gender_val):
-    if pd.isna(gender_val):
-        return 'Unisex'
-    gender_val = str(gender_val).lower().strip()
-    if 'women' in gender_val or 'female' in gender_val:
-        return 'Women'
-    elif 'men' in gender_val or 'male' in gender_val:
-        return 'Men'
+def map_gender(gender):
+    gender = gender.fillna('').astype(str).str.lower().str.strip()
+    women = gender.str.contains('women', regex=False) | gender.str.contains('female', regex=False)
+    men = gender.str.contains('men', regex=False) | gender.str.contains('male', regex=False)
+    return pd.Series(np.select([women, men], ['Women', 'Men'], 'Unisex'), index=gender.index)
+
+def map_family(df):
+    accord1 = text_column(df, 'mainaccord1')
+    accord2 = text_column(df, 'mainaccord2')
+
+    def first(word):
+        return accord1.str.contains(word, regex=False)
+
+    def either(word):
+        return first(word) | accord2.str.contains(word, regex=False)
+
+    woody = either('woody')
+    floral = ~woody & either('floral')
+    oriental = ~woody & ~floral & first('oriental')
+    rest = ~woody & ~floral & ~oriental
+
+    # The first matching rule wins
+    rules = [
+        (woody & either('aromatic'), 'Woody Aromatic'),
+        (woody & either('spicy'), 'Woody Spicy'),
+        (woody, 'Woody'),
+        (floral & either('fruity'), 'Floral Fruity'),
+        (floral & first('oriental'), 'Floral Oriental'),
+        (floral, 'Floral'),
+        (oriental & accord2.str.contains('vanilla', regex=False), 'Oriental Vanilla'),
+        (oriental & accord2.str.contains('spicy', regex=False), 'Oriental Spicy'),
+        (oriental, 'Oriental'),
+        (rest & (first('fresh') | first('citrus') | first('aquatic')), 'Fresh Aquatic'),
+        (rest & first('fruity'), 'Fruity'),
+        (rest & first('aromatic'), 'Aromatic'),
+    ]
+    families = np.select([condition for condition, _ in rules], [family for _, family in rules], 'Other')
+    return pd.Series(families, index=df.index)
+
+def map_year(year):
+    year = pd.to_numeric(year, errors='coerce')
+    valid = (year > 0) & (year == year.round())
+    return year.where(valid, DEFAULT_YEAR).astype(int)
+
+def describe(df):
+    """'A Woody, Citrus, Fresh fragrance.' from the first three main accords"""
+    joined = pd.Series('', index=df.index)
+    for i in range(1, 4):
+        if f'mainaccord{i}' not in df:
+            continue
+        accord = df[f'mainaccord{i}'].fillna('').astype(str).str.title()
+        joined = joined.where(accord == '', joined.where(joined == '', joined + ', ') + accord)
+    return ("A " + joined + " fragrance.").where(joined != '', "A captivating fragrance.")
+
+def prepare_perfumes(df):
+    """One row per perfume with the columns of the perfumes table"""
+    return pd.DataFrame({
+        'name': df['Perfume'].astype(str).str.strip(),
+        'brand': df['Brand'].astype(str).str.strip(),
+        'year': map_year(df['Year']) if 'Year' in df else DEFAULT_YEAR,
+        'gender': map_gender(df['Gender']) if 'Gender' in df else 'Unisex',
+        'family': map_family(df),
+        'description': describe(df),
+        'url': df['url'] if 'url' in df else None,
+    }, index=df.index)
+
+def prepare_notes(df):
+    """(row, name, type, weight) for every note link, top notes first, up to 5 per tier"""
+    tiers = []
+    for order, (column, note_type, weight) in enumerate(NOTE_TIERS):
+        if column not in df:
+            continue
+        notes = df[column].dropna().astype(str).str.split(r'[,;]', regex=True).explode().str.strip()
+        notes = notes[notes.str.len() > 2].str.title()
+        notes = notes.groupby(level=0).head(NOTES_PER_TIER)
+        tiers.append(pd.DataFrame({
+            'row': notes.index,
+            'order': order,
+            'name': notes.values,
+            'type': note_type,
+            'weight': weight,
+        }))
+    if not tiers:
+        return pd.DataFrame(columns=['row', 'name', 'type', 'weight'])
+
+    links = pd.concat(tiers, ignore_index=True)
+    # Rows in dataset order, tiers in order, notes in the order listed
+    position = pd.Series(np.arange(len(df)), index=df.index)
+    links['position'] = position.loc[links['row']].values
+    links = links.sort_values(['position', 'order'], kind='stable')
+    # A note listed in two tiers keeps the first one
+    links = links.drop_duplicates(['row', 'name'])
+    return links[['row', 'name', 'type', 'weight']]
+
+def source_hashes(perfumes, links):
+    """SHA-1 per perfume of everything the import writes for it, notes included"""
+    # Plain lists: iterating pandas string arrays element by element is slow
+    notes = {row: [] for row in perfumes.index}
+    for row, name, note_type, weight in zip(*(links[column].tolist() for column in ['row', 'name', 'type', 'weight'])):
+        notes[row].append(f'{name}:{note_type}:{weight}')
+
+    columns = perfumes[['name', 'brand', 'year', 'gender', 'family', 'description', 'url']].fillna('').astype(str)
+    hashes = [
+        hashlib.sha1('\x1f'.join(fields + ('|'.join(notes[row]),)).encode()).hexdigest()
+        for row, fields in zip(perfumes.index, zip(*(columns[column].tolist() for column in columns)))
+    ]
+    return pd.Series(hashes, index=perfumes.index)
+
+def link_diff(conn, links, perfume_ids):
+    """(stale, wanted): stored links of `perfume_ids` to delete, and links to insert or reweight"""
+    stored = {}
+    perfume_ids = [int(perfume_id) for perfume_id in perfume_ids]
+    # Chunked to stay under SQLite's bound parameter limit
+    for start in range(0, len(perfume_ids), 500):
+        chunk = perfume_ids[start:start + 500]
+        stored.update(((perfume_id, note_id), weight) for perfume_id, note_id, weight in conn.execute(
+            f"SELECT perfume_id, note_id, weight FROM perfume_notes WHERE perfume_id IN ({', '.join('?' * len(chunk))})",
+            chunk))
+
+    rows = links[['perfume_id', 'note_id', 'weight']].astype(object).itertuples(index=False, name=None)
+    wanted = [(perfume_id, note_id, weight) for perfume_id, note_id, weight in rows
+              if stored.get((perfume_id, note_id)) != weight]
+    keep = set(zip(links['perfume_id'], links['note_id']))
+    stale = [key for key in stored if key not in keep]
+    return stale, wanted
+
+def unchanged_rows(conn, perfumes, links):
+    """Rows of `perfumes` (with ids) whose stored fields and notes already match the dataset"""
+    wanted = {row: set() for row in perfumes.index}
+    for row, name, weight in zip(links['row'], links['name'], links['weight']):
+        if row in wanted:
+            wanted[row].add((name, weight))
+
+    ids = [int(perfume_id) for perfume_id in perfumes['id']]
+    stored_fields = {}
+    stored_notes = {perfume_id: set() for perfume_id in ids}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ', '.join('?' * len(chunk))
+        stored_fields.update((perfume_id, fields) for perfume_id, *fields in conn.execute(
+            f"SELECT id, year, gender, family, description FROM perfumes WHERE id IN ({marks})", chunk))
+        for perfume_id, name, weight in conn.execute(f"""
+            SELECT pn.perfume_id, n.name, pn.weight FROM perfume_notes pn JOIN notes n ON n.id = pn.note_id
+            WHERE pn.perfume_id IN ({marks})
+        """, chunk):
+            stored_notes[perfume_id].add((name, weight))
+
+    columns = perfumes[['year', 'gender', 'family', 'description']].astype(object).itertuples(index=False, name=None)
+    return [row for row, perfume_id, fields in zip(perfumes.index, ids, columns)
+            if stored_fields.get(perfume_id) == list(fields) and stored_notes[perfume_id] == wanted[row]]
+
+def import_perfumes(conn, df, resolver=None, fetch_images=True, batch_size=BATCH_SIZE, sync=False, log=print):
+    """Insert the dataset rows in `df` that are not in the database yet.
+
+    Each perfume's source hash is stored in perfume_sources. With `sync`,
+    perfumes already in the database whose hash changed are updated too
+    (their notes by diff), and unchanged ones are not touched at all.
+    Perfumes stored before hashes were kept (the seed data, older imports)
+    count as changed only if their fields or notes differ; otherwise just
+    their hash is recorded.
+
+    Image URLs are looked up with `resolver`; with `fetch_images` off only
+    its cache is used. New perfumes without an image get a generic one,
+    updated ones keep theirs. Returns (inserted_ids, updated_ids, skipped).
+    """
+    cursor = conn.cursor()
+    perfumes = prepare_perfumes(df)
+
+    # Perfumes repeated in the data keep their first row
+    keys = pd.Series(list(zip(perfumes['name'], perfumes['brand'])), index=perfumes.index)
+    perfumes = perfumes[~keys.duplicated()].copy()
+    keys = keys[perfumes.index]
+    links = prepare_notes(df.loc[perfumes.index])
+    perfumes['source_hash'] = source_hashes(perfumes, links)
+
+    existing = {(name, brand): (perfume_id, source_hash) for perfume_id, name, brand, source_hash in cursor.execute('''
+        SELECT p.id, p.name, p.brand, s.source_hash
+        FROM perfumes p LEFT JOIN perfume_sources s ON s.perfume_id = p.id
+    ''')}
+    stored = keys.map(lambda key: existing.get(key, (None, None)))
+    perfumes['id'] = [perfume_id for perfume_id, _ in stored]
+    is_new = perfumes['id'].isna()
+    if sync:
+        changed = ~is_new & (perfumes['source_hash'] != [source_hash for _, source_hash in stored])
+        unhashed = ~is_new & pd.Series([source_hash is None for _, source_hash in stored], index=perfumes.index)
+        if unhashed.any():
+            same = unchanged_rows(conn, perfumes[unhashed], links)
+            cursor.executemany("INSERT INTO perfume_sources (perfume_id, source_hash) VALUES (?, ?)",
+                               perfumes.loc[same, ['id', 'source_hash']].astype(object).itertuples(index=False, name=None))
+            changed[same] = False
     else:
-        return 'Unisex'
-
-def map_family(row):
-    accord1 = str(row.get('mainaccord1', '')).lower()
-    accord2 = str(row.get('mainaccord2', '')).lower()
-    
-    if 'woody' in accord1 or 'woody' in accord2:
-        if 'aromatic' in accord1 or 'aromatic' in accord2:
-            return 'Woody Aromatic'
-        elif 'spicy' in accord1 or 'spicy' in accord2:
-            return 'Woody Spicy'
-        return 'Woody'
-    elif 'floral' in accord1 or 'floral' in accord2:
-        if 'fruity' in accord1 or 'fruity' in accord2:
-            return 'Floral Fruity'
-        elif 'oriental' in accord1:
-            return 'Floral Oriental'
-        return 'Floral'
-    elif 'oriental' in accord1:
-        if 'vanilla' in accord2:
-            return 'Oriental Vanilla'
-        elif 'spicy' in accord2:
-            return 'Oriental Spicy'
-        return 'Oriental'
-    elif 'fresh' in accord1 or 'citrus' in accord1 or 'aquatic' in accord1:
-        return 'Fresh Aquatic'
-    elif 'fruity' in accord1:
-        return 'Fruity'
-    elif 'aromatic' in accord1:
-        return 'Aromatic'
+        changed = pd.Series(False, index=perfumes.index)
+    skipped = int(len(df) - is_new.sum() - changed.sum())
+    perfumes = perfumes[is_new | changed].copy()
+    is_new = is_new[perfumes.index]
+    links = links[links['row'].isin(perfumes.index)].copy()
+
+    if resolver is not None and fetch_images:
+        log(f"Fetching images for {len(perfumes)} perfumes...")
+        images = resolver.resolve_all(list(zip(perfumes['name'], perfumes['brand'], perfumes['url'])))
     else:
-        return 'Other'
-
-def parse_notes(notes_str):
-    if pd.isna(notes_str):
-        return []
-    notes = re.split(r'[,;]', str(notes_str))
-    notes = [n.strip().title() for n in notes if n.strip() and len(n.strip()) > 2]
-    return notes[:5]
-
-# Connect to database
-print("\n[Step 3/7] Connecting to database...")
-conn = sqlite3.connect(DATABASE)
-cursor = conn.cursor()
-
-cursor.execute("SELECT COUNT(*) FROM perfumes")
-initial_count = cursor.fetchone()[0]
-print(f"[OK] Current: {initial_count} perfumes")
-
-# Prepare data
-print("\n[Step 4/7] Preparing perfumes...")
-df_filtered = df[df['Rating Count'] > 50].copy()
-df_filtered = df_filtered.sort_values('Rating Count', ascending=False)
-# Import NEXT 100 perfumes (rows 100-200)
-df_import = df_filtered.iloc[100:200]
-
-print(f"\nWill import NEXT 100 popular perfumes (rows 100-200)")
-print("This will fetch REAL images from Fragrantica!")
-print(f"\nCurrent: {initial_count} perfumes")
-print(f"After: ~{initial_count + 100} perfumes")
-
-response = input("\nProceed with import? (yes/no): ").lower()
-if response != 'yes':
-    print("Import cancelled.")
-    conn.close()
-    exit(0)
+        cache = resolver.cache if resolver is not None else {}
+        images = [cache.get(image_key(name, brand)) for name, brand in zip(perfumes['name'], perfumes['brand'])]
+    # The generic picture only goes to new perfumes; NULL keeps the stored image
+    perfumes['image_url'] = [image_url if image_url not in (None, FALLBACK_IMAGE) else FALLBACK_IMAGE if new else None
+                             for image_url, new in zip(images, is_new)]
+
+    # Ids are assigned here so links can be written without a lookup per row
+    next_id = cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM perfumes").fetchone()[0]
+    perfumes.loc[is_new, 'id'] = np.arange(next_id, next_id + int(is_new.sum()))
+    perfumes['id'] = perfumes['id'].astype(int)
+    links['perfume_id'] = perfumes['id'].loc[links['row']].values
+
+    note_ids = {name: note_id for name, note_id in cursor.execute("SELECT name, id FROM notes")}
+    new_notes = links[~links['name'].isin(note_ids)].drop_duplicates('name')
+    next_note_id = cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM notes").fetchone()[0]
+    note_ids.update(zip(new_notes['name'], range(next_note_id, next_note_id + len(new_notes))))
+    links['note_id'] = links['name'].map(note_ids)
+
+    cursor.executemany("INSERT INTO notes (id, name, type) VALUES (?, ?, ?)",
+                       [(note_ids[name], name, note_type) for name, note_type in zip(new_notes['name'], new_notes['type'])])
+
+    columns = ['id', 'name', 'brand', 'year', 'gender', 'family', 'description', 'image_url']
+    for start in range(0, len(perfumes), batch_size):
+        batch = perfumes.iloc[start:start + batch_size]
+        # Updates keep the stored image when none was resolved
+        cursor.executemany(f'''
+            INSERT INTO perfumes ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+            ON CONFLICT(id) DO UPDATE SET
+                year = excluded.year, gender = excluded.gender, family = excluded.family,
+                description = excluded.description, image_url = COALESCE(excluded.image_url, image_url)
+        ''', batch[columns].astype(object).itertuples(index=False, name=None))
+
+        batch_links = links[links['row'].isin(batch.index)]
+        stale, wanted = link_diff(conn, batch_links, batch.loc[~is_new[batch.index], 'id'])
+        cursor.executemany("DELETE FROM perfume_notes WHERE perfume_id = ? AND note_id = ?", stale)
+        cursor.executemany('''
+            INSERT INTO perfume_notes (perfume_id, note_id, weight) VALUES (?, ?, ?)
+            ON CONFLICT(perfume_id, note_id) DO UPDATE SET weight = excluded.weight
+        ''', wanted)
+
+        cursor.executemany('''
+            INSERT INTO perfume_sources (perfume_id, source_hash) VALUES (?, ?)
+            ON CONFLICT(perfume_id) DO UPDATE SET source_hash = excluded.source_hash
+        ''', batch[['id', 'source_hash']].astype(object).itertuples(index=False, name=None))
+        bump_revision(cursor)
+        conn.commit()
+        log(f"  {start + len(batch)}/{len(perfumes)} perfumes written")
 
-# Install beautifulsoup4 if needed
-print("\n[Step 5/7] Checking dependencies...")
-try:
-    from bs4 import BeautifulSoup
-except:
-    print("Installing beautifulsoup4...")
-    os.system('py -m pip install beautifulsoup4 -q')
-    from bs4 import BeautifulSoup
+    conn.commit()
+    inserted = [int(perfume_id) for perfume_id in perfumes.loc[is_new, 'id']]
+    updated = [int(perfume_id) for perfume_id in perfumes.loc[~is_new, 'id']]
+    return inserted, updated, skipped
 
-print("[OK] Dependencies ready")
+def main():
+    parser = argparse.ArgumentParser(description='Import perfumes from the Fragrantica dataset')
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--csv', help='dataset CSV to use instead of downloading it')
+    parser.add_argument('--start', type=int, default=0, help='first row to import, most rated first')
+    parser.add_argument('--end', type=int, help='row to stop before (default: all of them)')
+    parser.add_argument('--min-ratings', type=int, default=50, help='skip perfumes with this many ratings or fewer')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='perfumes per transaction')
+    parser.add_argument('--skip-images', action='store_true',
+                        help='do not look images up; use cached ones or a generic picture')
+    parser.add_argument('--sync', action='store_true',
+                        help='update perfumes whose dataset row changed since they were imported')
+    parser.add_argument('--skip-precompute', action='store_true',
+                        help='do not update stored recommendations (run neighbors.py and minhash.py later)')
+    args = parser.parse_args()
 
-# Import perfumes with real images
-print("\n[Step 6/7] Importing perfumes with real images...")
-print("(This may take a few minutes - fetching images from web)")
+    print("=" * 70)
+    print("IMPORTING FRAGRANTICA PERFUMES")
+    print("=" * 70)
 
-cursor.execute("SELECT name, id FROM notes")
-note_id_map = {row[0]: row[1] for row in cursor.fetchall()}
+    csv_file = args.csv or download_dataset()
+    df = select_rows(load_dataset(csv_file), args.min_ratings, args.start, args.end)
+    print(f"[OK] {len(df)} perfumes selected from {csv_file}")
 
-imported = 0
-skipped = 0
-errors = 0
+    conn = get_write_db(args.database)
+    # Bring older databases up to the current schema (indexes, full-text search)
+    migrate(conn)
+    initial_count = conn.execute("SELECT COUNT(*) FROM perfumes").fetchone()[0]
 
-for idx, row in df_import.iterrows():
+    started = time.time()
+    resolver = ImageResolver()
     try:
-        name = str(row['Perfume']).strip()
-        brand = str(row['Brand']).strip()
-        
-        # Skip if exists
-        cursor.execute("SELECT id FROM perfumes WHERE name = ? AND brand = ?", (name, brand))
-        if cursor.fetchone():
-            skipped += 1
-            continue
-        
-        year = int(row['Year']) if not pd.isna(row['Year']) and str(row['Year']).isdigit() else 2020
-        gender = map_gender(row['Gender'])
-        family = map_family(row)
-        
-        # Create description
-        accords = [row.get(f'mainaccord{i}', '') for i in range(1, 4)]
-        accords = [str(a).title() for a in accords if not pd.isna(a) and str(a) != 'nan']
-        description = f"A {', '.join(accords[:3])} fragrance." if accords else "A captivating fragrance."
-        
-        # Get REAL image URL
-        fragrantica_url = row.get('url', None)
-        print(f"\n  [{imported+1}/100] {name} by {brand}")
-        print(f"    Fetching image...", end='', flush=True)
-        
-        image_url = get_perfume_image(name, brand, fragrantica_url)
-        
-        if image_url and 'unsplash' not in image_url:
-            print(f" [REAL IMAGE]")
-        else:
-            print(f" [Generic]")
-        
-        # Insert perfume
-        cursor.execute('''
-            INSERT INTO perfumes (name, brand, year, gender, family, description, image_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (name, brand, year, gender, family, description, image_url))
-        
-        perfume_id = cursor.lastrowid
-        
-        # Add notes
-        top_notes = parse_notes(row.get('Top', ''))
-        middle_notes = parse_notes(row.get('Middle', ''))
-        base_notes = parse_notes(row.get('Base', ''))
-        
-        for note_name in top_notes:
-            if note_name not in note_id_map:
-                cursor.execute("INSERT INTO notes (name, type) VALUES (?, ?)", (note_name, 'top'))
-                note_id_map[note_name] = cursor.lastrowid
-            cursor.execute('INSERT OR IGNORE INTO perfume_notes (perfume_id, note_id, weight) VALUES (?, ?, ?)',
-                         (perfume_id, note_id_map[note_name], 1.0))
-        
-        for note_name in middle_notes:
-            if note_name not in note_id_map:
-                cursor.execute("INSERT INTO notes (name, type) VALUES (?, ?)", (note_name, 'middle'))
-                note_id_map[note_name] = cursor.lastrowid
-            cursor.execute('INSERT OR IGNORE INTO perfume_notes (perfume_id, note_id, weight) VALUES (?, ?, ?)',
-                         (perfume_id, note_id_map[note_name], 0.8))
-        
-        for note_name in base_notes:
-            if note_name not in note_id_map:
-                cursor.execute("INSERT INTO notes (name, type) VALUES (?, ?)", (note_name, 'base'))
-                note_id_map[note_name] = cursor.lastrowid
-            cursor.execute('INSERT OR IGNORE INTO perfume_notes (perfume_id, note_id, weight) VALUES (?, ?, ?)',
-                         (perfume_id, note_id_map[note_name], 0.6))
-        
-        imported += 1
-        
-        if imported % 10 == 0:
-            conn.commit()
-        
-        # Small delay to be respectful to Fragrantica
-        time.sleep(0.5)
-    
-    except Exception as e:
-        errors += 1
-        print(f"    [ERROR] {e}")
-        continue
-
-conn.commit()
-
-cursor.execute("SELECT COUNT(*) FROM perfumes")
-final_count = cursor.fetchone()[0]
-
-cursor.execute("SELECT COUNT(*) FROM notes")
-notes_count = cursor.fetchone()[0]
-
-conn.close()
-
-print(f"\n[Step 7/7] Import complete!")
-print(f"\n{'=' * 70}")
-print("IMPORT SUMMARY")
-print(f"{'=' * 70}")
-print(f"[OK] Successfully imported: {imported} perfumes")
-print(f"[SKIP] Already existed: {skipped} perfumes")
-print(f"[ERROR] Failed imports: {errors} perfumes")
-print(f"\nDatabase stats:")
-print(f"  - Total perfumes: {final_count} (was {initial_count})")
-print(f"  - Total notes: {notes_count}")
-print(f"\n[SUCCESS] Perfumes imported with REAL images from Fragrantica!")
-print(f"{'=' * 70}")
+        inserted, updated, skipped = import_perfumes(conn, df, resolver, not args.skip_images, args.batch_size,
+                                                     sync=args.sync)
+    finally:
+        resolver.close()
+    elapsed = time.time() - started
+
+    if (inserted or updated) and not args.skip_precompute:
+        # Refresh precomputed recommendations affected by the new and changed perfumes
+        print("Updating recommendations...")
+        build_neighbors(conn, incremental=True, changed_ids=inserted + updated)
+        update_signatures(conn)
+
+    final_count = conn.execute("SELECT COUNT(*) FROM perfumes").fetchone()[0]
+    notes_count = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+    conn.close()
+
+    print(f"\n{'=' * 70}")
+    print("IMPORT SUMMARY")
+    print(f"{'=' * 70}")
+    print(f"[OK] Imported: {len(inserted)} perfumes in {elapsed:.1f}s ({len(df) / max(elapsed, 1e-9):.0f} rows/sec)")
+    if args.sync:
+        print(f"[OK] Updated: {len(updated)} changed perfumes")
+    print(f"[SKIP] Already existed{' unchanged' if args.sync else ''}: {skipped} perfumes")
+    print(f"\nDatabase stats:")
+    print(f"  - Total perfumes: {final_count} (was {initial_count})")
+    print(f"  - Total notes: {notes_count}")
+    print(f"{'=' * 70}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Throughput of the gunicorn setup for different worker counts.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py wsgi:application`
+on a catalog from synthetic.generate_realistic_catalog, drives it over HTTP
+from several client processes for a fixed time and reports requests per
+second, latency percentiles and (on Linux) how much of each worker's memory
+is still shared with the master.
+
+Usage:
+    python load_test.py --workers 1 2 4 --size 20000 --duration 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_api import summarize
+
+# (path(rng, size), weight); the read traffic of the frontend
+REQUESTS = [
+    (lambda rng, size: f'/api/perfumes/{rng.randint(1, size)}', 4),
+    (lambda rng, size: f'/api/recommendations/{rng.randint(1, size)}', 3),
+    (lambda rng, size: f"/api/perfumes?limit=20&sort={rng.choice(['id', 'name', 'year'])}", 2),
+    (lambda rng, size: f"/api/perfumes/batch?ids={','.join(str(rng.randint(1, size)) for _ in range(10))}", 1),
+    (lambda rng, size: '/api/filters', 1),
+]
+
+STARTUP_TIMEOUT = 300
+
+
+def make_paths(size, count, seed):
+    rng = random.Random(seed)
+    makers = [maker for maker, weight in REQUESTS for _ in range(weight)]
+    return [rng.choice(makers)(rng, size) for _ in range(count)]
+
+
+def run_client(port, paths, duration, connections):
+    """Send `paths` round-robin over keep-alive connections; (latencies in ms, errors)"""
+    deadline = time.monotonic() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def loop(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        times = []
+        i = offset
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', paths[i % len(paths)])
+                response = conn.getresponse()
+                response.read()
+                failed = response.status >= 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                failed = True
+            times.append((time.perf_counter() - started) * 1000)
+            if failed:
+                with lock:
+                    errors[0] += 1
+            i += 1
+        conn.close()
+        with lock:
+            latencies.extend(times)
+
+    threads = [threading.Thread(target=loop, args=(n * 997,)) for n in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def wait_until_ready(port, server):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/filters')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def worker_memory_mb(master_pid):
+    """[(rss, private)] in MB per worker, from /proc; None where it cannot be read"""
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+            pids = f.read().split()
+        memory = []
+        for pid in pids:
+            fields = {}
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if value.strip().endswith('kB'):
+                        fields[name] = int(value.split()[0])
+            private = fields['Private_Clean'] + fields['Private_Dirty']
+            memory.append((round(fields['Rss'] / 1024, 1), round(private / 1024, 1)))
+        return memory
+    except (OSError, KeyError):
+        return None
+
+
+def measure(database, size, workers, args):
+    env = dict(os.environ, PERFUME_DATABASE=database, PORT=str(args.port),
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(args.threads))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(args.port, server)
+        paths = [make_paths(size, 5000, args.seed + client) for client in range(args.clients)]
+        # A short warm-up so every worker has served a few requests
+        run_client(args.port, paths[0], 1, args.connections)
+        with ProcessPoolExecutor(max_workers=args.clients) as pool:
+            jobs = [pool.submit(run_client, args.port, client_paths, args.duration, args.connections)
+                    for client_paths in paths]
+            results = [job.result() for job in jobs]
+        memory = worker_memory_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [latency for times, _ in results for latency in times]
+    return {
+        'throughput': round(len(latencies) / args.duration, 1),
+        'errors': sum(errors for _, errors in results),
+        'latency': summarize(latencies),
+        'memory': memory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--size', type=int, default=20000, help='perfumes in the synthetic catalog')
+    parser.add_argument('--database', help='serve this database instead of a synthetic one')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per worker count')
+    parser.add_argument('--clients', type=int, default=max(2, multiprocessing.cpu_count() // 2),
+                        help='client processes')
+    parser.add_argument('--connections', type=int, default=8, help='connections per client process')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = args.database
+        size = args.size
+        if database is None:
+            from synthetic import generate_realistic_catalog
+            database = os.path.join(directory, 'load.db')
+            print(f"Generating {size} perfumes...")
+            generate_realistic_catalog(database, size, seed=args.seed)
+        else:
+            import sqlite3
+            conn = sqlite3.connect(database)
+            size = conn.execute("SELECT MAX(id) FROM perfumes").fetchone()[0]
+            conn.close()
+
+        print(f"\n{'workers':>7} {'req/s':>9} {'scaling':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'errors':>7}  worker RSS / private MB")
+        # Scaling is relative to the first worker count
+        first = None
+        for workers in args.workers:
+            result = measure(database, size, workers, args)
+            first = first or result['throughput']
+            latency = result['latency']
+            memory = ', '.join(f'{rss}/{private}' for rss, private in result['memory'] or [])
+            print(f"{workers:>7} {result['throughput']:>9.1f} {result['throughput'] / first:>7.2f}x "
+                  f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} "
+                  f"{result['errors']:>7}  {memory or 'n/a'}")
+
+
+if __name__ == '__main__':
+    main()
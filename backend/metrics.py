@@ -0,0 +1,169 @@
+"""Request metrics in the Prometheus text format.
+
+Every request records its latency, response size and the number of SQL
+statements and rows it caused, per Flask endpoint. Recording is a few
+counter increments under a lock; formatting only happens when
+/api/metrics is scraped.
+
+SQL statements and rows come from the per-thread counters that the app's
+request connections keep (db.CountingConnection); each request resets
+them. Snapshot loads are not counted, and PERFUME_SQL_METRICS=0 turns the
+counting off.
+
+The figures belong to the process that serves the scrape. Under gunicorn
+each worker keeps its own, so every request series carries a `worker`
+label (the pid) and Prometheus sums across workers with e.g.
+`sum without (worker) (rate(api_requests_total[5m]))`.
+"""
+import math
+import os
+import threading
+import time
+
+from flask import g, request
+
+from db import sql_counters
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+STATEMENT_BUCKETS = [0, 1, 2, 3, 5, 10, 25, 50, 100]
+ROW_BUCKETS = [0, 1, 10, 100, 1000, 10000, 100000, 1000000]
+SIZE_BUCKETS = [100, 1000, 10000, 100000, 1000000, 10000000]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label tuple"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label_values, value):
+        # [per-bucket counts..., +Inf count], sum
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+
+    def render(self, extra_labels=()):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total) in sorted(self.series.items()):
+            labels = list(zip(self.labels, label_values)) + list(extra_labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + [math.inf], counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else format_value(bound)
+                lines.append(f'{self.name}_bucket{format_labels(labels + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+def format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    escape = lambda value: str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def render_metric(name, kind, help, samples):
+    """Lines for a gauge or counter; `samples` is [(labels dict, value)] or a single value"""
+    if not isinstance(samples, list):
+        samples = [({}, samples)]
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        lines.append(f'{name}{format_labels(list(labels.items()))} {format_value(value)}')
+    return lines
+
+
+class RequestMetrics:
+    """Per-endpoint request metrics for a Flask app"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def reset(self):
+        self.requests = {}
+        self.latency = Histogram('api_request_duration_seconds', 'Time spent handling requests.',
+                                 ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.statements = Histogram('api_sql_statements_per_request', 'SQL statements executed per request.',
+                                    ('endpoint',), STATEMENT_BUCKETS)
+        self.rows = Histogram('api_sql_rows_per_request', 'SQL rows fetched per request.',
+                              ('endpoint',), ROW_BUCKETS)
+        self.sizes = Histogram('api_response_bytes', 'Response body sizes.', ('endpoint',), SIZE_BUCKETS)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        sql_counters.statements = sql_counters.rows = 0
+        g.metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        labels = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+        if response.content_length is None and response.is_streamed:
+            # Generated bodies (the export) run after this hook; record them once sent
+            response.response = self._observe_stream(response.response, labels, started)
+        else:
+            self.observe(labels, started, response.content_length or 0)
+        return response
+
+    def _observe_stream(self, chunks, labels, started):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            self.observe(labels, started, size)
+
+    def observe(self, labels, started, size):
+        """Record one finished request; SQL counts come from this thread's counters"""
+        elapsed = time.perf_counter() - started
+        endpoint, method, _ = labels
+        with self._lock:
+            self.requests[labels] = self.requests.get(labels, 0) + 1
+            self.latency.observe((endpoint, method), elapsed)
+            self.statements.observe((endpoint,), sql_counters.statements)
+            self.rows.observe((endpoint,), sql_counters.rows)
+            self.sizes.observe((endpoint,), size)
+
+    def render(self, gauges=()):
+        """Prometheus text for the request metrics, then `gauges` [(name, kind, help, samples)]"""
+        # Read at render time: the app is created before gunicorn forks
+        worker = str(os.getpid())
+        with self._lock:
+            lines = render_metric('api_requests_total', 'counter', 'Requests handled.', [
+                ({'endpoint': endpoint, 'method': method, 'status': status, 'worker': worker}, count)
+                for (endpoint, method, status), count in sorted(self.requests.items())
+            ])
+            for histogram in (self.latency, self.statements, self.rows, self.sizes):
+                lines.extend(histogram.render([('worker', worker)]))
+        for name, kind, help, samples in gauges:
+            lines.extend(render_metric(name, kind, help, samples))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,230 @@
+"""Versioned schema migrations, tracked in SQLite's `PRAGMA user_version`.
+
+Each migration runs in its own transaction together with the version bump,
+so an existing perfumes.db is upgraded in place and a failed migration
+leaves it at the previous version.
+
+Usage:
+    python migrations.py    # upgrade perfumes.db to the latest version
+"""
+import argparse
+
+from db import get_write_db
+from search import create_search_index
+
+DATABASE = 'perfumes.db'
+
+
+def create_base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS perfumes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            year INTEGER,
+            gender TEXT NOT NULL,
+            family TEXT NOT NULL,
+            description TEXT,
+            image_url TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL CHECK(type IN ('top', 'middle', 'base'))
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS perfume_notes (
+            perfume_id INTEGER NOT NULL,
+            note_id INTEGER NOT NULL,
+            weight REAL DEFAULT 1.0,
+            PRIMARY KEY (perfume_id, note_id),
+            FOREIGN KEY (perfume_id) REFERENCES perfumes(id),
+            FOREIGN KEY (note_id) REFERENCES notes(id)
+        )
+    ''')
+
+
+def create_precomputed_tables(cursor):
+    # Imported here as both modules load numpy
+    from minhash import create_minhash_table
+    from neighbors import create_neighbors_table
+
+    create_neighbors_table(cursor)
+    create_minhash_table(cursor)
+
+
+def dedupe_notes(cursor):
+    """Merge notes that share a name into the one with the lowest id"""
+    cursor.execute("SELECT COUNT(*) - COUNT(DISTINCT name) FROM notes")
+    if not cursor.fetchone()[0]:
+        return
+
+    keep = "SELECT MIN(id) FROM notes GROUP BY name"
+    # Relink to the kept note; links that already exist are dropped below
+    cursor.execute(f'''
+        UPDATE OR IGNORE perfume_notes
+        SET note_id = (
+            SELECT MIN(kept.id) FROM notes kept
+            JOIN notes dup ON dup.name = kept.name
+            WHERE dup.id = perfume_notes.note_id
+        )
+        WHERE note_id NOT IN ({keep})
+    ''')
+    cursor.execute(f"DELETE FROM perfume_notes WHERE note_id NOT IN ({keep})")
+    cursor.execute(f"DELETE FROM notes WHERE id NOT IN ({keep})")
+
+    # Stored neighbour lists may name the merged notes; the app scores live
+    # until neighbors.py (or the next import) rebuilds them
+    cursor.execute("DELETE FROM perfume_neighbors")
+
+
+def create_indexes(cursor):
+    dedupe_notes(cursor)
+    # Perfumes with a given note, without touching the table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_perfume_notes_note ON perfume_notes (note_id, perfume_id, weight)")
+    # Gender and family filters
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_perfumes_gender_family ON perfumes (gender, family)")
+    # The importer's duplicate check
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_perfumes_name_brand ON perfumes (name, brand)")
+    # The importer and init_db.py look notes up by name
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_name ON notes (name)")
+
+
+def create_catalog_meta(cursor):
+    """A revision counter that every write to the catalog tables moves.
+
+    The epoch is random per database, so revisions of a recreated database
+    never repeat earlier ones.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            epoch TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO catalog_meta (id, epoch, revision, updated_at)
+        VALUES (1, lower(hex(randomblob(8))), 1, CAST(strftime('%s', 'now') AS INTEGER))
+    ''')
+    for table in ['perfumes', 'notes', 'perfume_notes']:
+        for event in ['INSERT', 'UPDATE', 'DELETE']:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_revision AFTER {event} ON {table} BEGIN
+                    UPDATE catalog_meta
+                    SET revision = revision + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER);
+                END
+            ''')
+
+
+def bump_revision(cursor):
+    """Move the catalog revision once for the current transaction.
+
+    Every writer to perfumes, notes or perfume_notes (init_db.py, the
+    importer, synthetic.py) calls this before committing, and so do the
+    neighbour and MinHash builds, whose tables back the recommendations.
+    The app serves the revision as the ETag, and the gunicorn master
+    watches it.
+    """
+    cursor.execute("UPDATE catalog_meta SET revision = revision + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)")
+
+
+def drop_revision_triggers(cursor):
+    """Per-row triggers ran an UPDATE of catalog_meta for every link written; writers call bump_revision instead"""
+    for table in ['perfumes', 'notes', 'perfume_notes']:
+        for event in ['insert', 'update', 'delete']:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{event}_revision")
+
+
+def create_source_hashes(cursor):
+    """Hash of the dataset row each imported perfume came from.
+
+    Kept out of the perfumes table so API responses and the catalog
+    revision are unaffected by it.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS perfume_sources (
+            perfume_id INTEGER PRIMARY KEY,
+            source_hash TEXT NOT NULL,
+            FOREIGN KEY (perfume_id) REFERENCES perfumes(id)
+        )
+    ''')
+
+
+def create_image_table(cursor):
+    """Which cached thumbnail (by digest) belongs to each perfume, and for which image_url"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS perfume_images (
+            perfume_id INTEGER PRIMARY KEY,
+            source_url TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            FOREIGN KEY (perfume_id) REFERENCES perfumes(id)
+        )
+    ''')
+
+
+# (version, description, migration); append new ones, never edit old ones
+MIGRATIONS = [
+    (1, 'catalog tables', create_base_schema),
+    (2, 'full-text search index', create_search_index),
+    (3, 'precomputed recommendation tables', create_precomputed_tables),
+    (4, 'secondary indexes, unique note names', create_indexes),
+    (5, 'catalog revision counter', create_catalog_meta),
+    (6, 'source row hashes for delta imports', create_source_hashes),
+    (7, 'cached thumbnails', create_image_table),
+    (8, 'revision moved once per transaction', drop_revision_triggers),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations; returns the versions applied"""
+    applied = []
+    for version, _, migration in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        conn.execute("BEGIN")
+        try:
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+def drop_tables(conn):
+    """Drop every catalog table, for init_db.py --reset"""
+    tables = ['perfume_images', 'perfume_sources', 'catalog_meta', 'perfumes_fts',
+              'perfume_neighbors', 'perfume_minhash', 'perfume_notes', 'notes', 'perfumes']
+    for table in tables:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Upgrade the database schema')
+    parser.add_argument('--database', default=DATABASE)
+    args = parser.parse_args()
+
+    conn = get_write_db(args.database)
+    applied = migrate(conn)
+    for version, description, _ in MIGRATIONS:
+        if version in applied:
+            print(f"[OK] Migration {version}: {description}")
+    print(f"Schema version {schema_version(conn)}")
+    conn.close()
@@ -0,0 +1,147 @@
+"""Precomputed nearest neighbours for /api/recommendations/<id>.
+
+Usage:
+    python neighbors.py                # rebuild every perfume's neighbours
+    python neighbors.py --incremental  # only perfumes affected by new imports
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from catalog import load_catalog
+from db import get_write_db
+from migrations import bump_revision
+from similarity import SimilarityEngine
+
+DATABASE = 'perfumes.db'
+
+# Neighbours stored per perfume; requests for more fall back to live scoring
+DEFAULT_K = 20
+
+NEIGHBORS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS perfume_neighbors (
+        perfume_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbor_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        shared_note_ids TEXT NOT NULL,
+        PRIMARY KEY (perfume_id, rank)
+    )
+'''
+
+
+def create_neighbors_table(cursor):
+    cursor.execute(NEIGHBORS_SCHEMA)
+
+
+def load_neighbors(conn):
+    """{perfume_id: [(neighbor_id, score, shared_note_ids)]} in rank order"""
+    neighbors = {}
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'perfume_neighbors'").fetchone():
+        return neighbors
+    cursor = conn.execute("""
+        SELECT perfume_id, neighbor_id, score, shared_note_ids
+        FROM perfume_neighbors
+        ORDER BY perfume_id, rank
+    """)
+    for perfume_id, neighbor_id, score, shared_note_ids in cursor:
+        neighbors.setdefault(perfume_id, []).append((neighbor_id, score, json.loads(shared_note_ids)))
+    return neighbors
+
+
+def neighbor_rows(catalog, engine, perfume_id, k):
+    """Rows to store for one perfume, ranked exactly like the live endpoint"""
+    target_note_ids = set(note['id'] for note in catalog.perfume_notes[perfume_id])
+    rows = []
+    for rank, (neighbor_id, score) in enumerate(engine.recommend(perfume_id, k)):
+        shared = [note['id'] for note in catalog.perfume_notes[neighbor_id] if note['id'] in target_note_ids]
+        rows.append((perfume_id, rank, neighbor_id, score, json.dumps(shared)))
+    return rows
+
+
+def affected_perfumes(catalog, engine, stored, changed_ids, k):
+    """Perfumes whose stored neighbour list may differ from a fresh computation"""
+    affected = set(changed_ids)
+
+    # Lists pointing at perfumes that were changed or no longer exist
+    for perfume_id, neighbors in stored.items():
+        if perfume_id in catalog.perfumes and any(
+                neighbor_id in affected or neighbor_id not in catalog.perfumes
+                for neighbor_id, _, _ in neighbors):
+            affected.add(perfume_id)
+
+    # Score each perfume must beat to enter a stored list; lists that are
+    # short or missing take anyone
+    threshold = np.full(len(engine.perfume_ids), -np.inf)
+    for perfume_id, neighbors in stored.items():
+        row = engine.row_of.get(perfume_id)
+        if row is not None and len(neighbors) >= k:
+            threshold[row] = neighbors[-1][1]
+
+    # A changed perfume can push its way into other perfumes' top k. The
+    # margin covers rounding ties; recomputing a few extra lists is harmless.
+    for changed_id in changed_ids:
+        scores = engine.scores(engine.row_of[changed_id])
+        for row in np.flatnonzero(scores >= threshold - 0.001):
+            affected.add(engine.perfume_ids[row])
+
+    return affected
+
+
+def build_neighbors(conn, k=DEFAULT_K, incremental=False, changed_ids=None):
+    """Compute and store neighbours; returns how many perfumes were recomputed.
+
+    A full build recomputes everything. An incremental build recomputes the
+    perfumes in `changed_ids` (default: those with no stored neighbours yet)
+    and every stored list they could affect.
+    """
+    cursor = conn.cursor()
+    create_neighbors_table(cursor)
+
+    catalog = load_catalog(conn)
+    engine = SimilarityEngine(catalog)
+
+    if incremental:
+        stored = load_neighbors(conn)
+        if changed_ids is None:
+            changed_ids = [perfume_id for perfume_id in catalog.perfume_ids if perfume_id not in stored]
+        changed_ids = [perfume_id for perfume_id in changed_ids if perfume_id in catalog.perfumes]
+        targets = affected_perfumes(catalog, engine, stored, changed_ids, k)
+
+        # Drop lists of perfumes that are gone, and the ones being recomputed
+        gone = [perfume_id for perfume_id in stored if perfume_id not in catalog.perfumes]
+        cursor.executemany("DELETE FROM perfume_neighbors WHERE perfume_id = ?",
+                           [(perfume_id,) for perfume_id in gone + sorted(targets)])
+    else:
+        targets = catalog.perfume_ids
+        gone = []
+        cursor.execute("DELETE FROM perfume_neighbors")
+
+    for perfume_id in targets:
+        cursor.executemany('''
+            INSERT INTO perfume_neighbors (perfume_id, rank, neighbor_id, score, shared_note_ids)
+            VALUES (?, ?, ?, ?, ?)
+        ''', neighbor_rows(catalog, engine, perfume_id, k))
+
+    # Served recommendations changed: let caches and workers see it
+    if targets or gone:
+        bump_revision(cursor)
+    conn.commit()
+    return len(targets)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute similar perfumes for every perfume')
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--k', type=int, default=DEFAULT_K, help='neighbours stored per perfume')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only recompute perfumes affected by newly imported ones')
+    args = parser.parse_args()
+
+    started = time.time()
+    conn = get_write_db(args.database)
+    count = build_neighbors(conn, args.k, args.incremental)
+    conn.close()
+    print(f"[OK] Computed neighbours for {count} perfumes in {time.time() - started:.1f}s")
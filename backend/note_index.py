@@ -0,0 +1,57 @@
+import heapq
+from collections import Counter
+
+
+def normalize_note(name):
+    """Key used to compare note names typed by users with catalog notes"""
+    return name.lower()
+
+
+class NoteIndex:
+    """Inverted index from normalized note name to the perfumes that have it"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.position = {perfume_id: i for i, perfume_id in enumerate(catalog.perfume_ids)}
+
+        # Posting lists are kept in catalog order, one entry per perfume
+        self.postings = {}
+        self.note_names = {}
+        for perfume_id in catalog.perfume_ids:
+            names = {normalize_note(note['name']) for note in catalog.perfume_notes[perfume_id]}
+            self.note_names[perfume_id] = names
+            for name in names:
+                self.postings.setdefault(name, []).append(perfume_id)
+
+    def match(self, selected_notes, gender='', family='', limit=10):
+        """Return [(perfume_id, match_score)] for perfumes sharing any selected note.
+
+        The score is the share of selected notes the perfume has (a note
+        listed twice counts twice). Results are ordered by the score rounded
+        to 3 decimals, ties in catalog order.
+        """
+        counts = Counter()
+        for note in selected_notes:
+            counts.update(self.postings.get(normalize_note(note), ()))
+
+        perfumes = self.catalog.perfumes
+        candidates = []
+        for perfume_id, count in counts.items():
+            perfume = perfumes[perfume_id]
+            if gender and perfume['gender'] != gender:
+                continue
+            if family and perfume['family'] != family:
+                continue
+            match_score = count / len(selected_notes)
+            candidates.append((-round(match_score, 3), self.position[perfume_id], perfume_id, match_score))
+
+        if limit > 0:
+            ranked = heapq.nsmallest(limit, candidates)
+        else:
+            ranked = sorted(candidates)[:limit]
+        return [(perfume_id, match_score) for _, _, perfume_id, match_score in ranked]
+
+
+def note_index(catalog):
+    """The NoteIndex for a catalog snapshot, built once per snapshot"""
+    return catalog.derived('note_index', NoteIndex)
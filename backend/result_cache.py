@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Size-bounded LRU cache for results computed from a catalog snapshot.
+
+    Entries belong to one snapshot: the first lookup against a newer
+    snapshot empties the cache. Hits, misses, evictions and invalidations
+    are counted for monitoring.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._catalog = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, catalog, key, compute):
+        """Return the cached result for `key`, calling compute() on a miss"""
+        with self._lock:
+            if catalog is not self._catalog:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._catalog = catalog
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        # Computed without the lock; concurrent misses on one key just
+        # compute the same result twice
+        result = compute()
+
+        with self._lock:
+            if catalog is self._catalog:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
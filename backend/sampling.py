@@ -0,0 +1,58 @@
+import math
+import random
+
+# Seed of the shuffle behind every pool, so pools of a snapshot are reproducible
+POOL_SHUFFLE_SEED = 0
+
+
+def random_pools(catalog):
+    """{(gender, family): ids} for every /api/random filter combination, '' meaning any.
+
+    Built once per snapshot in one pass over a shuffled copy of the catalog,
+    so every pool shares that order. A random pick is then a random index,
+    and a seeded walk strides through an order that does not follow ids.
+    """
+    def build(catalog):
+        ids = list(catalog.perfume_ids)
+        random.Random(POOL_SHUFFLE_SEED).shuffle(ids)
+        pools = {}
+        for perfume_id in ids:
+            perfume = catalog.perfumes[perfume_id]
+            for gender in ('', perfume['gender']):
+                for family in ('', perfume['family']):
+                    pools.setdefault((gender, family), []).append(perfume_id)
+        return pools
+    return catalog.derived('random_pools', build)
+
+
+def random_pool(catalog, gender='', family=''):
+    """IDs of the perfumes passing the filters, in the pools' shuffled order"""
+    return random_pools(catalog).get((gender, family), [])
+
+
+def affine_permutation(seed, cycle, n):
+    """(a, b) such that i -> (a * i + b) % n permutes range(n), drawn from seed and cycle"""
+    rng = random.Random(f'{seed}:{cycle}')
+    if n < 2:
+        return 1, 0
+    a = rng.randrange(1, n)
+    while math.gcd(a, n) != 1:
+        a = rng.randrange(1, n)
+    return a, rng.randrange(n)
+
+
+def seeded_walk(ids, seed, offset, count):
+    """(picks, next_offset): `count` ids from position `offset` of a walk over `ids`.
+
+    Each cycle of len(ids) positions visits every id once, in the order of an
+    affine permutation drawn from the seed and the cycle number, so a pick
+    costs O(1) whatever the size of `ids`. Picks stop at the end of a cycle,
+    so one response never repeats a perfume; the next cycle is a new order.
+    """
+    n = len(ids)
+    if not n:
+        return [], offset
+    cycle, start = divmod(offset, n)
+    a, b = affine_permutation(seed, cycle, n)
+    end = min(start + count, n)
+    return [ids[(a * position + b) % n] for position in range(start, end)], cycle * n + end
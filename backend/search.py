@@ -0,0 +1,90 @@
+import re
+
+# Full-text index over the searchable perfume columns. It is an external
+# content table, so the text lives only in `perfumes` and the triggers keep
+# the index in step with inserts, updates and deletes.
+SEARCH_INDEX_SCHEMA = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS perfumes_fts USING fts5(
+        name, brand, description,
+        content='perfumes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS perfumes_fts_insert AFTER INSERT ON perfumes BEGIN
+        INSERT INTO perfumes_fts (rowid, name, brand, description)
+        VALUES (new.id, new.name, new.brand, new.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS perfumes_fts_delete AFTER DELETE ON perfumes BEGIN
+        INSERT INTO perfumes_fts (perfumes_fts, rowid, name, brand, description)
+        VALUES ('delete', old.id, old.name, old.brand, old.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS perfumes_fts_update AFTER UPDATE ON perfumes BEGIN
+        INSERT INTO perfumes_fts (perfumes_fts, rowid, name, brand, description)
+        VALUES ('delete', old.id, old.name, old.brand, old.description);
+        INSERT INTO perfumes_fts (rowid, name, brand, description)
+        VALUES (new.id, new.name, new.brand, new.description);
+    END
+    ''',
+]
+
+# bm25 column weights: a hit in the name counts most, then the brand
+RANK = 'bm25(perfumes_fts, 10.0, 5.0, 1.0)'
+
+SEARCH_QUERY = f"""
+    SELECT p.id
+    FROM perfumes_fts f
+    JOIN perfumes p ON p.id = f.rowid
+    WHERE perfumes_fts MATCH ? {{filters}}
+    ORDER BY {RANK}
+    LIMIT ?
+"""
+
+
+def has_search_index(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'perfumes_fts'").fetchone()
+    return row is not None
+
+
+def create_search_index(cursor):
+    """Create the full-text index and its triggers, then fill it from `perfumes`"""
+    for statement in SEARCH_INDEX_SCHEMA:
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO perfumes_fts (perfumes_fts) VALUES ('rebuild')")
+
+
+def ensure_search_index(conn):
+    """Create the full-text index if this database does not have one yet"""
+    if not has_search_index(conn):
+        create_search_index(conn.cursor())
+        conn.commit()
+
+
+def match_expression(search):
+    """Turn what the user typed into an FTS5 query: every word, as a prefix"""
+    words = re.findall(r'\w+', search)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_perfume_ids(conn, search, limit, gender='', family=''):
+    """Ids of perfumes matching `search`, best BM25 rank first"""
+    expression = match_expression(search)
+    if not expression:
+        return []
+
+    filters = ''
+    params = [expression]
+    if gender:
+        filters += ' AND p.gender = ?'
+        params.append(gender)
+    if family:
+        filters += ' AND p.family = ?'
+        params.append(family)
+    params.append(limit)
+
+    return [row[0] for row in conn.execute(SEARCH_QUERY.format(filters=filters), params)]
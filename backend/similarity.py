@@ -0,0 +1,151 @@
+import numpy as np
+from scipy import sparse
+
+# Score bonuses on top of the Jaccard similarity of the note sets
+FAMILY_BONUS = 0.2
+GENDER_BONUS = 0.1
+
+
+def _codes(values):
+    """Map each value to a small integer so equality checks become array ops"""
+    lookup = {}
+    return np.array([lookup.setdefault(value, len(lookup)) for value in values], dtype=np.int32)
+
+
+class SimilarityEngine:
+    """Perfume x note incidence matrix for scoring one perfume against all others.
+
+    Rows follow `catalog.perfume_ids`, columns are note ids. Scores are the
+    Jaccard similarity of the note sets plus the family and gender bonuses,
+    exactly as the original per-perfume loop computed them.
+    """
+
+    def __init__(self, catalog):
+        self.perfume_ids = list(catalog.perfume_ids)
+        self.row_of = {perfume_id: row for row, perfume_id in enumerate(self.perfume_ids)}
+
+        note_ids = sorted({note['id'] for notes in catalog.perfume_notes.values() for note in notes})
+        self.column_of = {note_id: column for column, note_id in enumerate(note_ids)}
+
+        indptr = [0]
+        indices = []
+        for perfume_id in self.perfume_ids:
+            indices.extend(self.column_of[note['id']] for note in catalog.perfume_notes[perfume_id])
+            indptr.append(len(indices))
+
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), np.array(indices, dtype=np.int32), np.array(indptr)),
+            shape=(len(self.perfume_ids), len(note_ids)),
+        )
+        self.sizes = np.diff(self.matrix.indptr)
+
+        perfumes = [catalog.perfumes[perfume_id] for perfume_id in self.perfume_ids]
+        self.families = _codes(perfume['family'] for perfume in perfumes)
+        self.genders = _codes(perfume['gender'] for perfume in perfumes)
+
+    def note_columns(self, row):
+        return self.matrix.indices[self.matrix.indptr[row]:self.matrix.indptr[row + 1]]
+
+    def scores(self, row, rows=None):
+        """Similarity to the perfume in `row` of the perfumes in `rows` (default: all)"""
+        seed = np.zeros(self.matrix.shape[1], dtype=np.int32)
+        seed[self.note_columns(row)] = 1
+
+        if rows is None:
+            matrix, sizes, families, genders = self.matrix, self.sizes, self.families, self.genders
+        else:
+            matrix, sizes, families, genders = self.matrix[rows], self.sizes[rows], self.families[rows], self.genders[rows]
+
+        intersection = matrix @ seed
+        union = sizes + self.sizes[row] - intersection
+        note_similarity = np.zeros(len(union))
+        np.divide(intersection, union, out=note_similarity, where=union > 0)
+
+        scores = note_similarity + np.where(families == self.families[row], FAMILY_BONUS, 0.0)
+        scores += np.where(genders == self.genders[row], GENDER_BONUS, 0.0)
+        return scores
+
+    def recommend(self, perfume_id, limit, candidates=None):
+        """Return [(perfume_id, score)] for the `limit` most similar perfumes.
+
+        Only rows in `candidates` are considered when given (the approximate
+        mode passes its LSH candidates). Returns None if the perfume is
+        unknown. Ranking uses the score rounded to 3 decimals with ties kept
+        in catalog order, like the old stable sort.
+        """
+        row = self.row_of.get(perfume_id)
+        if row is None:
+            return None
+
+        if candidates is None:
+            others = np.delete(np.arange(len(self.perfume_ids)), row)
+            other_scores = self.scores(row)[others]
+        else:
+            others = np.unique(candidates)
+            others = others[others != row]
+            other_scores = self.scores(row, others)
+
+        if 0 < limit < len(others):
+            # Anything more than 0.001 below the k-th best raw score rounds
+            # strictly lower, so it can never make the cut.
+            kth = other_scores[np.argpartition(other_scores, -limit)[-limit]]
+            keep = other_scores >= kth - 0.0011
+            others, other_scores = others[keep], other_scores[keep]
+
+        ranked = sorted(zip(others.tolist(), other_scores.tolist()), key=lambda item: round(item[1], 3), reverse=True)
+        return [(self.perfume_ids[r], score) for r, score in ranked[:limit]]
+
+
+class NoteProfileModel:
+    """TF-IDF weighted perfume x note matrix for "more like these" queries.
+
+    Term frequencies are the perfume_notes weights (1.0 top, 0.8 middle,
+    0.6 base), scaled by each note's inverse document frequency so rare notes
+    count for more, and every row is L2-normalised. A product of the matrix
+    with a normalised profile is then the cosine similarity to that profile.
+    """
+
+    def __init__(self, catalog):
+        # scikit-learn takes over a second to import; only this model needs it
+        from sklearn.feature_extraction.text import TfidfTransformer
+
+        engine = similarity_engine(catalog)
+        self.perfume_ids = engine.perfume_ids
+        self.row_of = engine.row_of
+
+        weights = np.array([
+            note['weight'] if note['weight'] is not None else 1.0
+            for perfume_id in self.perfume_ids for note in catalog.perfume_notes[perfume_id]
+        ])
+        counts = sparse.csr_matrix((weights, engine.matrix.indices, engine.matrix.indptr), shape=engine.matrix.shape)
+        self.matrix = TfidfTransformer(norm='l2').fit_transform(counts).tocsr()
+
+    def recommend(self, seed_ids, limit):
+        """Return [(perfume_id, score)] closest to the combined profile of the seeds.
+
+        Seeds themselves are left out, as are perfumes sharing no note with
+        any seed. Ties are kept in catalog order.
+        """
+        rows = [self.row_of[perfume_id] for perfume_id in seed_ids if perfume_id in self.row_of]
+        profile = np.asarray(self.matrix[rows].sum(axis=0)).ravel()
+        norm = np.linalg.norm(profile)
+        if not rows or norm == 0:
+            return []
+
+        scores = self.matrix @ (profile / norm)
+        scores[rows] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if 0 < limit < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.perfume_ids[row], float(scores[row])) for row in ranked[:max(limit, 0)]]
+
+
+def note_profile_model(catalog):
+    """The NoteProfileModel for a catalog snapshot, built once per snapshot"""
+    return catalog.derived('note_profiles', NoteProfileModel)
+
+
+def similarity_engine(catalog):
+    """The SimilarityEngine for a catalog snapshot, built once per snapshot"""
+    return catalog.derived('similarity', SimilarityEngine)
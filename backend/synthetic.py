@@ -0,0 +1,162 @@
+import random
+from collections import Counter
+
+import numpy as np
+
+from db import get_write_db
+from init_db import SEED_PERFUMES
+from migrations import bump_revision, drop_tables, migrate
+
+GENDERS = ['Men', 'Women', 'Unisex']
+FAMILIES = ['Woody Aromatic', 'Woody Spicy', 'Floral', 'Floral Fruity', 'Oriental Vanilla', 'Fresh Aquatic', 'Citrus Aromatic']
+NOTE_WEIGHTS = {'top': 1.0, 'middle': 0.8, 'base': 0.6}
+
+# Exponent of the Zipf law for note and brand popularity
+ZIPF_EXPONENT = 1.0
+
+def write_catalog(database, notes, perfumes, links):
+    """Replace the catalog in `database` with the given rows"""
+    conn = get_write_db(database)
+    drop_tables(conn)
+    migrate(conn)
+    cursor = conn.cursor()
+    
+    cursor.executemany("INSERT INTO notes (name, type) VALUES (?, ?)", notes)
+    cursor.executemany('''
+        INSERT INTO perfumes (id, name, brand, year, gender, family, description, image_url)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', perfumes)
+    cursor.executemany("INSERT INTO perfume_notes (perfume_id, note_id, weight) VALUES (?, ?, ?)", links)
+    bump_revision(cursor)
+    
+    conn.commit()
+    conn.close()
+
+def generate_catalog(database, n_perfumes, n_notes=300, seed=0):
+    """Create a database with `n_perfumes` random perfumes, reproducible from `seed`"""
+    rng = random.Random(seed)
+    
+    note_types = list(NOTE_WEIGHTS)
+    notes = [(f'Note {i}', note_types[i % 3]) for i in range(n_notes)]
+    
+    perfumes = []
+    links = []
+    for perfume_id in range(1, n_perfumes + 1):
+        perfumes.append((
+            perfume_id,
+            f'Perfume {perfume_id}',
+            f'Brand {rng.randrange(max(1, n_perfumes // 20))}',
+            rng.randint(1950, 2024),
+            rng.choice(GENDERS),
+            rng.choice(FAMILIES),
+            'A synthetic fragrance.',
+            None,
+        ))
+        for note_id in rng.sample(range(1, n_notes + 1), rng.randint(3, 12)):
+            links.append((perfume_id, note_id, NOTE_WEIGHTS[notes[note_id - 1][1]]))
+    
+    write_catalog(database, notes, perfumes, links)
+
+def seed_profile():
+    """Distributions observed in init_db.py's seed perfumes"""
+    note_counts = Counter(
+        (note_type, name) for perfume in SEED_PERFUMES for note_type, names in perfume['notes'].items() for name in names
+    )
+    # Each note keeps the tier it is listed in most; ties go to the first tier
+    tiers = {}
+    for (note_type, name), count in note_counts.items():
+        if name not in tiers or count > note_counts[(tiers[name], name)]:
+            tiers[name] = note_type
+    popularity = Counter({name: 0 for name in tiers})
+    for (_, name), count in note_counts.items():
+        popularity[name] += count
+    
+    return {
+        # Seed notes by popularity, most used first
+        'notes': [(name, tiers[name]) for name, _ in popularity.most_common()],
+        # Notes listed per tier, one entry per seed perfume
+        'tier_sizes': {note_type: [len(perfume['notes'].get(note_type, [])) for perfume in SEED_PERFUMES]
+                       for note_type in NOTE_WEIGHTS},
+        'genders': Counter(perfume['gender'] for perfume in SEED_PERFUMES),
+        'families': Counter(perfume['family'] for perfume in SEED_PERFUMES),
+        'years': (min(perfume['year'] for perfume in SEED_PERFUMES), max(perfume['year'] for perfume in SEED_PERFUMES)),
+        'words': sorted({word for perfume in SEED_PERFUMES for word in perfume['name'].split() if len(word) > 2}),
+        'descriptions': [perfume['description'] for perfume in SEED_PERFUMES],
+        'image_urls': [perfume['image_url'] for perfume in SEED_PERFUMES],
+    }
+
+def zipf(n, exponent=ZIPF_EXPONENT):
+    """Probabilities of ranks 1..n under a Zipf law"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def generate_realistic_catalog(database, n_perfumes, n_notes=1000, seed=0):
+    """Create a database of `n_perfumes` perfumes shaped like the seed data.
+
+    Notes per tier follow the seed perfumes' counts, and note popularity
+    follows a Zipf law that starts with the seed notes in their seed order,
+    so a few notes (Patchouli, Jasmine, Cedar...) appear in a large share
+    of perfumes and most appear in few. Gender, family, year range, names
+    and descriptions are drawn from the seed data too. Reproducible from
+    `seed`; meant for catalogs of up to a few hundred thousand perfumes.
+    """
+    rng = np.random.default_rng(seed)
+    profile = seed_profile()
+    
+    note_types = list(NOTE_WEIGHTS)
+    notes = list(profile['notes'])
+    for i in range(len(notes), n_notes):
+        notes.append((f'Note {i}', note_types[i % 3]))
+    notes = notes[:max(n_notes, 1)]
+    
+    # Candidate notes of each tier, drawn by popularity; a few spares per
+    # perfume make up for draws that repeat a note
+    picks = {}
+    for note_type in note_types:
+        note_ids = np.array([i + 1 for i, (_, tier) in enumerate(notes) if tier == note_type])
+        if not len(note_ids):
+            continue
+        draws = rng.choice(len(note_ids), size=(n_perfumes, max(profile['tier_sizes'][note_type]) * 2), p=zipf(len(note_ids)))
+        sizes = rng.choice(profile['tier_sizes'][note_type], size=n_perfumes)
+        picks[note_type] = (note_ids[draws].tolist(), sizes.tolist())
+    
+    def sample(counter, size):
+        values = sorted(counter)
+        weights = np.array([counter[value] for value in values], dtype=float)
+        return [values[i] for i in rng.choice(len(values), size=size, p=weights / weights.sum())]
+    
+    genders = sample(profile['genders'], n_perfumes)
+    families = sample(profile['families'], n_perfumes)
+    low, high = profile['years']
+    years = rng.integers(low, high + 1, size=n_perfumes).tolist()
+    n_brands = max(1, n_perfumes // 20)
+    brands = rng.choice(n_brands, size=n_perfumes, p=zipf(n_brands)).tolist()
+    words = profile['words']
+    name_words = rng.integers(0, len(words), size=(n_perfumes, 2)).tolist()
+    
+    perfumes = []
+    links = []
+    for row in range(n_perfumes):
+        perfume_id = row + 1
+        first, second = name_words[row]
+        perfumes.append((
+            perfume_id,
+            f'{words[first]} {words[second]} {perfume_id}',
+            f'Brand {brands[row]}',
+            years[row],
+            genders[row],
+            families[row],
+            profile['descriptions'][row % len(profile['descriptions'])],
+            profile['image_urls'][row % len(profile['image_urls'])],
+        ))
+        seen = set()
+        for note_type, (draws, sizes) in picks.items():
+            wanted = len(seen) + sizes[row]
+            for note_id in draws[row]:
+                if len(seen) == wanted:
+                    break
+                if note_id not in seen:
+                    seen.add(note_id)
+                    links.append((perfume_id, note_id, NOTE_WEIGHTS[note_type]))
+    
+    write_catalog(database, notes, perfumes, links)
@@ -0,0 +1,80 @@
+import sqlite3
+
+import app as app_module
+from bench_api import ENDPOINTS, compare, measure_startup, run_endpoints
+from init_db import SEED_PERFUMES
+from synthetic import generate_realistic_catalog
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    rows = [conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2").fetchall()
+            for table in ('perfumes', 'notes', 'perfume_notes')]
+    conn.close()
+    return rows
+
+
+def test_realistic_catalog_is_reproducible_and_skewed(tmp_path):
+    first, second, other = (str(tmp_path / name) for name in ('a.db', 'b.db', 'c.db'))
+    generate_realistic_catalog(first, 2000, n_notes=300, seed=1)
+    generate_realistic_catalog(second, 2000, n_notes=300, seed=1)
+    generate_realistic_catalog(other, 2000, n_notes=300, seed=2)
+    assert dump(first) == dump(second)
+    assert dump(first) != dump(other)
+
+    conn = sqlite3.connect(first)
+    per_perfume = [count for count, in conn.execute("SELECT COUNT(*) FROM perfume_notes GROUP BY perfume_id")]
+    seed_counts = [sum(len(names) for names in perfume['notes'].values()) for perfume in SEED_PERFUMES]
+    assert min(seed_counts) - 2 <= sum(per_perfume) / len(per_perfume) <= max(seed_counts)
+
+    # A few notes are everywhere, most are rare; the seed's favourites lead
+    usage = conn.execute('''
+        SELECT n.name, COUNT(*) FROM perfume_notes pn JOIN notes n ON n.id = pn.note_id
+        GROUP BY pn.note_id ORDER BY COUNT(*) DESC
+    ''').fetchall()
+    assert usage[0][0] in ('Patchouli', 'Jasmine', 'Cedar', 'Vanilla')
+    assert usage[0][1] > 20 * usage[len(usage) // 2][1]
+    assert {gender for gender, in conn.execute("SELECT DISTINCT gender FROM perfumes")} == \
+        {perfume['gender'] for perfume in SEED_PERFUMES}
+    conn.close()
+
+
+def test_every_endpoint_is_driven(tmp_path, bind_app):
+    path = str(tmp_path / 'bench.db')
+    generate_realistic_catalog(path, 300, n_notes=120)
+    client = bind_app(path)
+
+    results = run_endpoints(client, app_module.catalog_store.current(), requests=3)
+    assert list(results) == [name for name, _, _ in ENDPOINTS]
+    assert all(latency['requests'] >= 1 and latency['p50'] <= latency['max'] for latency in results.values())
+
+
+def test_cold_start_loads_no_heavy_modules(database):
+    startup = measure_startup(database)
+    assert startup['heavy_modules'] == []
+    assert startup['first_status'] == 200
+    assert startup['ready_ms'] >= startup['import_ms'] + startup['first_response_ms']
+
+
+def test_compare_flags_regressions_only():
+    def result(p50, p95, rss):
+        return {'peak_rss_mb': rss, 'endpoints': {'perfume': {'p50': p50, 'p95': p95}}}
+
+    baseline = {'1000': result(2.0, 4.0, 200)}
+    # Within tolerance, and sizes missing from the baseline are ignored
+    assert compare({'1000': result(3.5, 6.5, 290), '5000': result(50, 90, 900)}, baseline) == []
+
+    regressions = compare({'1000': result(5.1, 4.0, 400)}, baseline)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('1000 perfumes, perfume p50')
+    assert 'peak memory' in regressions[1]
+
+    # Startup times are compared the same way, when both runs have them
+    baseline['1000']['startup'] = {'import_ms': 200, 'first_response_ms': 50}
+    slow_start = dict(result(2.0, 4.0, 200), startup={'import_ms': 1600, 'first_response_ms': 60})
+    assert compare({'1000': slow_start}, baseline) == [
+        '1000 perfumes, startup import_ms: 1600ms (budget 1000ms)',
+        '1000 perfumes, startup import_ms: 1600ms (baseline 200ms, limit 301ms)',
+    ]
+    # The import budget holds even for sizes without a baseline
+    assert compare({'5000': slow_start}, baseline) == ['5000 perfumes, startup import_ms: 1600ms (budget 1000ms)']
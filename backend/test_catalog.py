@@ -0,0 +1,226 @@
+import sqlite3
+
+import app as app_module
+from catalog import CatalogStore, load_catalog
+from db import get_db
+from migrations import bump_revision
+
+
+def test_snapshot_matches_database(database):
+    conn = get_db(database)
+    catalog = load_catalog(conn)
+
+    assert len(catalog) == conn.execute("SELECT COUNT(*) FROM perfumes").fetchone()[0]
+    for perfume_id in catalog.perfume_ids:
+        rows = conn.execute("""
+            SELECT n.id FROM notes n
+            JOIN perfume_notes pn ON n.id = pn.note_id
+            WHERE pn.perfume_id = ?
+            ORDER BY n.id
+        """, (perfume_id,)).fetchall()
+        assert [note['id'] for note in catalog.perfume_notes[perfume_id]] == [row[0] for row in rows]
+    conn.close()
+
+
+def test_endpoints_serve_snapshot(client):
+    perfumes = client.get('/api/perfumes').get_json()
+    assert len(perfumes) == len(app_module.catalog_store.current())
+
+    sauvage = client.get('/api/perfumes?search=sauv').get_json()
+    assert [p['name'] for p in sauvage] == ['Sauvage']
+    assert [(n['type'], n['weight']) for n in sauvage[0]['notes']] == sorted(
+        [(n['type'], n['weight']) for n in sauvage[0]['notes']], key=lambda t: (t[0], -t[1]))
+
+    men = client.get('/api/perfumes?gender=Men&family=All').get_json()
+    assert men and all(p['gender'] == 'Men' for p in men)
+
+    assert client.get(f"/api/perfumes/{sauvage[0]['id']}").get_json()['name'] == 'Sauvage'
+    assert client.get('/api/perfumes/99999').status_code == 404
+
+    filters = client.get('/api/filters').get_json()
+    assert 'Men' in filters['genders'] and filters['families'] == sorted(filters['families'])
+    assert client.get('/api/notes').get_json()
+
+
+def test_store_reloads_after_commit(database):
+    store = CatalogStore(database)
+    before = store.current()
+    assert store.current() is before
+
+    conn = sqlite3.connect(database)
+    conn.execute("""
+        INSERT INTO perfumes (name, brand, year, gender, family, description, image_url)
+        VALUES ('New One', 'Brand', 2024, 'Unisex', 'Woody', NULL, NULL)
+    """)
+    conn.commit()
+    conn.close()
+
+    after = store.current()
+    assert after is not before
+    assert len(after) == len(before) + 1
+    assert after.version > before.version
+
+
+def test_keyset_pagination_walks_whole_catalog(client):
+    everything = client.get('/api/perfumes').get_json()
+
+    for sort, key in (('id', lambda p: p['id']), ('year', lambda p: (p['year'], p['id'])),
+                      ('name', lambda p: (p['name'].lower(), p['id']))):
+        seen = []
+        cursor = None
+        while True:
+            url = f'/api/perfumes?sort={sort}&limit=4' + (f'&cursor={cursor}' if cursor else '')
+            page = client.get(url).get_json()
+            assert len(page['perfumes']) <= 4
+            seen.extend(page['perfumes'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        assert seen == sorted(everything, key=key)
+
+
+def test_pagination_with_filters_and_projection(client):
+    page = client.get('/api/perfumes?gender=Women&limit=2&fields=id,name,brand,image_url').get_json()
+    assert len(page['perfumes']) == 2
+    assert all(set(p) == {'id', 'name', 'brand', 'image_url'} for p in page['perfumes'])
+
+    rest = client.get(f"/api/perfumes?gender=Women&limit=50&cursor={page['next_cursor']}").get_json()
+    women = client.get('/api/perfumes?gender=Women').get_json()
+    assert [p['id'] for p in page['perfumes'] + rest['perfumes']] == [p['id'] for p in women]
+    assert rest['next_cursor'] is None
+
+    without_notes = client.get('/api/perfumes?notes=false').get_json()
+    assert without_notes and all('notes' not in p for p in without_notes)
+
+
+def test_filtered_pages_match_a_full_scan(database):
+    catalog = CatalogStore(database).current()
+    combinations = [('', ''), ('Nobody', '')] + [(gender, family) for gender in [''] + catalog.genders
+                                                 for family in [''] + catalog.families]
+    for sort in ('id', 'year', 'name'):
+        everything = catalog.sort_order(sort)[1]
+        for gender, family in combinations:
+            expected = [perfume_id for perfume_id in everything if catalog.matches(perfume_id, '', gender, family)]
+            walked, after = [], None
+            while True:
+                ids, after = catalog.page(sort, after, 2, '', gender, family)
+                walked.extend(ids)
+                if after is None:
+                    break
+            assert walked == expected
+            assert catalog.page(sort, None, None, '', gender, family) == (expected, None)
+
+
+def test_pagination_rejects_bad_input(client):
+    assert client.get('/api/perfumes?sort=price').status_code == 400
+    assert client.get('/api/perfumes?fields=id,price').status_code == 400
+    assert client.get('/api/perfumes?cursor=not-a-cursor').status_code == 400
+    year_cursor = client.get('/api/perfumes?sort=year&limit=1').get_json()['next_cursor']
+    assert client.get(f'/api/perfumes?sort=name&cursor={year_cursor}').status_code == 400
+
+
+def test_batch_lookup_preserves_order_and_reports_missing(client):
+    response = client.get('/api/perfumes/batch?ids=5,1,999,3,1').get_json()
+    assert [p['id'] for p in response['perfumes']] == [5, 1, 3]
+    assert response['missing'] == [999]
+    assert response['perfumes'][0] == client.get('/api/perfumes/5').get_json()
+
+    response = client.post('/api/perfumes/batch?fields=id,name', json={'ids': [2, 1]}).get_json()
+    assert response == {
+        'perfumes': [{'id': 2, 'name': 'Bleu de Chanel'}, {'id': 1, 'name': 'Sauvage'}],
+        'missing': [],
+    }
+
+
+def test_batch_lookup_rejects_bad_input(client):
+    assert client.get('/api/perfumes/batch?ids=1,abc').status_code == 400
+    ids = ','.join(str(i) for i in range(501))
+    assert client.get(f'/api/perfumes/batch?ids={ids}').status_code == 400
+    assert client.get('/api/perfumes/batch').get_json() == {'perfumes': [], 'missing': []}
+
+    for body in ([1, 2], {'ids': '12'}, {'ids': [1, True]}, {'ids': [1, '2']}, {'ids': [1.0]}, {'ids': None}, 'ids'):
+        assert client.post('/api/perfumes/batch', json=body).status_code == 400, body
+    assert client.post('/api/perfumes/batch', data='not json', content_type='application/json').status_code == 400
+    assert client.post('/api/perfumes/batch', json={}).get_json() == {'perfumes': [], 'missing': []}
+
+
+def test_conditional_requests_skip_work(database, bind_app, monkeypatch):
+    client = bind_app(database)
+    monkeypatch.setattr(app_module, 'catalog_store', CatalogStore(database, check_interval=60))
+
+    for url in ['/api/notes', '/api/filters', '/api/perfumes', '/api/perfumes?limit=5', '/api/perfumes/1']:
+        response = client.get(url)
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert response.headers['Last-Modified']
+
+        # A client holding this revision gets a 304 without SQL or JSON
+        statements = []
+        app_module.catalog_store._conn.set_trace_callback(statements.append)
+        with monkeypatch.context() as patch:
+            patch.setattr(app_module, 'jsonify', None)
+            patch.setattr(app_module, 'read_pool', None)
+            cached = client.get(url, headers={'If-None-Match': etag})
+        app_module.catalog_store._conn.set_trace_callback(None)
+        assert cached.status_code == 304
+        assert cached.data == b''
+        assert cached.headers['ETag'] == etag
+        assert statements == []
+
+    assert client.get('/api/perfumes/99999', headers={'If-None-Match': etag}).status_code == 404
+
+
+def test_etag_follows_catalog_revision(client, database):
+    etag = client.get('/api/filters').headers['ETag']
+    assert client.get('/api/notes').headers['ETag'] == etag
+
+    # Rebuilding derived tables does not change the catalog
+    conn = sqlite3.connect(database)
+    conn.execute("DELETE FROM perfume_neighbors")
+    conn.commit()
+    assert client.get('/api/filters').headers['ETag'] == etag
+
+    conn.execute("UPDATE perfumes SET family = 'Chypre' WHERE id = 1")
+    bump_revision(conn)
+    conn.commit()
+    conn.close()
+    response = client.get('/api/filters', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Chypre' in response.get_json()['families']
+
+
+def test_etag_changes_without_a_revision_bump(client, database):
+    response = client.get('/api/filters')
+    etag, last_modified = response.headers['ETag'], response.last_modified
+
+    # Manual SQL or an older importer moves no revision
+    conn = sqlite3.connect(database)
+    conn.execute("UPDATE perfumes SET family = 'Chypre' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    response = client.get('/api/filters', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Chypre' in response.get_json()['families']
+    assert client.get('/api/filters', headers={'If-Modified-Since': last_modified}).status_code == 200
+
+
+def test_fragments_match_jsonify(client):
+    catalog = app_module.catalog_store.current()
+    ids = catalog.perfume_ids
+
+    def encoded(value):
+        with app_module.app.app_context():
+            return app_module.jsonify(value).data
+
+    perfumes = [catalog.perfume(perfume_id) for perfume_id in ids]
+    assert client.get('/api/perfumes').data == encoded(perfumes)
+    assert client.get(f'/api/perfumes/{ids[0]}').data == encoded(perfumes[0])
+
+    page = client.get('/api/perfumes?limit=3').get_json()
+    assert client.get('/api/perfumes?limit=3').data == encoded({'perfumes': perfumes[:3], 'next_cursor': page['next_cursor']})
+
+    batch = client.get(f'/api/perfumes/batch?ids={ids[2]},99999,{ids[0]},99998')
+    assert batch.data == encoded({'perfumes': [perfumes[2], perfumes[0]], 'missing': [99999, 99998]})
@@ -0,0 +1,96 @@
+import threading
+
+import app as app_module
+import catalog as catalog_module
+from catalog import CatalogStore
+from db import get_write_db
+
+READERS = 12
+INSERTS = 40
+
+URLS = [
+    '/api/perfumes',
+    '/api/perfumes?search=rose',
+    '/api/perfumes?limit=5&sort=name',
+    '/api/perfumes/1',
+    '/api/recommendations/1',
+    '/api/random',
+    '/api/notes',
+    '/api/filters',
+]
+
+
+def import_perfumes(database, done):
+    """Insert perfumes one transaction at a time, like the importer"""
+    conn = get_write_db(database)
+    note_id = conn.execute("SELECT id FROM notes ORDER BY id LIMIT 1").fetchone()[0]
+    for i in range(INSERTS):
+        cursor = conn.execute('''
+            INSERT INTO perfumes (name, brand, year, gender, family, description, image_url)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (f'Import {i}', 'Loadtest', 2024, 'Unisex', 'Woody', 'Inserted during the test', None))
+        conn.execute("INSERT INTO perfume_notes (perfume_id, note_id, weight) VALUES (?, ?, 1.0)",
+                     (cursor.lastrowid, note_id))
+        conn.commit()
+    conn.close()
+    done.set()
+
+
+def test_reads_during_import(database, client):
+    initial = len(app_module.catalog_store.current())
+    done = threading.Event()
+    failures = []
+
+    def read():
+        rounds = 0
+        # Keep reading until the import finishes, and at least a few rounds
+        while not done.is_set() or rounds < 3:
+            for url in URLS:
+                response = client.get(url)
+                if response.status_code != 200 or response.get_json() is None:
+                    failures.append((url, response.status_code))
+            rounds += 1
+
+    readers = [threading.Thread(target=read) for _ in range(READERS)]
+    writer = threading.Thread(target=import_perfumes, args=(database, done))
+    for thread in readers + [writer]:
+        thread.start()
+    for thread in readers + [writer]:
+        thread.join(timeout=120)
+
+    assert not failures
+    assert not any(thread.is_alive() for thread in readers + [writer])
+
+    perfumes = client.get('/api/perfumes?search=Loadtest&limit=200').get_json()['perfumes']
+    assert len(perfumes) == INSERTS
+    assert len(app_module.catalog_store.current()) == initial + INSERTS
+
+
+def test_reload_does_not_block_readers(database, monkeypatch):
+    store = CatalogStore(database)
+    before = store.current()
+    conn = get_write_db(database)
+    conn.execute("UPDATE perfumes SET name = 'Renamed' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    loading, release = threading.Event(), threading.Event()
+    load_catalog = catalog_module.load_catalog
+
+    def slow_load(*args):
+        loading.set()
+        release.wait(5)
+        return load_catalog(*args)
+    monkeypatch.setattr(catalog_module, 'load_catalog', slow_load)
+
+    reloaded = []
+    thread = threading.Thread(target=lambda: reloaded.append(store.current()))
+    thread.start()
+    assert loading.wait(5)
+    # The reload is under way: readers get the previous snapshot at once
+    assert store.current() is before
+    release.set()
+    thread.join(5)
+
+    assert reloaded[0] is not before and reloaded[0].perfumes[1]['name'] == 'Renamed'
+    assert store.current() is reloaded[0]
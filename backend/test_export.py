@@ -0,0 +1,73 @@
+import json
+import sqlite3
+
+import pytest
+
+import app as app_module
+from catalog import PERFUMES_WITH_NOTES_QUERY
+
+
+def records(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_export_streams_every_perfume(client):
+    response = client.get('/api/perfumes/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    assert records(response) == client.get('/api/perfumes').get_json()
+
+
+def test_export_filters(client):
+    for query in ['gender=Men', 'family=Floral', 'gender=Women&family=Floral', 'gender=All']:
+        assert records(client.get(f'/api/perfumes/export?{query}')) == client.get(f'/api/perfumes?{query}').get_json()
+
+
+def test_export_in_chunks(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EXPORT_CHUNK_SIZE', 4)
+    response = client.get('/api/perfumes/export', buffered=False)
+    chunks = list(response.response)
+    response.close()
+
+    count = len(app_module.catalog_store.current())
+    assert [chunk.count(b'\n') for chunk in chunks] == [4] * (count // 4) + ([count % 4] if count % 4 else [])
+
+
+def test_abandoned_export_closes_its_connection(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EXPORT_CHUNK_SIZE', 1)
+    opened = []
+    connect = app_module.get_read_db
+
+    def get_read_db(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr(app_module, 'get_read_db', get_read_db)
+
+    response = client.get('/api/perfumes/export', buffered=False)
+    next(iter(response.response))
+    response.close()
+
+    assert len(opened) == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+
+
+def test_export_plans_never_sort(client):
+    conn = sqlite3.connect(app_module.read_pool.database)
+    for gender, family in [('', ''), ('Men', ''), ('', 'Floral'), ('Women', 'Floral'), ('All', 'Floral')]:
+        where, params = app_module.export_filter(gender, family)
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + PERFUMES_WITH_NOTES_QUERY.format(where=where), params)]
+        assert not any('TEMP B-TREE' in step for step in plan), (gender, family, plan)
+    conn.close()
+
+
+def test_export_does_not_hold_a_pooled_connection(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'EXPORT_CHUNK_SIZE', 1)
+    monkeypatch.setattr(app_module, 'read_pool', app_module.ReadPool(app_module.read_pool.database, size=1))
+
+    response = client.get('/api/perfumes/export', buffered=False)
+    next(iter(response.response))
+    # The export is still open; the single pooled connection is free
+    assert client.get('/api/perfumes?search=sauvage').status_code == 200
+    response.close()
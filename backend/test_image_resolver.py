@@ -0,0 +1,108 @@
+import json
+import time
+
+import pytest
+
+from image_resolver import FALLBACK_IMAGE, ImageResolver
+
+# Fragrantica pages and the one image the fallback finds
+FILES = {
+    '/perfume/sauvage.html': b'<html><img itemprop="image" src="https://img.example/sauvage.jpg"></html>',
+    '/perfume/aventus.html': b'<html><img src="/logo.png"><img src="https://img.example/aventus-bottle.jpg"></html>',
+    '/perfume/plain.html': b'<html><p>No pictures here</p></html>',
+    '/img/375x500.plain.jpg': b'',
+}
+
+
+@pytest.fixture
+def stub(stub_server):
+    return stub_server(FILES)
+
+
+def make_resolver(stub, tmp_path, **kwargs):
+    options = dict(workers=8, per_host=4, rate=0, retries=2, backoff=0.01, timeout=2)
+    options.update(kwargs)
+    return ImageResolver(str(tmp_path / 'images.json'), image_base=f'{stub.url}/img/', **options)
+
+
+def test_resolves_images_and_caches_them(stub, tmp_path):
+    perfumes = [
+        ('Sauvage', 'Dior', f'{stub.url}/perfume/sauvage.html'),
+        ('Aventus', 'Creed', f'{stub.url}/perfume/aventus.html'),
+        ('Plain', 'Nobody', f'{stub.url}/perfume/plain.html'),
+        ('Missing', 'Nobody', f'{stub.url}/perfume/missing.html'),
+        ('No Page', 'Nobody', None),
+    ]
+    resolver = make_resolver(stub, tmp_path)
+    assert resolver.resolve_all(perfumes) == [
+        'https://img.example/sauvage.jpg',
+        'https://img.example/aventus-bottle.jpg',
+        f'{stub.url}/img/375x500.plain.jpg',
+        FALLBACK_IMAGE,
+        FALLBACK_IMAGE,
+    ]
+    resolver.close()
+    assert len(json.load(open(tmp_path / 'images.json'))) == 5
+
+    # A second run answers everything from the cache file
+    stub.requests.clear()
+    resolver = make_resolver(stub, tmp_path)
+    assert resolver.resolve_all(perfumes)[0] == 'https://img.example/sauvage.jpg'
+    resolver.close()
+    assert not stub.requests
+
+
+def test_retries_transient_failures(stub, tmp_path):
+    stub.failures['/perfume/sauvage.html'] = 2
+    resolver = make_resolver(stub, tmp_path)
+    assert resolver.resolve('Sauvage', 'Dior', f'{stub.url}/perfume/sauvage.html') == 'https://img.example/sauvage.jpg'
+    assert stub.requests[('GET', '/perfume/sauvage.html')] == 3
+
+
+def test_gives_up_without_caching(stub, tmp_path):
+    stub.failures['/perfume/sauvage.html'] = 10
+    stub.failures['/img/375x500.sauvage.jpg'] = 10
+    resolver = make_resolver(stub, tmp_path)
+    assert resolver.resolve('Sauvage', 'Dior', f'{stub.url}/perfume/sauvage.html') is None
+    assert stub.requests[('GET', '/perfume/sauvage.html')] == 3
+    assert resolver.cache == {}
+
+
+def test_request_errors_do_not_abort_the_run(stub, tmp_path):
+    # requests gives up on this loop with TooManyRedirects
+    stub.redirects['/perfume/loop.html'] = '/perfume/loop.html'
+    perfumes = [
+        ('Loop', 'Nobody', f'{stub.url}/perfume/loop.html'),
+        ('Sauvage', 'Dior', f'{stub.url}/perfume/sauvage.html'),
+    ]
+    resolver = make_resolver(stub, tmp_path)
+    assert resolver.resolve_all(perfumes) == [None, 'https://img.example/sauvage.jpg']
+    assert stub.requests[('GET', '/perfume/loop.html')] > 3
+    assert list(resolver.cache) == ['dior|sauvage']
+
+
+def test_interrupted_run_keeps_its_cache(stub, tmp_path):
+    def progress(done, total):
+        if done == total:
+            raise KeyboardInterrupt
+
+    resolver = make_resolver(stub, tmp_path)
+    with pytest.raises(KeyboardInterrupt):
+        resolver.resolve_all([('Sauvage', 'Dior', f'{stub.url}/perfume/sauvage.html')], progress)
+    assert json.load(open(tmp_path / 'images.json')) == {'dior|sauvage': 'https://img.example/sauvage.jpg'}
+
+
+def test_per_host_concurrency_and_rate(stub, tmp_path):
+    stub.delay = 0.05
+    perfumes = [(f'Perfume {i}', 'Brand', None) for i in range(12)]
+
+    resolver = make_resolver(stub, tmp_path, per_host=3)
+    resolver.resolve_all(perfumes)
+    assert stub.max_in_flight <= 3
+    assert sum(stub.requests.values()) == 12
+
+    resolver = ImageResolver(None, workers=8, per_host=8, rate=20, retries=0, image_base=f'{stub.url}/img/')
+    started = time.monotonic()
+    resolver.resolve_all([(f'Other {i}', 'Brand', None) for i in range(10)])
+    # Ten request starts at 20 per second are spread over at least 0.45s
+    assert time.monotonic() - started >= 0.45
@@ -0,0 +1,103 @@
+import io
+
+import pytest
+from PIL import Image
+
+import app as app_module
+from db import get_write_db
+from image_resolver import ImageResolver
+from images import THUMBNAIL_SIZE, ImageStore, cache_images
+
+
+def png(width, height, color):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, 'PNG')
+    return output.getvalue()
+
+
+FILES = {
+    '/bottle.png': png(800, 1200, 'navy'),
+    '/wide.png': png(1000, 400, 'gold'),
+    '/broken.png': b'not an image',
+}
+
+
+@pytest.fixture
+def stub(stub_server):
+    return stub_server(FILES)
+
+
+@pytest.fixture
+def images(database, stub, tmp_path):
+    """Seed database whose perfumes point at the stub; returns (conn, store, fetcher)"""
+    conn = get_write_db(database)
+    paths = ['/bottle.png', '/bottle.png', '/wide.png', '/broken.png', '/missing.png']
+    ids = [perfume_id for perfume_id, in conn.execute("SELECT id FROM perfumes ORDER BY id")]
+    conn.executemany("UPDATE perfumes SET image_url = ? WHERE id = ?",
+                     [(stub.url + paths[i % len(paths)], perfume_id) for i, perfume_id in enumerate(ids)])
+    conn.commit()
+    fetcher = ImageResolver(None, workers=4, per_host=4, rate=0, retries=0)
+    yield conn, ImageStore(str(tmp_path / 'images')), fetcher
+    fetcher.close()
+    conn.close()
+
+
+def test_cache_images_downloads_each_url_once(images, stub):
+    conn, store, fetcher = images
+    total = conn.execute("SELECT COUNT(*) FROM perfumes").fetchone()[0]
+
+    cached, failed = cache_images(conn, store, fetcher, log=lambda message: None)
+    assert cached + failed == total
+    assert failed == conn.execute("SELECT COUNT(*) FROM perfumes WHERE image_url LIKE '%/broken.png' "
+                                  "OR image_url LIKE '%/missing.png'").fetchone()[0]
+    assert all(count == 1 for count in stub.requests.values())
+
+    # Perfumes sharing an image share one file
+    digests = conn.execute("SELECT digest, COUNT(*) FROM perfume_images GROUP BY digest").fetchall()
+    assert len(digests) == 2
+    for digest, _ in digests:
+        with Image.open(store.path(digest)) as thumbnail:
+            assert (thumbnail.format, thumbnail.size) == ('JPEG', THUMBNAIL_SIZE)
+
+    # A second run only retries the failures
+    stub.requests.clear()
+    assert cache_images(conn, store, fetcher, log=lambda message: None) == (0, failed)
+    assert set(stub.requests) == {('GET', '/broken.png'), ('GET', '/missing.png')}
+
+
+def test_image_route(images, bind_app, database, monkeypatch):
+    conn, store, fetcher = images
+    cache_images(conn, store, fetcher, log=lambda message: None)
+    monkeypatch.setattr(app_module, 'image_store', store)
+    client = bind_app(database)
+
+    perfume_id, digest = conn.execute("SELECT perfume_id, digest FROM perfume_images LIMIT 1").fetchone()
+    response = client.get(f'/api/images/{perfume_id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.get_data() == open(store.path(digest), 'rb').read()
+    # The per-perfume URL is revalidated; only the digest URL is immutable
+    assert response.cache_control.no_cache and not response.cache_control.immutable
+    assert response.headers['ETag'] == f'"{digest}"'
+    assert response.headers['Content-Location'] == f'/api/thumbnails/{digest}'
+    assert client.get(f'/api/images/{perfume_id}', headers={'If-None-Match': f'"{digest}"'}).status_code == 304
+
+    response = client.get(f'/api/thumbnails/{digest}')
+    assert response.get_data() == open(store.path(digest), 'rb').read()
+    assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 3600
+    assert client.get(f'/api/thumbnails/{"0" * 64}').status_code == 404
+    assert client.get('/api/thumbnails/..%2F..%2Fapp.py').status_code == 404
+
+    # Not cached: sent to the original, without letting the redirect be cached
+    broken_id, broken_url = conn.execute(
+        "SELECT id, image_url FROM perfumes WHERE image_url LIKE '%/broken.png' LIMIT 1").fetchone()
+    response = client.get(f'/api/images/{broken_id}')
+    assert (response.status_code, response.location) == (302, broken_url)
+    assert response.cache_control.no_cache
+
+    # A new image_url makes the old thumbnail stale
+    conn.execute("UPDATE perfumes SET image_url = ? WHERE id = ?", (broken_url, perfume_id))
+    conn.commit()
+    assert client.get(f'/api/images/{perfume_id}').status_code == 302
+
+    assert client.get('/api/images/999999').status_code == 404
@@ -0,0 +1,144 @@
+import pandas as pd
+import pytest
+
+from catalog import load_catalog
+from db import get_write_db
+from image_resolver import FALLBACK_IMAGE
+from import_with_images import import_perfumes, load_dataset, map_family, map_gender, prepare_notes, select_rows
+
+ROWS = [
+    # Perfume, Brand, Year, Gender, mainaccord1, mainaccord2, mainaccord3, Top, Middle, Base, Rating Count
+    ['Sauvage', 'Dior', '2015', 'for men', 'fresh spicy', 'amber', 'citrus', 'Bergamot', 'Pepper', 'Ambroxan', 9000],
+    ['Oud Wood', 'Tom Ford', '2007', 'unisex', 'woody', 'aromatic', None, 'Rosewood, Cardamom', 'Oud; Sandalwood', 'Vanilla, amber', 5000],
+    ['Flowerbomb', 'Viktor&Rolf', None, 'for women', 'floral', 'fruity', 'sweet', 'tea, bergamot', 'jasmine, rose, orchid', 'patchouli, musk', 4000],
+    ['Obscure', 'Nobody', '2019', 'for women and men', 'oriental', 'vanilla', None, 'Yuzu, Yuzu', None, 'Yuzu, Oak', 3000],
+    ['Flowerbomb', 'Viktor&Rolf', '2005', 'for women', 'floral', None, None, None, None, None, 2500],
+    ['Rare', 'Nobody', '2020', 'for men', 'leather', None, None, 'Tar', None, None, 10],
+]
+COLUMNS = ['Perfume', 'Brand', 'Year', 'Gender', 'mainaccord1', 'mainaccord2', 'mainaccord3', 'Top', 'Middle', 'Base',
+           'Rating Count']
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / 'fra_cleaned.csv'
+    pd.DataFrame(ROWS, columns=COLUMNS).to_csv(path, sep=';', index=False, encoding='latin-1')
+    return select_rows(load_dataset(path))
+
+
+def test_mapping(dataset):
+    assert list(map_gender(dataset['Gender'])) == ['Men', 'Unisex', 'Women', 'Women']
+    assert list(map_family(dataset)) == ['Fresh Aquatic', 'Woody Aromatic', 'Floral Fruity', 'Oriental Vanilla']
+
+    links = prepare_notes(dataset)
+    obscure = links[links['row'] == dataset.index[3]]
+    # Duplicates keep their first tier, and names shorter than 3 letters are dropped
+    assert list(zip(obscure['name'], obscure['type'])) == [('Yuzu', 'top'), ('Oak', 'base')]
+
+
+def test_import_skips_existing_and_writes_everything(database, dataset):
+    conn = get_write_db(database)
+    before = load_catalog(conn)
+
+    inserted, updated, skipped = import_perfumes(conn, dataset, batch_size=2, log=lambda message: None)
+    assert (len(inserted), updated, skipped) == (3, [], 1)  # Sauvage is in the seed data
+
+    catalog = load_catalog(conn)
+    assert len(catalog) == len(before) + 3
+    new = [catalog.perfumes[perfume_id] for perfume_id in catalog.perfume_ids[len(before):]]
+    assert [(p['name'], p['year'], p['gender'], p['family']) for p in new] == [
+        ('Oud Wood', 2007, 'Unisex', 'Woody Aromatic'),
+        ('Flowerbomb', 2020, 'Women', 'Floral Fruity'),
+        ('Obscure', 2019, 'Women', 'Oriental Vanilla'),
+    ]
+    assert new[0]['description'] == 'A Woody, Aromatic fragrance.'
+    assert all(p['image_url'] == FALLBACK_IMAGE for p in new)
+
+    oud_notes = {(n['name'], n['type'], n['weight']) for n in catalog.perfume_notes[new[0]['id']]}
+    assert ('Vanilla', 'base', 0.6) in oud_notes and ('Rosewood', 'top', 1.0) in oud_notes
+    # Existing notes are reused rather than duplicated
+    assert conn.execute("SELECT COUNT(*) FROM notes WHERE name = 'Vanilla'").fetchone()[0] == 1
+
+    # Running it again imports nothing
+    assert import_perfumes(conn, dataset, log=lambda message: None) == ([], [], 4)
+    conn.close()
+
+
+def test_sync_rewrites_only_changed_rows(database, dataset):
+    conn = get_write_db(database)
+    quiet = dict(log=lambda message: None)
+    inserted, _, _ = import_perfumes(conn, dataset, **quiet)
+    oud_id = inserted[0]
+    # Hashes of perfumes that predate the sync are recorded once
+    _, updated, _ = import_perfumes(conn, dataset, sync=True, **quiet)
+    assert len(updated) == 1
+    assert import_perfumes(conn, dataset, sync=True, **quiet) == ([], [], 4)
+
+    revision = conn.execute("SELECT revision FROM catalog_meta").fetchone()[0]
+    # Count the catalog rows the sync writes
+    conn.execute("CREATE TEMP TABLE written (n INTEGER)")
+    conn.execute("INSERT INTO written VALUES (0)")
+    for table in ('perfumes', 'notes', 'perfume_notes'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"CREATE TEMP TRIGGER count_{table}_{event} AFTER {event} ON main.{table} "
+                         f"BEGIN UPDATE written SET n = n + 1; END")
+    snapshot = dataset.copy()
+    oud = snapshot.index[1]
+    snapshot.loc[oud, 'Year'] = 2008
+    snapshot.loc[oud, 'Top'] = 'Rosewood, Pink Pepper'
+    snapshot.loc[oud, 'Base'] = 'Vanilla'
+
+    assert import_perfumes(conn, snapshot, sync=True, **quiet) == ([], [oud_id], 3)
+    catalog = load_catalog(conn)
+    assert catalog.perfumes[oud_id]['year'] == 2008
+    assert catalog.perfumes[oud_id]['image_url'] == FALLBACK_IMAGE
+    assert {note['name'] for note in catalog.perfume_notes[oud_id]} == {
+        'Rosewood', 'Pink Pepper', 'Oud', 'Sandalwood', 'Vanilla'}
+
+    # Only the differences were written: the year, two links deleted, one added;
+    # the revision moved once for the batch
+    assert conn.execute("SELECT n FROM written").fetchone()[0] == 4
+    assert conn.execute("SELECT revision FROM catalog_meta").fetchone()[0] - revision == 1
+    conn.close()
+
+
+def test_sync_records_hashes_of_unchanged_legacy_rows(database, dataset):
+    conn = get_write_db(database)
+    quiet = dict(log=lambda message: None)
+    inserted, _, _ = import_perfumes(conn, dataset, **quiet)
+    # As if imported before perfume_sources existed
+    conn.execute("DELETE FROM perfume_sources")
+    conn.commit()
+    revision = conn.execute("SELECT revision FROM catalog_meta").fetchone()[0]
+
+    # Only the seed's Sauvage differs from its dataset row
+    _, updated, _ = import_perfumes(conn, dataset, sync=True, **quiet)
+    assert len(updated) == 1 and updated[0] not in inserted
+    assert conn.execute("SELECT COUNT(*) FROM perfume_sources").fetchone()[0] == 4
+    assert conn.execute("SELECT revision FROM catalog_meta").fetchone()[0] - revision == 1
+    assert import_perfumes(conn, dataset, sync=True, **quiet) == ([], [], 4)
+    conn.close()
+
+
+class FailingResolver:
+    """Every lookup hits a network failure"""
+    cache = {}
+
+    def resolve_all(self, perfumes):
+        return [None] * len(perfumes)
+
+
+def test_sync_keeps_the_stored_image_when_the_lookup_fails(database, dataset):
+    conn = get_write_db(database)
+    quiet = dict(log=lambda message: None)
+    oud_id = import_perfumes(conn, dataset, **quiet)[0][0]
+    import_perfumes(conn, dataset, sync=True, **quiet)
+    conn.execute("UPDATE perfumes SET image_url = 'https://img.example/oud.jpg' WHERE id = ?", (oud_id,))
+    conn.commit()
+
+    snapshot = dataset.copy()
+    snapshot.loc[snapshot.index[1], 'Year'] = 2008
+    assert import_perfumes(conn, snapshot, FailingResolver(), sync=True, **quiet) == ([], [oud_id], 3)
+    assert tuple(conn.execute("SELECT year, image_url FROM perfumes WHERE id = ?", (oud_id,)).fetchone()) == \
+        (2008, 'https://img.example/oud.jpg')
+    conn.close()
@@ -0,0 +1,83 @@
+import os
+import re
+
+import app as app_module
+from catalog import CatalogStore
+from db import ReadPool, sql_counters
+from metrics import RequestMetrics
+
+SAMPLE = re.compile(r'^([a-z_]+)(?:\{(.*)\})? (\S+)$')
+
+
+def scrape(client):
+    """{(name, labels): value} from /api/metrics, request series without their worker label"""
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('#'):
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        if name.startswith('api_'):
+            worker = f'worker="{os.getpid()}"'
+            assert worker in labels
+            labels = labels.replace(f',{worker}', '')
+        samples[(name, labels or '')] = float(value)
+    return samples
+
+
+def test_metrics_count_requests_sql_and_bytes(client):
+    # Load the snapshot and open a pooled connection before counting
+    client.get('/api/images/1')
+    app_module.request_metrics.reset()
+    responses = [client.get('/api/images/1') for _ in range(3)]
+    client.get('/api/perfumes/999999')
+    export = client.get('/api/perfumes/export')
+    export_size = len(export.get_data())
+    samples = scrape(client)
+
+    assert samples[('api_requests_total', 'endpoint="api.get_image",method="GET",status="302"')] == 3
+    assert samples[('api_requests_total', 'endpoint="api.get_perfume",method="GET",status="404"')] == 1
+    assert samples[('api_request_duration_seconds_count', 'endpoint="api.get_image",method="GET"')] == 3
+    assert samples[('api_request_duration_seconds_bucket', 'endpoint="api.get_image",method="GET",le="+Inf"')] == 3
+
+    # Per request: a thumbnail lookup that finds nothing
+    assert samples[('api_sql_statements_per_request_sum', 'endpoint="api.get_image"')] == 3
+    assert samples[('api_sql_rows_per_request_sum', 'endpoint="api.get_image"')] == 0
+    assert samples[('api_sql_statements_per_request_bucket', 'endpoint="api.get_image",le="2"')] == 3
+    assert samples[('api_response_bytes_sum', 'endpoint="api.get_image"')] == \
+        sum(len(response.get_data()) for response in responses)
+
+    # Streamed responses are recorded once their body has been sent
+    assert samples[('api_response_bytes_sum', 'endpoint="api.export_perfumes"')] == export_size
+    assert samples[('api_sql_rows_per_request_sum', 'endpoint="api.export_perfumes"')] > 15
+
+    assert samples[('catalog_perfumes', '')] == 15
+    assert samples[('result_cache_lookups_total', 'result="miss"')] == 0
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = RequestMetrics()
+    for size in (50, 500, 5000, 50000000):
+        metrics.sizes.observe(('x',), size)
+    lines = metrics.sizes.render()
+    assert 'api_response_bytes_bucket{endpoint="x",le="100"} 1' in lines
+    assert 'api_response_bytes_bucket{endpoint="x",le="10000"} 3' in lines
+    assert 'api_response_bytes_bucket{endpoint="x",le="+Inf"} 4' in lines
+    assert 'api_response_bytes_count{endpoint="x"} 4' in lines
+
+
+def test_only_counted_request_connections_pay_for_counting(database):
+    sql_counters.statements = sql_counters.rows = 0
+    # Snapshot loads read every row without counting them
+    assert len(CatalogStore(database).current()) == 15
+    pool = ReadPool(database, counted=False)
+    with pool.connection() as conn:
+        assert len(conn.execute("SELECT * FROM perfumes").fetchall()) == 15
+    assert (sql_counters.statements, sql_counters.rows) == (0, 0)
+
+    pool = ReadPool(database, counted=True)
+    with pool.connection() as conn:
+        conn.execute("SELECT * FROM perfumes").fetchall()
+    assert sql_counters.rows == 15
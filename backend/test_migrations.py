@@ -0,0 +1,160 @@
+import sqlite3
+
+import pytest
+
+from init_db import init_database
+from migrations import LATEST_VERSION, bump_revision, migrate, schema_version
+
+# The schema init_db.py used to create, before migrations existed
+LEGACY_SCHEMA = '''
+    CREATE TABLE perfumes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        year INTEGER,
+        gender TEXT NOT NULL,
+        family TEXT NOT NULL,
+        description TEXT,
+        image_url TEXT
+    );
+    CREATE TABLE notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL CHECK(type IN ('top', 'middle', 'base'))
+    );
+    CREATE TABLE perfume_notes (
+        perfume_id INTEGER NOT NULL,
+        note_id INTEGER NOT NULL,
+        weight REAL DEFAULT 1.0,
+        PRIMARY KEY (perfume_id, note_id)
+    );
+    INSERT INTO perfumes VALUES (1, 'Sauvage', 'Dior', 2015, 'Men', 'Woody Aromatic', 'Fresh.', NULL);
+    INSERT INTO perfumes VALUES (2, 'Mon Paris', 'YSL', 2016, 'Women', 'Floral', 'Sweet.', NULL);
+    INSERT INTO notes VALUES (1, 'Bergamot', 'top'), (2, 'Vanilla', 'base'), (3, 'Bergamot', 'middle');
+    INSERT INTO perfume_notes VALUES (1, 1, 1.0), (1, 3, 0.8), (2, 3, 0.8), (2, 2, 0.6);
+'''
+
+# Requests whose queries must not scan a table once the snapshot is loaded
+REQUESTS = [
+    '/api/perfumes?search=sauvage',
+    '/api/perfumes?search=rose&gender=Women',
+    '/api/perfumes?search=wood&gender=Men&family=Woody%20Aromatic',
+    '/api/perfumes/1',
+    '/api/perfumes/batch?ids=1,2,3',
+    '/api/recommendations/1',
+    '/api/random',
+    '/api/filters',
+]
+
+
+@pytest.fixture
+def legacy_database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    return path
+
+
+def index_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_migrate_upgrades_in_place(legacy_database):
+    conn = sqlite3.connect(legacy_database)
+    assert schema_version(conn) == 0
+
+    assert migrate(conn) == list(range(1, LATEST_VERSION + 1))
+    assert schema_version(conn) == LATEST_VERSION
+    assert {'idx_perfume_notes_note', 'idx_perfumes_gender_family', 'idx_notes_name'} <= index_names(conn)
+
+    # Data survives; the duplicate Bergamot is merged into the first one
+    assert conn.execute("SELECT COUNT(*) FROM perfumes").fetchone()[0] == 2
+    assert conn.execute("SELECT id, name FROM notes ORDER BY id").fetchall() == [(1, 'Bergamot'), (2, 'Vanilla')]
+    assert conn.execute("SELECT * FROM perfume_notes ORDER BY perfume_id, note_id").fetchall() == [
+        (1, 1, 1.0), (2, 1, 0.8), (2, 2, 0.6)]
+    assert conn.execute("SELECT rowid FROM perfumes_fts WHERE perfumes_fts MATCH 'dior'").fetchall() == [(1,)]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO notes (name, type) VALUES ('Vanilla', 'top')")
+    conn.rollback()
+
+    # Already up to date
+    assert migrate(conn) == []
+    conn.close()
+
+
+def test_revision_moves_once_per_transaction(database):
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_revision'").fetchall() == []
+    revision = conn.execute("SELECT revision FROM catalog_meta").fetchone()[0]
+
+    links = conn.execute("DELETE FROM perfume_notes").rowcount
+    assert links > 50
+    bump_revision(conn)
+    conn.commit()
+    assert conn.execute("SELECT revision FROM catalog_meta").fetchone()[0] == revision + 1
+    conn.close()
+
+
+def test_init_database_keeps_existing_catalog(legacy_database):
+    init_database(legacy_database)
+    conn = sqlite3.connect(legacy_database)
+    assert schema_version(conn) == LATEST_VERSION
+    assert [row[0] for row in conn.execute("SELECT name FROM perfumes ORDER BY id")] == ['Sauvage', 'Mon Paris']
+    conn.close()
+
+    init_database(legacy_database, reset=True)
+    conn = sqlite3.connect(legacy_database)
+    assert conn.execute("SELECT COUNT(*) FROM perfumes").fetchone()[0] > 2
+    conn.close()
+
+
+def query_plan(conn, sql, params=()):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def uses_index(detail):
+    return not detail.startswith('SCAN') or 'VIRTUAL TABLE INDEX' in detail
+
+
+def test_api_queries_use_indexes(database, bind_app, monkeypatch):
+    statements = []
+    connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(sqlite3, 'connect', traced_connect)
+    client = bind_app(database)
+
+    # The first pass loads the snapshot, which reads every table on purpose
+    for url in REQUESTS:
+        assert client.get(url).status_code == 200
+    del statements[:]
+    for url in REQUESTS:
+        assert client.get(url).status_code == 200
+
+    queries = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+    assert queries
+
+    conn = sqlite3.connect(database)
+    for sql in queries:
+        plan = query_plan(conn, sql)
+        assert all(uses_index(detail) for detail in plan), (sql, plan)
+    conn.close()
+
+
+@pytest.mark.parametrize('sql, params', [
+    ("SELECT perfume_id, weight FROM perfume_notes WHERE note_id = ?", (1,)),
+    ("SELECT id FROM perfumes WHERE gender = ? AND family = ?", ('Men', 'Woody Aromatic')),
+    ("SELECT id FROM perfumes WHERE name = ? AND brand = ?", ('Sauvage', 'Dior')),
+    ("SELECT id FROM notes WHERE name = ?", ('Vanilla',)),
+])
+def test_lookups_use_indexes(database, sql, params):
+    conn = sqlite3.connect(database)
+    plan = query_plan(conn, sql, params)
+    assert all(detail.startswith('SEARCH') for detail in plan), plan
+    conn.close()
@@ -0,0 +1,53 @@
+import numpy as np
+
+import minhash
+from catalog import load_catalog
+from db import get_db
+from minhash import MinHashLSH, compute_signatures, load_signatures, update_signatures
+
+
+def test_signatures_estimate_jaccard():
+    a = list(range(1, 41))
+    b = list(range(11, 51))
+    signatures = compute_signatures([a, b, []])
+    estimate = np.mean(signatures[0] == signatures[1])
+    assert abs(estimate - 30 / 50) < 0.15
+    assert (signatures[2] == minhash.PRIME).all()
+
+
+def test_lsh_candidates_include_identical_note_sets():
+    signatures = compute_signatures([[1, 2, 3], [1, 2, 3], [7, 8, 9]])
+    lsh = MinHashLSH(signatures, bands=32)
+    assert list(lsh.candidates(0)) == [0, 1]
+    assert list(lsh.candidates(2)) == [2]
+
+
+def test_signatures_are_persisted_and_refreshed(database, monkeypatch):
+    conn = get_db(database)
+    catalog = load_catalog(conn)
+    stored = load_signatures(conn, catalog)
+
+    # init_db stored every signature, so loading computes nothing
+    monkeypatch.setattr(minhash, 'compute_signatures', None)
+    assert (load_signatures(conn, catalog) == stored).all()
+    monkeypatch.undo()
+
+    conn.execute("DELETE FROM perfume_notes WHERE perfume_id = 1 AND note_id IN (SELECT note_id FROM perfume_notes WHERE perfume_id = 1 LIMIT 2)")
+    conn.commit()
+    assert update_signatures(conn) == 1
+    assert update_signatures(conn) == 0
+    conn.close()
+
+
+def test_approximate_recommendations(client):
+    exact = client.get('/api/recommendations/1?limit=100').get_json()
+    # One-row bands make every perfume sharing a note a candidate
+    assert client.get('/api/recommendations/1?limit=5&mode=approx&bands=128').get_json() == [
+        perfume for perfume in exact if perfume['shared_notes']][:5]
+
+    approx = client.get('/api/recommendations/1?limit=5&mode=approx').get_json()
+    assert len(approx) <= 5
+    assert all(perfume['shared_notes'] for perfume in approx)
+
+    assert client.get('/api/recommendations/1?mode=fuzzy').status_code == 400
+    assert client.get('/api/recommendations/1?mode=approx&bands=7').status_code == 400
@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from synthetic import generate_catalog
+
+REQUESTS = [
+    ('get', '/api/perfumes', None),
+    ('get', '/api/perfumes?gender=Men', None),
+    ('get', '/api/perfumes/3', None),
+    ('get', '/api/random', None),
+    ('get', '/api/notes', None),
+    ('get', '/api/filters', None),
+    ('get', '/api/recommendations/3', None),
+    ('post', '/api/recommendations/by-notes', {'notes': ['Note 1', 'Note 2']}),
+]
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """Every SQL statement executed by any connection opened during the test"""
+    executed = []
+    connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(executed.append)
+        return conn
+
+    monkeypatch.setattr(sqlite3, 'connect', traced_connect)
+    return executed
+
+
+def statements_per_request(tmp_path, bind_app, statements, n_perfumes):
+    """Statement counts for a first pass over REQUESTS and a second, warm one"""
+    path = str(tmp_path / f'catalog_{n_perfumes}.db')
+    generate_catalog(path, n_perfumes, n_notes=50)
+    client = bind_app(path)
+
+    counts = []
+    for _ in range(2):
+        for method, url, payload in REQUESTS:
+            del statements[:]
+            response = getattr(client, method)(url, json=payload)
+            assert response.status_code == 200
+            counts.append(len(statements))
+    return counts
+
+
+def test_statement_count_does_not_grow_with_catalog(tmp_path, bind_app, statements):
+    small = statements_per_request(tmp_path, bind_app, statements, 20)
+    large = statements_per_request(tmp_path, bind_app, statements, 500)
+    assert small == large
+    # Once connections are open and the snapshot is loaded, requests only
+    # check the snapshot version (or run their one query)
+    assert max(small[len(REQUESTS):]) <= 2
@@ -0,0 +1,236 @@
+import pytest
+
+from db import get_db, dict_from_row
+from neighbors import build_neighbors, load_neighbors
+from synthetic import generate_catalog
+
+
+def reference_recommendations(database, perfume_id, limit):
+    """The original per-perfume SQL loop that the engine replaces"""
+    conn = get_db(database)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM perfumes WHERE id = ?", (perfume_id,))
+    target_perfume = dict_from_row(cursor.fetchone())
+    cursor.execute("SELECT * FROM perfumes WHERE id != ?", (perfume_id,))
+    all_perfumes = [dict_from_row(row) for row in cursor.fetchall()]
+    notes_query = """
+        SELECT n.id, n.name, n.type, pn.weight
+        FROM notes n
+        JOIN perfume_notes pn ON n.id = pn.note_id
+        WHERE pn.perfume_id = ?
+    """
+    cursor.execute(notes_query, (perfume_id,))
+    target_note_ids = set(row['id'] for row in cursor.fetchall())
+
+    similarities = []
+    for perfume in all_perfumes:
+        cursor.execute(notes_query, (perfume['id'],))
+        perfume_notes = [dict_from_row(row) for row in cursor.fetchall()]
+        perfume_note_ids = set(note['id'] for note in perfume_notes)
+        intersection = len(target_note_ids & perfume_note_ids)
+        union = len(target_note_ids | perfume_note_ids)
+        note_similarity = intersection / union if union > 0 else 0
+        family_bonus = 0.2 if perfume['family'] == target_perfume['family'] else 0
+        gender_bonus = 0.1 if perfume['gender'] == target_perfume['gender'] else 0
+        perfume['notes'] = perfume_notes
+        perfume['similarity_score'] = round(note_similarity + family_bonus + gender_bonus, 3)
+        perfume['shared_notes'] = [note['name'] for note in perfume_notes if note['id'] in target_note_ids]
+        similarities.append(perfume)
+
+    similarities.sort(key=lambda x: x['similarity_score'], reverse=True)
+    conn.close()
+    return similarities[:limit]
+
+
+@pytest.fixture
+def synthetic_client(tmp_path, bind_app):
+    path = str(tmp_path / 'synthetic.db')
+    generate_catalog(path, 400, n_notes=60, seed=7)
+    return bind_app(path), path
+
+
+@pytest.mark.parametrize('limit', [1, 8, 10, 50, 1000])
+def test_recommendations_match_reference(client, database, limit):
+    for perfume_id in range(1, 16):
+        response = client.get(f'/api/recommendations/{perfume_id}?limit={limit}')
+        assert response.get_json() == reference_recommendations(database, perfume_id, limit)
+
+
+def test_recommendations_match_reference_on_large_catalog(synthetic_client):
+    client, path = synthetic_client
+    for perfume_id in (1, 57, 200, 399):
+        response = client.get(f'/api/recommendations/{perfume_id}?limit=10')
+        assert response.get_json() == reference_recommendations(path, perfume_id, 10)
+
+
+def test_recommendations_unknown_perfume(client):
+    assert client.get('/api/recommendations/99999').status_code == 404
+
+
+def reference_by_notes(database, selected_notes, limit=10, gender='', family=''):
+    """The original by-notes scan that the inverted index replaces"""
+    conn = get_db(database)
+    cursor = conn.cursor()
+    query = "SELECT * FROM perfumes WHERE 1=1"
+    params = []
+    if gender and gender != 'All':
+        query += " AND gender = ?"
+        params.append(gender)
+    if family and family != 'All':
+        query += " AND family = ?"
+        params.append(family)
+    # The original scan returned rows in id order; the gender/family index would not
+    cursor.execute(query + " ORDER BY id", params)
+    all_perfumes = [dict_from_row(row) for row in cursor.fetchall()]
+
+    matches = []
+    for perfume in all_perfumes:
+        cursor.execute("""
+            SELECT n.id, n.name, n.type, pn.weight
+            FROM notes n
+            JOIN perfume_notes pn ON n.id = pn.note_id
+            WHERE pn.perfume_id = ?
+        """, (perfume['id'],))
+        perfume_notes = [dict_from_row(row) for row in cursor.fetchall()]
+        perfume_note_names = [note['name'].lower() for note in perfume_notes]
+        matching_notes = [note for note in selected_notes if note.lower() in perfume_note_names]
+        match_score = len(matching_notes) / len(selected_notes)
+        if match_score > 0:
+            perfume['notes'] = perfume_notes
+            perfume['match_score'] = round(match_score, 3)
+            perfume['matching_notes'] = matching_notes
+            matches.append(perfume)
+
+    matches.sort(key=lambda x: x['match_score'], reverse=True)
+    conn.close()
+    return matches[:limit]
+
+
+@pytest.mark.parametrize('payload', [
+    {'notes': ['Vanilla', 'rose']},
+    {'notes': ['Bergamot', 'Vanilla', 'Musk', 'Unknown Note'], 'limit': 3},
+    {'notes': ['Cedar', 'cedar', 'Vetiver'], 'gender': 'Men'},
+    {'notes': ['Jasmine', 'Patchouli'], 'gender': 'All', 'family': 'Floral'},
+])
+def test_by_notes_match_reference(client, database, payload):
+    response = client.post('/api/recommendations/by-notes', json=payload)
+    expected = reference_by_notes(database, payload['notes'], payload.get('limit', 10),
+                                  payload.get('gender', ''), payload.get('family', ''))
+    assert response.get_json() == expected
+
+
+def test_by_notes_match_reference_on_large_catalog(synthetic_client):
+    client, path = synthetic_client
+    notes = ['Note 3', 'note 17', 'Note 42']
+    response = client.post('/api/recommendations/by-notes', json={'notes': notes, 'limit': 25})
+    assert response.get_json() == reference_by_notes(path, notes, 25)
+
+
+def test_by_notes_requires_notes(client):
+    assert client.post('/api/recommendations/by-notes', json={'notes': []}).status_code == 400
+
+
+def test_neighbors_table_is_used(client, database):
+    conn = get_db(database)
+    conn.execute("UPDATE perfume_neighbors SET score = 0.5 WHERE perfume_id = 1 AND rank = 0")
+    conn.commit()
+    conn.close()
+
+    assert client.get('/api/recommendations/1?limit=3').get_json()[0]['similarity_score'] == 0.5
+
+
+def test_incremental_build_matches_full_build(tmp_path):
+    before = str(tmp_path / 'before.db')
+    after = str(tmp_path / 'after.db')
+    generate_catalog(before, 300, n_notes=40, seed=3)
+    generate_catalog(after, 300, n_notes=40, seed=3)
+
+    conn = get_db(before)
+    conn.execute("DELETE FROM perfume_notes WHERE perfume_id > 280")
+    conn.execute("DELETE FROM perfumes WHERE id > 280")
+    conn.commit()
+    build_neighbors(conn, k=10)
+
+    # Import the last 20 perfumes, edit one perfume's notes and delete another
+    changes = [
+        "DELETE FROM perfume_notes WHERE perfume_id IN (5, 10)",
+        "DELETE FROM perfumes WHERE id = 10",
+        "INSERT INTO perfume_notes (perfume_id, note_id, weight) VALUES (5, 1, 1.0), (5, 2, 0.8)",
+    ]
+    conn.execute("ATTACH DATABASE ? AS source", (after,))
+    conn.execute("INSERT INTO perfumes SELECT * FROM source.perfumes WHERE id > 280")
+    conn.execute("INSERT INTO perfume_notes SELECT * FROM source.perfume_notes WHERE perfume_id > 280")
+    conn.commit()
+    conn.execute("DETACH DATABASE source")
+    for statement in changes:
+        conn.execute(statement)
+    conn.commit()
+
+    build_neighbors(conn, k=10, incremental=True)
+    build_neighbors(conn, k=10, incremental=True, changed_ids=[5])
+    incremental = load_neighbors(conn)
+    conn.close()
+
+    conn = get_db(after)
+    for statement in changes:
+        conn.execute(statement)
+    conn.commit()
+    build_neighbors(conn, k=10)
+    full = load_neighbors(conn)
+    conn.close()
+
+    assert incremental == full
+
+
+def test_recommendations_by_perfumes(client):
+    by_sauvage = client.post('/api/recommendations/by-perfumes', json={'ids': [1], 'limit': 5}).get_json()
+    assert 0 < len(by_sauvage) <= 5
+    assert all(perfume['id'] != 1 and perfume['shared_notes'] for perfume in by_sauvage)
+    scores = [perfume['similarity_score'] for perfume in by_sauvage]
+    assert scores == sorted(scores, reverse=True)
+
+    # Several seeds are combined into one profile; unknown ids are ignored
+    both = client.post('/api/recommendations/by-perfumes', json={'ids': [1, 2, 99999], 'limit': 20}).get_json()
+    assert {1, 2}.isdisjoint(perfume['id'] for perfume in both)
+
+    assert client.post('/api/recommendations/by-perfumes', json={'ids': []}).status_code == 400
+    assert client.post('/api/recommendations/by-perfumes', json={'ids': [99999]}).status_code == 404
+
+
+def test_profile_scores_are_cosine_similarities(database):
+    from catalog import load_catalog
+    from similarity import NoteProfileModel
+
+    model = NoteProfileModel(load_catalog(get_db(database)))
+    dense = model.matrix.toarray()
+    profile = dense[0] + dense[3]
+    profile /= (profile ** 2).sum() ** 0.5
+    expected = {model.perfume_ids[row]: dense[row] @ profile for row in range(len(dense)) if row not in (0, 3)}
+    for perfume_id, score in model.recommend([model.perfume_ids[0], model.perfume_ids[3]], 50):
+        assert abs(score - expected[perfume_id]) < 1e-12
+
+
+@pytest.mark.parametrize('path, body', [
+    ('by-perfumes', [1, 2]),
+    ('by-perfumes', None),
+    ('by-perfumes', {'ids': '12'}),
+    ('by-perfumes', {'ids': [[1]]}),
+    ('by-perfumes', {'ids': [True]}),
+    ('by-perfumes', {'ids': ['1']}),
+    ('by-perfumes', {'ids': [1], 'limit': '5'}),
+    ('by-perfumes', {'ids': [1], 'limit': -1}),
+    ('by-perfumes', {'ids': [1], 'limit': 0}),
+    ('by-perfumes', {'ids': [1], 'limit': 10 ** 6}),
+    ('by-notes', ['Vanilla']),
+    ('by-notes', None),
+    ('by-notes', {'notes': 'Vanilla'}),
+    ('by-notes', {'notes': [['Vanilla']]}),
+    ('by-notes', {'notes': ['Vanilla'], 'limit': '5'}),
+    ('by-notes', {'notes': ['Vanilla'], 'limit': -3}),
+    ('by-notes', {'notes': ['Vanilla'], 'limit': 2.5}),
+    ('by-notes', {'notes': ['Vanilla'], 'gender': ['Men']}),
+])
+def test_malformed_bodies_are_rejected(client, path, body):
+    response = client.post(f'/api/recommendations/{path}', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,70 @@
+import sqlite3
+
+import app as app_module
+from result_cache import ResultCache
+
+
+class Snapshot:
+    """Stands in for a catalog; the cache only compares identity"""
+
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(maxsize=2)
+    catalog = Snapshot()
+    calls = []
+
+    def compute(key):
+        calls.append(key)
+        return key * 10
+
+    assert cache.get(catalog, 1, lambda: compute(1)) == 10
+    assert cache.get(catalog, 2, lambda: compute(2)) == 20
+    assert cache.get(catalog, 1, lambda: compute(1)) == 10  # 1 is now most recent
+    assert cache.get(catalog, 3, lambda: compute(3)) == 30  # evicts 2
+    assert cache.get(catalog, 1, lambda: compute(1)) == 10
+    assert cache.get(catalog, 2, lambda: compute(2)) == 20
+    assert calls == [1, 2, 3, 2]
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (2, 4, 2, 2)
+
+
+def test_new_snapshot_invalidates():
+    cache = ResultCache()
+    old, new = Snapshot(), Snapshot()
+    cache.get(old, 'key', lambda: 'old')
+    assert cache.get(new, 'key', lambda: 'new') == 'new'
+    assert cache.get(new, 'key', lambda: 'recomputed') == 'new'
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_recommendations_are_cached(client):
+    first = client.get('/api/recommendations/1?limit=5').get_json()
+    assert client.get('/api/recommendations/1?limit=5').get_json() == first
+    client.get('/api/recommendations/1?limit=6')
+
+    stats = client.get('/api/cache/stats').get_json()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_note_keys_are_normalized(client):
+    first = client.post('/api/recommendations/by-notes', json={'notes': ['Vanilla', 'Rose']}).get_json()
+    second = client.post('/api/recommendations/by-notes', json={'notes': ['rose', 'VANILLA']}).get_json()
+    assert app_module.result_cache.stats()['hits'] == 1
+
+    # Same ranking; the matching notes echo what was asked for
+    assert [p['id'] for p in second] == [p['id'] for p in first]
+    assert all(set(p['matching_notes']) <= {'rose', 'VANILLA'} for p in second)
+
+
+def test_cache_follows_catalog_changes(client, database):
+    before = client.post('/api/recommendations/by-notes', json={'notes': ['Vanilla']}).get_json()
+
+    conn = sqlite3.connect(database)
+    conn.execute("DELETE FROM perfume_notes WHERE perfume_id = ?", (before[0]['id'],))
+    conn.commit()
+    conn.close()
+
+    after = client.post('/api/recommendations/by-notes', json={'notes': ['Vanilla']}).get_json()
+    assert before[0]['id'] not in [p['id'] for p in after]
+    assert app_module.result_cache.stats()['invalidations'] == 1
@@ -0,0 +1,75 @@
+import app as app_module
+from sampling import affine_permutation, random_pool, seeded_walk
+
+
+def test_affine_permutation_visits_every_position_once():
+    for n in (1, 2, 7, 12, 64, 97, 360):
+        for seed in ('a', 'b', 42):
+            a, b = affine_permutation(seed, 0, n)
+            assert sorted((a * i + b) % n for i in range(n)) == list(range(n))
+
+
+def test_seeded_walk_cycles_without_repeats():
+    ids = list(range(100, 130))
+    seen = []
+    offset = 0
+    while offset < len(ids):
+        picks, offset = seeded_walk(ids, 'seed', offset, 7)
+        seen.extend(picks)
+    # The last page stops at the end of the cycle
+    assert offset == len(ids)
+    assert sorted(seen) == ids
+
+    # Same seed, same order; the next cycle is a different order of the same ids
+    assert seeded_walk(ids, 'seed', 0, 30)[0] == seen
+    next_cycle, _ = seeded_walk(ids, 'seed', 30, 30)
+    assert sorted(next_cycle) == ids and next_cycle != seen
+    assert seeded_walk([], 'seed', 5, 3) == ([], 5)
+
+
+def test_random_respects_filters_and_count(client):
+    catalog = app_module.catalog_store.current()
+    gender = catalog.genders[0]
+    matching = {perfume_id for perfume_id, perfume in catalog.perfumes.items() if perfume['gender'] == gender}
+
+    for _ in range(10):
+        perfume = client.get(f'/api/random?gender={gender}').get_json()
+        assert perfume['id'] in matching
+        assert perfume['notes']
+
+    perfumes = client.get(f'/api/random?gender={gender}&count=50').get_json()['perfumes']
+    assert {perfume['id'] for perfume in perfumes} == matching
+
+    perfumes = client.get('/api/random?count=4&family=All').get_json()['perfumes']
+    assert len({perfume['id'] for perfume in perfumes}) == 4
+
+    assert client.get('/api/random?gender=Nobody').get_json() is None
+    assert client.get('/api/random?gender=Nobody&count=3').get_json() == {'perfumes': []}
+    assert set(random_pool(catalog)) == set(catalog.perfume_ids)
+
+
+def test_seeded_random_walks_the_filtered_catalog(client):
+    catalog = app_module.catalog_store.current()
+    family = catalog.families[0]
+    matching = sorted(perfume_id for perfume_id, perfume in catalog.perfumes.items() if perfume['family'] == family)
+
+    seen = []
+    offset = 0
+    for _ in range(len(matching)):
+        body = client.get(f'/api/random?seed=7&offset={offset}&family={family}').get_json()
+        seen.extend(perfume['id'] for perfume in body['perfumes'])
+        offset = body['next_offset']
+    assert sorted(seen) == matching
+
+    # Another seed, another order of all perfumes
+    first = client.get('/api/random?seed=7&count=15').get_json()
+    second = client.get('/api/random?seed=8&count=15').get_json()
+    assert first['next_offset'] == second['next_offset'] == 15
+    assert sorted(p['id'] for p in first['perfumes']) == sorted(p['id'] for p in second['perfumes'])
+    assert first['perfumes'] != second['perfumes']
+
+
+def test_random_rejects_bad_input(client):
+    assert client.get('/api/random?count=0').status_code == 400
+    assert client.get('/api/random?count=51').status_code == 400
+    assert client.get('/api/random?seed=1&offset=-1').status_code == 400
@@ -0,0 +1,52 @@
+import sqlite3
+
+from search import ensure_search_index, has_search_index, match_expression
+
+
+def names(response):
+    return [perfume['name'] for perfume in response.get_json()]
+
+
+def test_match_expression_uses_word_prefixes():
+    assert match_expression('dior sauv') == '"dior"* "sauv"*'
+    assert match_expression('  "; DROP') == '"DROP"*'
+    assert match_expression('!!') == ''
+
+
+def test_prefix_search_as_you_type(client):
+    assert names(client.get('/api/perfumes?search=sa')) == ['Sauvage', 'Black Opium']
+    assert names(client.get('/api/perfumes?search=sauv')) == ['Sauvage']
+    assert names(client.get('/api/perfumes?search=acqua gi')) == ['Acqua di Giò']
+    assert names(client.get('/api/perfumes?search=lancome')) == ['La Vie Est Belle']
+    assert client.get('/api/perfumes?search=!!').get_json() == []
+
+
+def test_search_ranks_name_hits_first_and_applies_limit(client):
+    dior = names(client.get('/api/perfumes?search=dior'))
+    assert dior[0] == 'Miss Dior'
+    assert set(dior) == {'Miss Dior', 'Sauvage'}
+
+    assert len(client.get('/api/perfumes?search=a&limit=3').get_json()['perfumes']) == 3
+    assert names(client.get('/api/perfumes?search=dior&gender=Men')) == ['Sauvage']
+
+
+def test_index_follows_catalog_changes(database, client):
+    conn = sqlite3.connect(database)
+    conn.execute("UPDATE perfumes SET name = 'Sauvage Elixir' WHERE name = 'Sauvage'")
+    conn.execute("DELETE FROM perfumes WHERE name = 'Eros'")
+    conn.commit()
+    conn.close()
+
+    assert names(client.get('/api/perfumes?search=elixir')) == ['Sauvage Elixir']
+    assert client.get('/api/perfumes?search=eros').get_json() == []
+
+
+def test_ensure_search_index_builds_missing_index(database):
+    conn = sqlite3.connect(database)
+    conn.execute("DROP TABLE perfumes_fts")
+    assert not has_search_index(conn)
+
+    ensure_search_index(conn)
+    count = conn.execute("SELECT COUNT(*) FROM perfumes_fts WHERE perfumes_fts MATCH 'chanel'").fetchone()[0]
+    assert count == 2
+    conn.close()
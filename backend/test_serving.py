@@ -0,0 +1,123 @@
+import os
+import runpy
+import sqlite3
+
+import app as app_module
+from catalog import CatalogStore
+from migrations import bump_revision
+
+
+def rename(database, perfume_id, name):
+    conn = sqlite3.connect(database)
+    conn.execute("UPDATE perfumes SET name = ? WHERE id = ?", (name, perfume_id))
+    bump_revision(conn)
+    conn.commit()
+    conn.close()
+
+
+def test_store_rechecks_revision_after_close(database):
+    store = CatalogStore(database)
+    before = store.current()
+
+    # As in a forked worker: a new connection, same catalog, no reload
+    store.close()
+    assert store.current() is before
+
+    store.close()
+    rename(database, 1, 'Renamed')
+    after = store.current()
+    assert after is not before
+    assert after.perfumes[1]['name'] == 'Renamed'
+
+
+def test_factory_apps_share_the_warm_snapshot(client, database):
+    catalog = app_module.warm_up()
+    for name in ('similarity', 'note_profiles', 'note_index', 'neighbors', 'sort_order:name'):
+        assert name in catalog._derived
+    assert len(catalog._fragments) == len(catalog)
+
+    app_module.close_connections()
+    assert app_module.catalog_store._conn is None
+
+    other = app_module.create_app()
+    other.config['TESTING'] = True
+    response = other.test_client().get('/api/perfumes/1')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).strip() == catalog.perfume_json(1)
+    assert app_module.catalog_store.current() is catalog
+
+    # A forced reload picks up a change even when the store would not check yet
+    app_module.catalog_store.check_interval = float('inf')
+    rename(database, 1, 'Reloaded')
+    assert app_module.warm_up(reload=True).perfumes[1]['name'] == 'Reloaded'
+    assert other.test_client().get('/api/perfumes/1').get_json()['name'] == 'Reloaded'
+
+
+def test_health_reports_ready_after_background_warm_up(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'startup', app_module.WarmUp())
+
+    response = client.get('/api/health')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'warming_up'}
+
+    app_module.startup._thread.join()
+    response = client.get('/api/health')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ready'
+    assert body['perfumes'] == len(app_module.catalog_store.current())
+    assert 'similarity' in app_module.catalog_store.current()._derived
+
+
+def test_health_retries_a_failed_warm_up(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'startup', app_module.WarmUp())
+    real_warm_up = app_module.warm_up
+
+    def broken(reload=False):
+        raise OSError('disk unavailable')
+    monkeypatch.setattr(app_module, 'warm_up', broken)
+    client.get('/api/health')
+    app_module.startup._thread.join()
+
+    monkeypatch.setattr(app_module, 'warm_up', real_warm_up)
+    response = client.get('/api/health')
+    assert response.status_code == 503
+    assert response.get_json()['last_error'] == 'OSError: disk unavailable'
+    app_module.startup._thread.join()
+    assert client.get('/api/health').status_code == 200
+
+
+def test_precompute_rebuilds_move_the_revision(database):
+    from minhash import update_signatures
+    from neighbors import build_neighbors
+    conn = sqlite3.connect(database)
+    revision = conn.execute("SELECT revision FROM catalog_meta").fetchone()[0]
+
+    # Nothing to recompute: no reload for it
+    build_neighbors(conn, incremental=True)
+    update_signatures(conn)
+    assert conn.execute("SELECT revision FROM catalog_meta").fetchone()[0] == revision
+
+    build_neighbors(conn)
+    conn.execute("DELETE FROM perfume_minhash WHERE perfume_id = 1")
+    conn.commit()
+    update_signatures(conn)
+    assert conn.execute("SELECT revision FROM catalog_meta").fetchone()[0] == revision + 2
+    conn.close()
+
+
+def test_watcher_reloads_once_the_revision_settles():
+    conf = runpy.run_path(os.path.join(os.path.dirname(__file__), 'gunicorn.conf.py'))
+    debounce = conf['RevisionDebounce']('e-1', settle=30)
+    assert not debounce.update('e-1', 0)
+    # An import in batches, then the precompute rebuilds
+    assert not debounce.update('e-2', 5)
+    assert not debounce.update('e-3', 10)
+    assert not debounce.update('e-5', 35)
+    assert not debounce.update('e-5', 60)
+    assert debounce.update('e-5', 65)
+    assert not debounce.update('e-5', 70)
+    # Moving back to the served revision cancels the pending reload
+    assert not debounce.update('e-6', 80)
+    assert not debounce.update('e-5', 85)
+    assert not debounce.update('e-5', 200)
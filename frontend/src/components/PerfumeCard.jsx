@@ -1,6 +1,7 @@
 import React from 'react';
 import { Link } from 'react-router-dom';
 import { Heart, Sparkles } from 'lucide-react';
+import { thumbnailUrl } from '../services/api';
 
 const PerfumeCard = ({ perfume, showSimilarity = false, onToggleFavorite }) => {
   const isFavorite = localStorage.getItem('favorites')?.includes(perfume.id.toString());
@@ -18,7 +19,7 @@ const PerfumeCard = ({ perfume, showSimilarity = false, onToggleFavorite }) => {
       <div className="card group cursor-pointer transform hover:-translate-y-1">
         <div className="relative h-64 overflow-hidden bg-gradient-to-br from-primary-100 to-primary-200">
           <img
-            src={perfume.image_url}
+            src={thumbnailUrl(perfume.id)}
             alt={perfume.name}
             className="w-full h-full object-cover opacity-80 group-hover:opacity-100 group-hover:scale-110 transition-all duration-500"
           />
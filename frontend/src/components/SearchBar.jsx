@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { Search, X } from 'lucide-react';
-import { perfumeApi } from '../services/api';
+import { perfumeApi, thumbnailUrl } from '../services/api';
 
 const SearchBar = ({ onSearch, onSelectPerfume }) => {
   const [query, setQuery] = useState('');
@@ -101,7 +101,7 @@ const SearchBar = ({ onSearch, onSelectPerfume }) => {
             >
               <div className="w-12 h-12 rounded-lg overflow-hidden bg-primary-100 flex-shrink-0">
                 <img
-                  src={perfume.image_url}
+                  src={thumbnailUrl(perfume.id)}
                   alt={perfume.name}
                   className="w-full h-full object-cover"
                 />
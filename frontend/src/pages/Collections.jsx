@@ -24,8 +24,13 @@ const Collections = () => {
   
   const loadPerfumes = async () => {
     try {
-      const response = await perfumeApi.getPerfumes();
-      setAllPerfumes(response.data);
+      // Only fetch the perfumes that belong to some collection
+      const saved = JSON.parse(localStorage.getItem('collections') || '[]');
+      const ids = [...new Set(saved.flatMap(c => c.perfumes))];
+      if (ids.length === 0) return;
+      
+      const response = await perfumeApi.getPerfumesByIds(ids);
+      setAllPerfumes(response.data.perfumes);
     } catch (error) {
       console.error('Error loading perfumes:', error);
     }
@@ -15,7 +15,11 @@ const Compare = () => {
   
   const loadPerfumes = async () => {
     try {
-      const response = await perfumeApi.getPerfumes();
+      // The picker only needs enough to list perfumes; full details are
+      // fetched when one is selected
+      const response = await perfumeApi.getPerfumes({
+        fields: 'id,name,brand,year,gender,image_url',
+      });
       setAllPerfumes(response.data);
     } catch (error) {
       console.error('Error loading perfumes:', error);
@@ -27,12 +31,17 @@ const Compare = () => {
     p.brand.toLowerCase().includes(searchQuery.toLowerCase())
   );
   
-  const selectPerfume = (perfume, index) => {
-    const newSelected = [...selectedPerfumes];
-    newSelected[index] = perfume;
-    setSelectedPerfumes(newSelected);
-    setShowSearch(null);
-    setSearchQuery('');
+  const selectPerfume = async (perfume, index) => {
+    try {
+      const response = await perfumeApi.getPerfume(perfume.id);
+      const newSelected = [...selectedPerfumes];
+      newSelected[index] = response.data;
+      setSelectedPerfumes(newSelected);
+      setShowSearch(null);
+      setSearchQuery('');
+    } catch (error) {
+      console.error('Error loading perfume:', error);
+    }
   };
   
   const removePerfume = (index) => {
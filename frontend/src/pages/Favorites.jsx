@@ -22,10 +22,8 @@ const Favorites = () => {
         return;
       }
       
-      // Fetch all perfumes and filter by favorites
-      const response = await perfumeApi.getPerfumes();
-      const favoritePerfumes = response.data.filter(p => favoriteIds.includes(p.id));
-      setFavorites(favoritePerfumes);
+      const response = await perfumeApi.getPerfumesByIds(favoriteIds);
+      setFavorites(response.data.perfumes);
     } catch (error) {
       console.error('Error loading favorites:', error);
     } finally {
@@ -20,6 +20,11 @@ const HomePage = () => {
     genders: [],
   });
   const [showFilters, setShowFilters] = useState(false);
+  // Surprise Me walks through the filtered catalog without repeats
+  const [surprise, setSurprise] = useState({
+    seed: Math.floor(Math.random() * 2 ** 31),
+    offset: 0,
+  });
   
   useEffect(() => {
     loadPerfumes();
@@ -28,6 +33,7 @@ const HomePage = () => {
   
   useEffect(() => {
     loadPerfumes();
+    setSurprise((current) => ({ ...current, offset: 0 }));
   }, [filters]);
   
   const loadPerfumes = async () => {
@@ -92,8 +98,15 @@ const HomePage = () => {
   const handleSurpriseMe = async () => {
     setLoading(true);
     try {
-      const response = await perfumeApi.getRandomPerfume();
-      handleSelectPerfume(response.data);
+      const params = { seed: surprise.seed, offset: surprise.offset };
+      if (filters.gender !== 'All') params.gender = filters.gender;
+      if (filters.family !== 'All') params.family = filters.family;
+      const response = await perfumeApi.getRandomPerfume(params);
+      setSurprise({ ...surprise, offset: response.data.next_offset });
+      const [perfume] = response.data.perfumes;
+      if (perfume) {
+        handleSelectPerfume(perfume);
+      }
     } catch (error) {
       console.error('Error getting random perfume:', error);
     } finally {
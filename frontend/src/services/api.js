@@ -13,12 +13,20 @@ export const perfumeApi = {
   // Get all perfumes or search
   getPerfumes: (params = {}) => api.get('/perfumes', { params }),
   
+  // Get several perfumes by ID, in the order given
+  getPerfumesByIds: (ids, params = {}) =>
+    api.get('/perfumes/batch', { params: { ids: ids.join(','), ...params } }),
+  
   // Get single perfume
   getPerfume: (id) => api.get(`/perfumes/${id}`),
   
   // Get recommendations by perfume ID
   getRecommendations: (id, limit = 10) => api.get(`/recommendations/${id}`, { params: { limit } }),
   
+  // Get recommendations similar to several perfumes (e.g. favorites)
+  getRecommendationsByPerfumes: (ids, limit = 10) =>
+    api.post('/recommendations/by-perfumes', { ids, limit }),
+  
   // Get recommendations by notes
   getRecommendationsByNotes: (notes, filters = {}) => 
     api.post('/recommendations/by-notes', { notes, ...filters }),
@@ -26,11 +34,15 @@ export const perfumeApi = {
   // Get all notes
   getNotes: () => api.get('/notes'),
   
-  // Get random perfume
-  getRandomPerfume: () => api.get('/random'),
+  // Get random perfumes; pass a seed and the last next_offset to avoid repeats
+  getRandomPerfume: (params = {}) => api.get('/random', { params }),
   
   // Get filter options
   getFilters: () => api.get('/filters'),
 };
 
+// Thumbnail served by the backend; it redirects to image_url until cached and
+// is revalidated by ETag, since the image behind an id can change
+export const thumbnailUrl = (id) => `${API_BASE_URL}/images/${id}`;
+
 export default api;